@@ -0,0 +1,174 @@
+# artifacts.py
+
+import asyncio
+import logging
+import os
+import shutil
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, Iterable, List
+
+logger = logging.getLogger(__name__)
+
+
+class InsufficientDiskSpaceError(RuntimeError):
+    pass
+
+
+def _artifact_owner_names(relative_path: Path) -> set:
+    """Candidate job IDs a path belongs to: each component up to its first '_' or '.'."""
+    return {part.split(".")[0].split("_")[0] for part in relative_path.parts}
+
+
+class ArtifactStore:
+    """
+    Keeps artifact directories (rendered videos, Manim media, audio, logs)
+    within per-directory byte budgets. A sweep deletes the least recently
+    used files first, judged by access time (or modification time, if later,
+    for filesystems mounted noatime). Files belonging to pinned jobs are
+    never deleted, and `unswept` directories (caches shared by every job, such
+    as Manim's Tex and text directories) are neither swept nor counted.
+    """
+
+    def __init__(self, budgets: Dict[str, int], min_free_bytes: int, unswept: Iterable[str] = ()):
+        self.budgets = {Path(directory): max_bytes for directory, max_bytes in budgets.items()}
+        self.unswept = {Path(directory) for directory in unswept}
+        self.min_free_bytes = min_free_bytes
+        self.files_evicted = 0
+        self.bytes_evicted = 0
+        self.sweeps = 0
+        self._usage: Dict[str, int] = {}
+        self._pins: Counter = Counter()
+        self._lock = threading.Lock()
+        self._sweep_lock = threading.Lock()
+
+    # --- Pinning ---
+
+    @contextmanager
+    def pinned(self, video_id: str):
+        """Protects a job's artifacts from eviction while the job is live."""
+        with self._lock:
+            self._pins[video_id] += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._pins[video_id] -= 1
+                if self._pins[video_id] <= 0:
+                    del self._pins[video_id]
+
+    def touch(self, path: Path):
+        """Records an access, for LRU purposes, without changing the modification time."""
+        try:
+            stat = path.stat()
+            os.utime(path, (time.time(), stat.st_mtime))
+        except OSError:
+            pass
+
+    # --- Sweeping ---
+
+    def _scan(self, directory: Path, pinned: set) -> tuple:
+        total = 0
+        candidates: List[tuple] = []
+        for root, directories, files in os.walk(directory):
+            directories[:] = [name for name in directories if Path(root) / name not in self.unswept]
+            for name in files:
+                path = Path(root) / name
+                try:
+                    stat = path.stat()
+                except FileNotFoundError:
+                    continue
+                total += stat.st_size
+                if not _artifact_owner_names(path.relative_to(directory)) & pinned:
+                    candidates.append((max(stat.st_atime, stat.st_mtime), stat.st_size, path))
+        return total, candidates
+
+    def _sweep_directory(self, directory: Path, max_bytes: int, pinned: set) -> int:
+        if not directory.exists():
+            return 0
+        total, candidates = self._scan(directory, pinned)
+        freed = 0
+        for _, size, path in sorted(candidates):
+            if total - freed <= max_bytes:
+                break
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                continue
+            freed += size
+            self.files_evicted += 1
+            self._remove_empty_parents(path.parent, directory)
+        self._usage[str(directory)] = total - freed
+        if freed:
+            logger.info(f"Evicted {freed / 1e6:.1f} MB from {directory} to stay within {max_bytes / 1e6:.0f} MB.")
+        return freed
+
+    @staticmethod
+    def _remove_empty_parents(directory: Path, root: Path):
+        while directory != root:
+            try:
+                directory.rmdir()
+            except OSError:
+                return
+            directory = directory.parent
+
+    def sweep(self, live_job_ids: Iterable[str] = ()) -> int:
+        """
+        Evicts files until every directory is within budget, sparing pinned
+        jobs and `live_job_ids`. Blocking; returns bytes freed.
+        """
+        with self._sweep_lock:
+            with self._lock:
+                pinned = set(self._pins) | set(live_job_ids)
+            freed = sum(
+                self._sweep_directory(directory, max_bytes, pinned) for directory, max_bytes in self.budgets.items()
+            )
+            self.bytes_evicted += freed
+            self.sweeps += 1
+            return freed
+
+    async def run_sweeper(self, interval_seconds: float, live_job_ids: Callable[[], Awaitable[set]]):
+        """
+        Sweeps periodically on a worker thread until cancelled. `live_job_ids`
+        reports jobs still running anywhere (e.g. in other API processes).
+        """
+        while True:
+            try:
+                await asyncio.to_thread(self.sweep, await live_job_ids())
+            except Exception as e:
+                logger.error(f"Artifact sweep failed: {e}", exc_info=True)
+            await asyncio.sleep(interval_seconds)
+
+    # --- Disk Space ---
+
+    async def ensure_free_space(self, live_job_ids: Iterable[str] = (), path: str = "."):
+        """
+        Preflight before a render: if free disk space is below the minimum,
+        sweeps once and raises InsufficientDiskSpaceError if that wasn't enough.
+        """
+        if shutil.disk_usage(path).free >= self.min_free_bytes:
+            return
+        await asyncio.to_thread(self.sweep, live_job_ids)
+        free = shutil.disk_usage(path).free
+        if free < self.min_free_bytes:
+            raise InsufficientDiskSpaceError(
+                f"Only {free / 1e6:.0f} MB of disk space free; at least {self.min_free_bytes / 1e6:.0f} MB "
+                f"is required to start a render."
+            )
+
+    def stats(self) -> dict:
+        with self._lock:
+            pinned_jobs = len(self._pins)
+        return {
+            "directories": {
+                str(directory): {"bytes": self._usage.get(str(directory)), "max_bytes": max_bytes}
+                for directory, max_bytes in self.budgets.items()
+            },
+            "pinned_jobs": pinned_jobs,
+            "sweeps": self.sweeps,
+            "files_evicted": self.files_evicted,
+            "bytes_evicted": self.bytes_evicted,
+        }
@@ -0,0 +1,122 @@
+# audio_cache.py
+
+import hashlib
+import logging
+import os
+import shutil
+import threading
+import unicodedata
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_text(text: str) -> str:
+    """Canonical form of a sentence for cache keys: NFC, single spaces, no outer whitespace."""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+def _link_or_copy(source: Path, destination: Path):
+    """Hardlinks `source` to `destination` (falling back to a copy), replacing it atomically."""
+    destination.parent.mkdir(parents=True, exist_ok=True)
+    temp_path = destination.with_name(f".{destination.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        os.link(source, temp_path)
+    except OSError:
+        shutil.copyfile(source, temp_path)
+    os.replace(temp_path, destination)
+
+
+class AudioCache:
+    """
+    Content-addressed, size-bounded store of synthesized WAV files, shared
+    across jobs. Entries are keyed on (normalized text, TTS model, voice,
+    sample rate) and live on disk at `<root>/<key[:2]>/<key>.wav`; an
+    in-memory index in LRU order decides what to evict once the store grows
+    past `max_bytes`.
+    """
+
+    def __init__(self, root: str, max_bytes: int):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._index: "OrderedDict[str, int]" = OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self._load_index()
+
+    @staticmethod
+    def make_key(text: str, model_name: str, voice: Optional[str] = None, sample_rate: Optional[int] = None) -> str:
+        fields = [normalize_text(text), model_name, voice or "default", str(sample_rate or "")]
+        return hashlib.sha256("\x1f".join(fields).encode("utf-8")).hexdigest()
+
+    def _path_for(self, key: str) -> Path:
+        return self.root / key[:2] / f"{key}.wav"
+
+    def _load_index(self):
+        self.root.mkdir(parents=True, exist_ok=True)
+        entries = []
+        for path in self.root.glob("*/*.wav"):
+            stat = path.stat()
+            entries.append((max(stat.st_atime, stat.st_mtime), path.stem, stat.st_size))
+        for _, key, size in sorted(entries):
+            self._index[key] = size
+            self._total_bytes += size
+        logger.info(f"Audio cache at {self.root}: {len(self._index)} entries, {self._total_bytes / 1e6:.1f} MB.")
+        self._evict()
+
+    def get(self, key: str, destination: str) -> bool:
+        """Materializes a cached entry at `destination`. Returns False on a miss."""
+        with self._lock:
+            if key not in self._index:
+                self.misses += 1
+                return False
+            self._index.move_to_end(key)
+            self.hits += 1
+        try:
+            _link_or_copy(self._path_for(key), Path(destination))
+        except FileNotFoundError:
+            # Removed behind our back (e.g. manual cleanup); treat as a miss.
+            with self._lock:
+                self._total_bytes -= self._index.pop(key, 0)
+                self.hits -= 1
+                self.misses += 1
+            return False
+        return True
+
+    def put(self, key: str, source: str):
+        """Adds a freshly synthesized file to the cache, evicting old entries if needed."""
+        path = self._path_for(key)
+        _link_or_copy(Path(source), path)
+        size = path.stat().st_size
+        with self._lock:
+            self._total_bytes += size - self._index.get(key, 0)
+            self._index[key] = size
+            self._index.move_to_end(key)
+            self._evict()
+
+    def _evict(self):
+        while self._total_bytes > self.max_bytes and len(self._index) > 1:
+            key, size = self._index.popitem(last=False)
+            self._total_bytes -= size
+            self.evictions += 1
+            try:
+                self._path_for(key).unlink()
+            except FileNotFoundError:
+                pass
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._index),
+            "bytes": self._total_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
@@ -0,0 +1,323 @@
+# benchmark.py
+#
+# Offline render benchmark: replays stored Manim scripts through the same
+# code path as a real job (validation, LaTeX pre-render, dry run, warm-worker
+# render) with the fake LLM client and silent stub speech, so results only depend
+# on the render stack and the machine. Results are written as JSON and can be
+# compared against a stored baseline.
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import List, Optional
+
+logger = logging.getLogger(__name__)
+
+BACKEND_DIR = Path(__file__).resolve().parent
+
+# Metrics compared against a baseline, and values below which a difference is noise.
+COMPARED_METRICS = {"wall_seconds": 0.5, "cpu_seconds": 0.5, "peak_rss_mb": 50.0, "output_bytes": 64 * 1024}
+
+
+def _configure_environment(args: argparse.Namespace, work_dir: str):
+    """Settings main.py reads at import time; must run before it is imported."""
+    os.environ.update({
+        "LLM_BACKEND": "fake",
+        "RENDER_BACKEND": "warm",
+        "TTS_SERVICE_AUTOSTART": "false",
+        "TASK_DB_PATH": str(Path(work_dir) / "tasks.db"),
+        "LLM_CACHE_DIR": str(Path(work_dir) / "llm_cache"),
+        "RENDER_LOG_DIR": str(Path(work_dir) / "render_logs"),
+        "UPGRADE_RENDITION": "",
+        # A failing script would be replayed unchanged; record the failure instead.
+        "SCRIPT_REGENERATION_ATTEMPTS": "0",
+        "SEGMENTED_RENDER": "false" if args.no_segments else "true",
+        "DRY_RUN_VOICEOVER_SECONDS": str(args.voiceover_seconds),
+    })
+    if not args.warm_caches:
+        os.environ["TYPESET_CACHE_DIR"] = str(Path(work_dir) / "typeset_cache")
+
+
+# --- Measurement ---
+
+class StageTimer:
+    """Wall time, CPU time and peak RSS of one stage, including the render workers it used."""
+
+    def __init__(self, pool):
+        self.pool = pool
+
+    def __enter__(self):
+        from render_workers import process_usage
+
+        self.started = time.perf_counter()
+        self.usage = process_usage()
+        self.first_call = len(self.pool.calls)
+        return self
+
+    def __exit__(self, *exc_info):
+        from render_workers import process_usage
+
+        usage = process_usage()
+        calls = self.pool.calls[self.first_call:]
+        peaks = [call["peak_rss_mb"] for call in calls if call["peak_rss_mb"] is not None]
+        self.result = {
+            "wall_seconds": time.perf_counter() - self.started,
+            "cpu_seconds": usage["cpu_seconds"] - self.usage["cpu_seconds"]
+            + sum(call["cpu_seconds"] for call in calls),
+            "peak_rss_mb": max(peaks) if peaks else None,
+            "worker_calls": [call["call"] for call in calls],
+        }
+        return False
+
+
+def _measured_pool_class():
+    from render_workers import RenderWorkerPool, measured_call
+
+    class MeasuredRenderWorkerPool(RenderWorkerPool):
+        """Records the CPU time and peak RSS every worker call reports."""
+
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self.calls = []
+
+        async def _run(self, function, *args):
+            result, usage = await super()._run(measured_call, function, *args)
+            self.calls.append({"call": function.__name__, **usage})
+            return result
+
+    return MeasuredRenderWorkerPool
+
+
+async def replay_script(main, script_path: Path, rendition: str, run: int) -> dict:
+    """Runs one stored script through script checks and rendering."""
+    from llm_client import FakeLLMClient
+
+    video_id = f"benchmark-{script_path.stem}-{run}"
+    # A valid class name no matter what the file is called; the validator renames the scene to it.
+    topic = f"benchmark {script_path.stem}"
+    # Answers with the replayed script, without delay.
+    main.llm_client = FakeLLMClient([script_path.read_text(encoding="utf-8")])
+    await main.task_store.create_task(video_id, topic, main.topic_key(topic), coalesce=False)
+
+    result = {"script": script_path.name, "ok": False, "stages": {}}
+    produced = []
+    try:
+        with StageTimer(main.render_pool) as timer:
+            manim_script, dry_run_report = await main.produce_manim_script(video_id, topic, bypass_cache=True)
+        result["stages"]["script"] = timer.result
+
+        with StageTimer(main.render_pool) as timer:
+            video_path = await main.render_manim_voiceover_video(
+                manim_script, video_id, topic, rendition=rendition, report_progress=False,
+                empty_blocks=dry_run_report["empty_blocks"] if dry_run_report else None,
+            )
+        result["stages"]["render"] = timer.result
+        produced.append(Path(video_path))
+        result["output_bytes"] = Path(video_path).stat().st_size
+        result["ok"] = True
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {str(e).strip().splitlines()[-1] if str(e).strip() else ''}"
+        logger.warning(f"Benchmark of {script_path.name} failed: {result['error']}")
+    finally:
+        produced += [Path("manim_scripts") / f"{video_id}.py", Path("manim_scripts") / f"{video_id}_segments.py"]
+        for path in produced:
+            path.unlink(missing_ok=True)
+    return result
+
+
+def _median_run(runs: List[dict]) -> dict:
+    """Combines repeated runs of a script: median times, highest peak RSS."""
+    ok_runs = [run for run in runs if run["ok"]]
+    if len(ok_runs) != len(runs):
+        return next(run for run in runs if not run["ok"])
+    combined = {**ok_runs[0], "repeats": len(ok_runs), "stages": {}}
+    for stage, first in ok_runs[0]["stages"].items():
+        timings = [run["stages"][stage] for run in ok_runs]
+        peaks = [timing["peak_rss_mb"] for timing in timings if timing["peak_rss_mb"] is not None]
+        combined["stages"][stage] = {
+            **first,
+            "wall_seconds": statistics.median(timing["wall_seconds"] for timing in timings),
+            "cpu_seconds": statistics.median(timing["cpu_seconds"] for timing in timings),
+            "peak_rss_mb": max(peaks) if peaks else None,
+        }
+    combined["output_bytes"] = statistics.median(run["output_bytes"] for run in ok_runs)
+    return combined
+
+
+def _totals(scripts: List[dict]) -> dict:
+    ok = [script for script in scripts if script["ok"]]
+    peaks = [timing["peak_rss_mb"] for script in ok for timing in script["stages"].values()
+             if timing["peak_rss_mb"] is not None]
+    return {
+        "scripts": len(scripts),
+        "failed": len(scripts) - len(ok),
+        "wall_seconds": sum(timing["wall_seconds"] for script in ok for timing in script["stages"].values()),
+        "cpu_seconds": sum(timing["cpu_seconds"] for script in ok for timing in script["stages"].values()),
+        "peak_rss_mb": max(peaks) if peaks else None,
+        "output_bytes": sum(script["output_bytes"] for script in ok),
+    }
+
+
+async def run_benchmark(args: argparse.Namespace, script_paths: List[Path]) -> dict:
+    import main
+
+    # Fresh worker per call, so each call's peak RSS is its own.
+    main.render_pool = _measured_pool_class()(
+        workers=args.workers or main.RENDER_POOL_WORKERS, max_jobs_per_worker=1,
+        speech_stub_seconds=args.voiceover_seconds,
+    )
+    main.render_pool.start()
+    try:
+        scripts = []
+        for script_path in script_paths:
+            runs = [await replay_script(main, script_path, args.rendition, run) for run in range(args.repeat)]
+            scripts.append(_median_run(runs))
+            summary = scripts[-1]
+            logger.info(
+                f"{script_path.name}: " + (
+                    ", ".join(f"{stage} {timing['wall_seconds']:.1f}s" for stage, timing in summary["stages"].items())
+                    if summary["ok"] else summary["error"]
+                )
+            )
+    finally:
+        main.render_pool.shutdown()
+
+    import manim
+
+    return {
+        "created_at": time.time(),
+        "environment": {
+            "python": platform.python_version(),
+            "manim": getattr(manim, "__version__", None),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "workers": main.render_pool.workers,
+            "rendition": args.rendition,
+            "segmented": main.SEGMENTED_RENDER,
+            "voiceover_seconds": args.voiceover_seconds,
+            "warm_caches": args.warm_caches,
+        },
+        "totals": _totals(scripts),
+        "scripts": scripts,
+    }
+
+
+# --- Baseline Comparison ---
+
+def _compare_metric(label: str, metric: str, current, baseline, threshold: float) -> Optional[str]:
+    if current is None or baseline is None:
+        return None
+    if current - baseline <= COMPARED_METRICS[metric] or current <= baseline * (1 + threshold):
+        return None
+    return f"{label} {metric}: {baseline:.2f} -> {current:.2f} (+{(current / baseline - 1) * 100 if baseline else float('inf'):.0f}%)"
+
+
+def compare_to_baseline(results: dict, baseline: dict, threshold: float) -> List[str]:
+    """
+    Regressions of more than `threshold` (a fraction) per script, stage and
+    metric, and for the totals. Differences within the noise floor of
+    COMPARED_METRICS are ignored, as are scripts absent from either run.
+    """
+    regressions = []
+    for metric in COMPARED_METRICS:
+        regression = _compare_metric(
+            "total", metric, results["totals"].get(metric), baseline["totals"].get(metric), threshold
+        )
+        if regression:
+            regressions.append(regression)
+
+    baseline_scripts = {script["script"]: script for script in baseline["scripts"]}
+    for script in results["scripts"]:
+        previous = baseline_scripts.get(script["script"])
+        if previous is None:
+            continue
+        if previous["ok"] and not script["ok"]:
+            regressions.append(f"{script['script']}: now fails ({script['error']})")
+            continue
+        if not (previous["ok"] and script["ok"]):
+            continue
+        for stage, timing in script["stages"].items():
+            for metric in ("wall_seconds", "cpu_seconds", "peak_rss_mb"):
+                regression = _compare_metric(
+                    f"{script['script']} {stage}", metric,
+                    timing[metric], previous["stages"].get(stage, {}).get(metric), threshold,
+                )
+                if regression:
+                    regressions.append(regression)
+        regression = _compare_metric(
+            script["script"], "output_bytes", script["output_bytes"], previous["output_bytes"], threshold
+        )
+        if regression:
+            regressions.append(regression)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay stored Manim scripts and measure the render pipeline.")
+    parser.add_argument("scripts", nargs="*", help="Scripts to replay (default: every script in --corpus-dir)")
+    parser.add_argument("--corpus-dir", default=str(BACKEND_DIR / "manim_scripts"))
+    parser.add_argument("--output", default="benchmark_results.json", help="Where to write the results")
+    parser.add_argument("--baseline", help="Results of an earlier run to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="Relative slowdown (or growth) counted as a regression (default 0.10)")
+    parser.add_argument("--update-baseline", action="store_true", help="Write the results to --baseline as well")
+    parser.add_argument("--rendition", default="480p15", help="Rendition to render (480p15, 720p30, 1080p60)")
+    parser.add_argument("--repeat", type=int, default=1, help="Runs per script; times are the median")
+    parser.add_argument("--workers", type=int, help="Render worker processes (default RENDER_POOL_WORKERS)")
+    parser.add_argument("--voiceover-seconds", type=float, default=2.0, help="Length of each stub voiceover")
+    parser.add_argument("--no-segments", action="store_true", help="Render voiceover blocks in one scene")
+    parser.add_argument("--warm-caches", action="store_true",
+                        help="Use the host's typesetting cache instead of a fresh one")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    script_paths = [Path(script).resolve() for script in args.scripts] or sorted(
+        path for path in Path(args.corpus_dir).resolve().glob("*.py") if not path.stem.startswith("benchmark-")
+    )
+    if not script_paths:
+        parser.error("No scripts to replay.")
+    if args.rendition not in ("480p15", "720p30", "1080p60"):
+        parser.error(f"Unknown rendition '{args.rendition}'.")
+    output_path = Path(args.output).resolve()
+    baseline_path = Path(args.baseline).resolve() if args.baseline else None
+
+    with tempfile.TemporaryDirectory(prefix="learntube-benchmark-") as work_dir:
+        _configure_environment(args, work_dir)
+        # main.py resolves its artifact directories relative to the backend.
+        os.chdir(BACKEND_DIR)
+        sys.path.insert(0, str(BACKEND_DIR))
+        results = asyncio.run(run_benchmark(args, script_paths))
+
+    output_path.write_text(json.dumps(results, indent=2), encoding="utf-8")
+    totals = results["totals"]
+    logger.info(
+        f"Replayed {totals['scripts']} scripts ({totals['failed']} failed): {totals['wall_seconds']:.1f}s wall, "
+        f"{totals['cpu_seconds']:.1f}s CPU, {totals['output_bytes'] / 1024 / 1024:.1f} MB of video. "
+        f"Results in {output_path}."
+    )
+
+    if baseline_path is None:
+        return 0
+    if args.update_baseline or not baseline_path.exists():
+        baseline_path.parent.mkdir(parents=True, exist_ok=True)
+        baseline_path.write_text(json.dumps(results, indent=2), encoding="utf-8")
+        logger.info(f"Baseline written to {baseline_path}.")
+        return 0
+    regressions = compare_to_baseline(results, json.loads(baseline_path.read_text(encoding="utf-8")), args.threshold)
+    for regression in regressions:
+        logger.error(f"Regression: {regression}")
+    if not regressions:
+        logger.info(f"No regressions beyond {args.threshold:.0%} against {baseline_path}.")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,120 @@
+# events.py
+
+import asyncio
+import json
+from collections import OrderedDict, deque
+from typing import Optional
+
+TERMINAL_STATUSES = ("completed", "failed")
+
+
+def is_terminal(event: dict) -> bool:
+    return event["event"] == "status" and event["data"].get("status") in TERMINAL_STATUSES
+
+
+def format_sse(event: dict) -> str:
+    """Serializes an event for a text/event-stream response."""
+    lines = [] if event.get("id") is None else [f"id: {event['id']}"]
+    lines += [f"event: {event['event']}", f"data: {json.dumps(event['data'])}"]
+    return "\n".join(lines) + "\n\n"
+
+
+class _Channel:
+    def __init__(self, history_size: int):
+        self.history: deque = deque(maxlen=history_size)
+        self.next_id = 1
+        self.finished = False
+        self.subscribers: set = set()
+
+
+class Subscription:
+    """A subscriber's view of one job: replayed history first, then live events."""
+
+    def __init__(self, bus: "JobEventBus", video_id: str, channel: _Channel, backlog: list):
+        self._bus = bus
+        self._video_id = video_id
+        self._channel = channel
+        self._queue: asyncio.Queue = asyncio.Queue()
+        for event in backlog:
+            self._queue.put_nowait(event)
+
+    async def get(self, timeout: Optional[float] = None) -> Optional[dict]:
+        """The next event, or None if none arrived within `timeout` seconds."""
+        try:
+            return await asyncio.wait_for(self._queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def _deliver(self, event: dict):
+        self._queue.put_nowait(event)
+
+    def close(self):
+        self._channel.subscribers.discard(self)
+        self._bus._release(self._video_id)
+
+    def __enter__(self) -> "Subscription":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class JobEventBus:
+    """
+    In-process publish/subscribe of job progress. Each job keeps its recent
+    events (numbered from 1) so a reconnecting client can resume after the
+    last event ID it saw. Channels of finished jobs are dropped, oldest
+    first, once more than `max_finished_jobs` are retained.
+    """
+
+    def __init__(self, history_size: int = 256, max_finished_jobs: int = 1000):
+        self.history_size = history_size
+        self.max_finished_jobs = max_finished_jobs
+        self._channels: "OrderedDict[str, _Channel]" = OrderedDict()
+
+    def _channel(self, video_id: str) -> _Channel:
+        channel = self._channels.get(video_id)
+        if channel is None:
+            channel = self._channels[video_id] = _Channel(self.history_size)
+        return channel
+
+    def has_history(self, video_id: str) -> bool:
+        channel = self._channels.get(video_id)
+        return channel is not None and bool(channel.history)
+
+    def publish(self, video_id: str, event: str, data: dict):
+        """Records an event for a job and hands it to every current subscriber. Must run on the event loop."""
+        channel = self._channel(video_id)
+        message = {"id": channel.next_id, "event": event, "data": data}
+        channel.next_id += 1
+        channel.history.append(message)
+        for subscription in channel.subscribers:
+            subscription._deliver(message)
+        if is_terminal(message):
+            channel.finished = True
+            self._channels.move_to_end(video_id)
+            self._evict()
+
+    def subscribe(self, video_id: str, last_event_id: Optional[int] = None) -> Subscription:
+        """
+        Subscribes to a job's events. Retained events after `last_event_id`
+        (all of them if None) are delivered before any live ones.
+        """
+        channel = self._channel(video_id)
+        backlog = [event for event in channel.history if last_event_id is None or event["id"] > last_event_id]
+        subscription = Subscription(self, video_id, channel, backlog)
+        channel.subscribers.add(subscription)
+        return subscription
+
+    def _release(self, video_id: str):
+        # Don't keep channels around that were only opened by subscribers
+        # (e.g. for a job running in another API process).
+        channel = self._channels.get(video_id)
+        if channel is not None and not channel.subscribers and not channel.history:
+            del self._channels[video_id]
+
+    def _evict(self):
+        finished = [video_id for video_id, channel in self._channels.items() if channel.finished]
+        for video_id in finished[: max(0, len(finished) - self.max_finished_jobs)]:
+            if not self._channels[video_id].subscribers:
+                del self._channels[video_id]
@@ -0,0 +1,152 @@
+# llm_cache.py
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_input(value: str) -> str:
+    """Canonical form of a prompt input: NFC, case-folded, single spaces."""
+    return " ".join(unicodedata.normalize("NFC", value).casefold().split())
+
+
+class LLMResponseCache:
+    """
+    Disk-backed cache of LLM responses keyed on (model name, prompt-template
+    version, normalized inputs). Entries are JSON files under
+    `<root>/<key[:2]>/<key>.json`; an in-memory index in LRU order enforces
+    the TTL and the `max_bytes` budget. Entries written by other processes
+    sharing the directory are indexed when first looked up.
+    """
+
+    def __init__(self, root: str, ttl_seconds: float, max_bytes: int):
+        self.root = Path(root)
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.expirations = 0
+        self.evictions = 0
+        # key -> (size in bytes, created_at)
+        self._index: "OrderedDict[str, tuple]" = OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self._load_index()
+
+    @staticmethod
+    def make_key(model_name: str, template_version: str, **inputs: str) -> str:
+        payload = {
+            "model": model_name,
+            "template_version": template_version,
+            "inputs": {name: normalize_input(value) for name, value in sorted(inputs.items())},
+        }
+        return hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+
+    def _path_for(self, key: str) -> Path:
+        return self.root / key[:2] / f"{key}.json"
+
+    def _load_index(self):
+        self.root.mkdir(parents=True, exist_ok=True)
+        entries = []
+        for path in self.root.glob("*/*.json"):
+            stat = path.stat()
+            entries.append((max(stat.st_atime, stat.st_mtime), path.stem, stat.st_size, stat.st_mtime))
+        for _, key, size, created_at in sorted(entries):
+            self._index[key] = (size, created_at)
+            self._total_bytes += size
+        logger.info(f"LLM response cache at {self.root}: {len(self._index)} entries, {self._total_bytes / 1e6:.1f} MB.")
+        with self._lock:
+            self._evict()
+
+    def get(self, key: str) -> Optional[str]:
+        """Returns the cached response, or None on a miss or an expired entry."""
+        with self._lock:
+            entry = self._index.get(key)
+            if entry is None:
+                entry = self._adopt(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if time.time() - entry[1] > self.ttl_seconds:
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._index.move_to_end(key)
+
+        try:
+            with open(self._path_for(key), "r", encoding="utf-8") as f:
+                response = json.load(f)["response"]
+        except (FileNotFoundError, json.JSONDecodeError, KeyError):
+            with self._lock:
+                self._remove(key)
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+        return response
+
+    def put(self, key: str, response: str, **metadata: str):
+        path = self._path_for(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        data = json.dumps({"created_at": time.time(), "response": response, **metadata}, ensure_ascii=False)
+        # Atomic replace, so concurrent API processes never read a torn file.
+        temp_path = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        temp_path.write_text(data, encoding="utf-8")
+        os.replace(temp_path, path)
+
+        size = path.stat().st_size
+        with self._lock:
+            if key in self._index:
+                self._total_bytes -= self._index[key][0]
+            self._index[key] = (size, time.time())
+            self._index.move_to_end(key)
+            self._total_bytes += size
+            self._evict()
+
+    def _adopt(self, key: str) -> Optional[tuple]:
+        """
+        Indexes an entry another API process sharing the directory wrote
+        after this one loaded its index. Returns its index entry, or None if
+        there is no such file.
+        """
+        try:
+            stat = self._path_for(key).stat()
+        except FileNotFoundError:
+            return None
+        entry = self._index[key] = (stat.st_size, stat.st_mtime)
+        self._total_bytes += stat.st_size
+        return entry
+
+    def _remove(self, key: str):
+        size, _ = self._index.pop(key, (0, 0))
+        self._total_bytes -= size
+        self._path_for(key).unlink(missing_ok=True)
+
+    def _evict(self):
+        while self._total_bytes > self.max_bytes and self._index:
+            self._remove(next(iter(self._index)))
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._index),
+            "bytes": self._total_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "expirations": self.expirations,
+            "evictions": self.evictions,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
@@ -0,0 +1,148 @@
+# llm_client.py
+#
+# The LLM behind script generation, behind one small interface: Gemini in
+# production, or a local stand-in with configurable latency, canned responses
+# drawn from stored scripts and injected failures, for load tests that must
+# not spend API quota. The Gemini SDK takes seconds to import, so it is only
+# loaded on first use (or by the API's start-up warm-up).
+
+import asyncio
+import hashlib
+import logging
+import math
+import random
+import re
+import threading
+from pathlib import Path
+from typing import Callable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# What a prompt asks for; the fake client answers each kind differently.
+NARRATION = "narration"
+MANIM_SCRIPT = "manim_script"
+
+VOICEOVER_TEXT_PATTERN = re.compile(r"""voiceover\(\s*text\s*=\s*(["'])(.+?)\1""", re.DOTALL)
+FALLBACK_NARRATION = (
+    "Let's start with the big picture and what this topic is about.\n\n"
+    "Next, we look at how the pieces fit together, one step at a time.\n\n"
+    "Finally, we summarize the key ideas to remember."
+)
+
+
+class LLMError(RuntimeError):
+    """A failed LLM call (the fake client raises it for injected failures)."""
+
+
+class LLMClient:
+    """Generates text for a prompt. `model_name` is part of every LLM cache key."""
+
+    model_name = ""
+
+    @property
+    def available(self) -> bool:
+        return True
+
+    async def warm_up(self):
+        """Loads whatever the first call would otherwise wait for."""
+
+    async def generate(self, prompt: str, kind: str) -> str:
+        raise NotImplementedError
+
+
+class GeminiClient(LLMClient):
+    def __init__(self, model_name: str, api_key: Optional[str]):
+        self.model_name = model_name
+        self.api_key = api_key
+        self._genai = None
+        self._sdk_lock = threading.Lock()
+
+    @property
+    def available(self) -> bool:
+        return bool(self.api_key)
+
+    def _sdk(self):
+        """Imports and configures the SDK once; blocks, so call it off the event loop."""
+        with self._sdk_lock:
+            if self._genai is None:
+                import google.generativeai as genai
+
+                genai.configure(api_key=self.api_key)
+                self._genai = genai
+        return self._genai
+
+    async def warm_up(self):
+        if self.available:
+            await asyncio.to_thread(self._sdk)
+
+    async def generate(self, prompt: str, kind: str) -> str:
+        genai = self._genai or await asyncio.to_thread(self._sdk)
+        response = await genai.GenerativeModel(self.model_name).generate_content_async(prompt)
+        return response.text
+
+
+# --- Local Stand-In ---
+
+def parse_latency(spec: str) -> Callable[[random.Random], float]:
+    """
+    A latency sampler in seconds from `fixed:<ms>`, `uniform:<min_ms>,<max_ms>`
+    or `lognormal:<median_ms>,<sigma>` (long-tailed, like real API calls).
+    """
+    distribution, _, params = spec.partition(":")
+    try:
+        values = [float(value) for value in params.split(",")] if params else []
+        if distribution == "fixed" and len(values) == 1:
+            return lambda rng: values[0] / 1000
+        if distribution == "uniform" and len(values) == 2:
+            return lambda rng: rng.uniform(values[0], values[1]) / 1000
+        if distribution == "lognormal" and len(values) == 2:
+            return lambda rng: rng.lognormvariate(math.log(values[0]), values[1]) / 1000
+    except ValueError:
+        pass
+    raise ValueError(f"Invalid latency spec '{spec}' (expected fixed:<ms>, uniform:<min>,<max> or lognormal:<median>,<sigma>).")
+
+
+def load_stored_scripts(scripts_dir: str) -> List[str]:
+    """Generated scripts stored by earlier jobs, without segment and benchmark copies."""
+    paths = sorted(
+        path for path in Path(scripts_dir).glob("*.py")
+        if not path.stem.endswith("_segments") and not path.stem.startswith("benchmark-")
+    )
+    return [path.read_text(encoding="utf-8") for path in paths]
+
+
+class FakeLLMClient(LLMClient):
+    """
+    Answers Manim-script prompts with one of `scripts` and narration prompts
+    with the voiceover texts of one of them, after a latency drawn from
+    `latency`. The response is picked by hashing the prompt, so the same
+    prompt always gets the same answer. A fraction `error_rate` of calls
+    fails with LLMError after the latency, like a server-side error would.
+    """
+
+    model_name = "fake"
+
+    def __init__(self, scripts: List[str], latency: str = "fixed:0", error_rate: float = 0.0,
+                 seed: Optional[int] = None):
+        if not scripts:
+            raise ValueError("The fake LLM client needs at least one stored script to answer with.")
+        self.scripts = scripts
+        self.narrations = [
+            "\n\n".join(match.group(2) for match in VOICEOVER_TEXT_PATTERN.finditer(script)) for script in scripts
+        ]
+        self.narrations = [narration for narration in self.narrations if narration] or [FALLBACK_NARRATION]
+        self.sample_latency = parse_latency(latency)
+        self.error_rate = error_rate
+        self.rng = random.Random(seed)
+        self.calls = 0
+        self.failures = 0
+
+    async def generate(self, prompt: str, kind: str) -> str:
+        self.calls += 1
+        await asyncio.sleep(self.sample_latency(self.rng))
+        if self.rng.random() < self.error_rate:
+            self.failures += 1
+            raise LLMError("Injected failure of the fake LLM (503 Service Unavailable).")
+        choices = self.narrations if kind == NARRATION else self.scripts
+        index = int(hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:8], 16) % len(choices)
+        return choices[index]
@@ -0,0 +1,321 @@
+# loadgen.py
+#
+# Load generator for the API: submits jobs to /generate-video at a target
+# rate (open loop, so a slow server builds a queue instead of slowing the
+# load down), follows each one through /video-status, and reports throughput,
+# request latency percentiles and how long jobs waited in the queues. Every
+# POST is sent from its own thread at its arrival time; a separate pool of
+# threads does the polling, so following jobs never delays new submissions.
+# Run the server with LLM_BACKEND=fake to size a deployment without spending
+# API quota.
+
+import argparse
+import http.client
+import json
+import logging
+import queue
+import random
+import sys
+import threading
+import time
+from typing import List, Optional
+from urllib.parse import urlsplit
+
+logger = logging.getLogger(__name__)
+
+TERMINAL_STATUSES = {"completed", "failed"}
+# Where /video-status reports a job waiting for capacity (its `queue_stage`).
+QUEUE_STAGES = ("admission", "llm", "render")
+
+
+def percentiles(values: List[float]) -> Optional[dict]:
+    """Nearest-rank percentiles; None without samples."""
+    if not values:
+        return None
+    ordered = sorted(values)
+
+    def rank(fraction: float) -> float:
+        return ordered[min(len(ordered) - 1, max(0, int(round(fraction * len(ordered))) - 1))]
+
+    return {
+        "count": len(ordered),
+        "mean": sum(ordered) / len(ordered),
+        "p50": rank(0.50),
+        "p90": rank(0.90),
+        "p99": rank(0.99),
+        "max": ordered[-1],
+    }
+
+
+class ApiClient:
+    """One keep-alive HTTP connection per thread."""
+
+    def __init__(self, base_url: str, timeout: float):
+        parts = urlsplit(base_url)
+        self.connection_class = http.client.HTTPSConnection if parts.scheme == "https" else http.client.HTTPConnection
+        self.netloc = parts.netloc
+        self.prefix = parts.path.rstrip("/")
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def close(self):
+        """Closes this thread's connection."""
+        connection = getattr(self._local, "connection", None)
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
+
+    def request(self, method: str, path: str, body: Optional[dict] = None) -> tuple:
+        """Returns (status code, decoded JSON body or None, seconds taken)."""
+        payload = json.dumps(body).encode("utf-8") if body is not None else None
+        headers = {"Content-Type": "application/json"} if payload is not None else {}
+        for attempt in range(2):
+            connection = getattr(self._local, "connection", None)
+            if connection is None:
+                connection = self._local.connection = self.connection_class(self.netloc, timeout=self.timeout)
+            started = time.perf_counter()
+            try:
+                connection.request(method, self.prefix + path, body=payload, headers=headers)
+                response = connection.getresponse()
+                data = response.read()
+            except (http.client.HTTPException, OSError):
+                # A kept-alive connection the server has closed; retry once on a fresh one.
+                connection.close()
+                self._local.connection = None
+                if attempt:
+                    raise
+                continue
+            elapsed = time.perf_counter() - started
+            try:
+                decoded = json.loads(data) if data else None
+            except ValueError:
+                decoded = None
+            return response.status, decoded, elapsed
+
+
+class LoadTest:
+    def __init__(self, client: ApiClient, args: argparse.Namespace):
+        self.client = client
+        self.args = args
+        self.lock = threading.Lock()
+        self.submit_latencies = []
+        self.status_latencies = []
+        self.request_errors = 0
+        self.jobs = []
+        # (due time, job index, job) of every job being followed
+        self.polls: "queue.PriorityQueue" = queue.PriorityQueue()
+
+    def _record(self, samples: list, seconds: float):
+        with self.lock:
+            samples.append(seconds)
+
+    def topic(self, index: int) -> str:
+        if self.args.topics:
+            return self.args.topics[index % len(self.args.topics)]
+        # Distinct topics, so every request runs its own job instead of being coalesced.
+        return f"Load test topic {index} {random.getrandbits(32):08x}"
+
+    def submit_job(self, index: int, scheduled_at: float):
+        """Sends one job's POST (on its own thread) and hands the job to the pollers."""
+        job = {"index": index, "outcome": "error", "queue_seconds": {}}
+        with self.lock:
+            self.jobs.append(job)
+        job["posted_at"] = time.perf_counter()
+        job["submit_lag"] = job["posted_at"] - scheduled_at
+        try:
+            status, body, elapsed = self.client.request(
+                "POST", "/generate-video", {"topic": self.topic(index), "bypass_cache": self.args.bypass_cache}
+            )
+        except (http.client.HTTPException, OSError) as e:
+            with self.lock:
+                self.request_errors += 1
+            job["error"] = str(e)
+            return
+        finally:
+            self.client.close()
+        self._record(self.submit_latencies, elapsed)
+        if status != 202:
+            job["outcome"] = "rejected"
+            job["error"] = f"HTTP {status}: {body}"
+            return
+
+        now = time.perf_counter()
+        job.update(
+            video_id=body["video_id"],
+            deadline=job["posted_at"] + self.args.job_timeout,
+            # A new job starts out waiting for admission; a coalesced one follows its leader.
+            queue_stage="admission" if body.get("status") == "queued" else None,
+            entered_at=now,
+        )
+        self.polls.put((now + self.args.poll_interval, index, job))
+
+    def poll_job(self, job: dict) -> bool:
+        """Polls one job's status; True once it has finished or timed out."""
+        if time.perf_counter() >= job["deadline"]:
+            job["outcome"] = "timed_out"
+            return True
+        try:
+            status, body, elapsed = self.client.request("GET", f"/video-status/{job['video_id']}")
+        except (http.client.HTTPException, OSError):
+            with self.lock:
+                self.request_errors += 1
+            return False
+        self._record(self.status_latencies, elapsed)
+        if status != 200:
+            return False
+        now = time.perf_counter()
+        queue_stage = body.get("queue_stage")
+        if queue_stage != job["queue_stage"]:
+            # Time in a queue is only known to poll-interval precision.
+            previous = job["queue_stage"]
+            if previous is not None:
+                job["queue_seconds"][previous] = job["queue_seconds"].get(previous, 0.0) + now - job["entered_at"]
+            job["queue_stage"], job["entered_at"] = queue_stage, now
+        if body["status"] in TERMINAL_STATUSES:
+            job["outcome"] = body["status"]
+            job["seconds"] = now - job["posted_at"]
+            if body["status"] == "failed":
+                job["error"] = body.get("error")
+            return True
+        return False
+
+    def poll_jobs(self):
+        """Poller thread: polls whichever followed job is due next, until it takes a stop entry."""
+        while True:
+            due_at, index, job = self.polls.get()
+            try:
+                if job is None:
+                    return
+                delay = due_at - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                if not self.poll_job(job):
+                    # Queued before task_done(), so polls.join() waits for the job to finish.
+                    self.polls.put((time.perf_counter() + self.args.poll_interval, index, job))
+            finally:
+                self.polls.task_done()
+
+    def run(self) -> dict:
+        """Submits jobs at the target rate for the configured duration, then waits for them."""
+        count = int(self.args.rate * self.args.duration)
+        pollers = [
+            threading.Thread(target=self.poll_jobs, name=f"loadgen-poll-{number}", daemon=True)
+            for number in range(self.args.max_threads)
+        ]
+        for poller in pollers:
+            poller.start()
+
+        started = time.perf_counter()
+        next_at = started
+        submitters = []
+        for index in range(count):
+            delay = next_at - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            submitter = threading.Thread(
+                target=self.submit_job, args=(index, next_at), name=f"loadgen-submit-{index}", daemon=True
+            )
+            submitter.start()
+            submitters.append(submitter)
+            if self.args.arrivals == "poisson":
+                next_at += random.expovariate(self.args.rate)
+            else:
+                next_at += 1 / self.args.rate
+        for submitter in submitters:
+            submitter.join()
+        self.polls.join()
+        for number in range(len(pollers)):
+            self.polls.put((float("inf"), -1 - number, None))
+        for poller in pollers:
+            poller.join()
+        elapsed = time.perf_counter() - started
+        return self.report(count, elapsed)
+
+    def report(self, count: int, elapsed: float) -> dict:
+        outcomes = {}
+        for job in self.jobs:
+            outcomes[job["outcome"]] = outcomes.get(job["outcome"], 0) + 1
+        completed = [job for job in self.jobs if job["outcome"] == "completed"]
+        finished = [job for job in self.jobs if job["outcome"] in TERMINAL_STATUSES]
+        # From when the POSTs actually went out, not when they were scheduled.
+        posted = sorted(job["posted_at"] for job in self.jobs)
+        return {
+            "config": {
+                "url": self.args.url,
+                "rate_per_second": self.args.rate,
+                "duration_seconds": self.args.duration,
+                "arrivals": self.args.arrivals,
+                "poll_interval_seconds": self.args.poll_interval,
+            },
+            "jobs": count,
+            "outcomes": outcomes,
+            "request_errors": self.request_errors,
+            "achieved_submit_rate": (
+                (len(posted) - 1) / (posted[-1] - posted[0]) if len(posted) > 1 and posted[-1] > posted[0] else None
+            ),
+            # How late POSTs went out relative to their scheduled arrival.
+            "submit_lag_seconds": percentiles([job["submit_lag"] for job in self.jobs]),
+            "elapsed_seconds": elapsed,
+            # Finished jobs per second over the whole run, drain included.
+            "throughput_jobs_per_second": len(completed) / elapsed if elapsed else None,
+            "submit_latency_seconds": percentiles(self.submit_latencies),
+            "status_latency_seconds": percentiles(self.status_latencies),
+            "job_seconds": percentiles([job["seconds"] for job in completed]),
+            "queue_delay_seconds": {
+                stage: percentiles([job["queue_seconds"].get(stage, 0.0) for job in finished])
+                for stage in QUEUE_STAGES
+            },
+            "errors": sorted({job["error"] for job in self.jobs if job.get("error")})[:20],
+        }
+
+
+def _format(stats: Optional[dict], unit: str = "s") -> str:
+    if stats is None:
+        return "n/a"
+    return " ".join(f"{name} {stats[name]:.3f}{unit}" for name in ("p50", "p90", "p99", "max"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Drive /generate-video and /video-status at a target rate.")
+    parser.add_argument("--url", default="http://localhost:8000", help="Base URL of the API")
+    parser.add_argument("--rate", type=float, default=0.5, help="Jobs submitted per second")
+    parser.add_argument("--duration", type=float, default=60, help="Seconds to keep submitting")
+    parser.add_argument("--arrivals", choices=["uniform", "poisson"], default="poisson",
+                        help="Evenly spaced submissions, or random ones at the same average rate")
+    parser.add_argument("--poll-interval", type=float, default=1.0, help="Seconds between status polls per job")
+    parser.add_argument("--job-timeout", type=float, default=1800, help="Give up following a job after this long")
+    parser.add_argument("--request-timeout", type=float, default=30, help="Timeout of a single HTTP request")
+    parser.add_argument("--max-threads", type=int, default=16, help="Threads polling job status")
+    parser.add_argument("--topic", dest="topics", action="append", default=[],
+                        help="Topic to submit (repeatable, used round-robin); repeats exercise coalescing")
+    parser.add_argument("--bypass-cache", action="store_true", help="Ask for fresh LLM responses")
+    parser.add_argument("--seed", type=int, help="Seed for topics and Poisson arrivals")
+    parser.add_argument("--output", help="Write the full report as JSON to this file")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    if args.rate <= 0 or args.duration <= 0:
+        parser.error("--rate and --duration must be positive.")
+    if args.seed is not None:
+        random.seed(args.seed)
+
+    logger.info(f"Submitting {int(args.rate * args.duration)} jobs to {args.url} at {args.rate}/s ({args.arrivals}).")
+    report = LoadTest(ApiClient(args.url, args.request_timeout), args).run()
+
+    logger.info(f"Outcomes: {report['outcomes']}; {report['request_errors']} request errors.")
+    logger.info(f"Throughput: {report['throughput_jobs_per_second'] or 0:.3f} completed jobs/s over {report['elapsed_seconds']:.0f}s.")
+    logger.info(f"Achieved submit rate: {report['achieved_submit_rate'] or 0:.3f}/s; lag behind schedule: {_format(report['submit_lag_seconds'])}")
+    logger.info(f"POST /generate-video latency: {_format(report['submit_latency_seconds'])}")
+    logger.info(f"GET /video-status latency: {_format(report['status_latency_seconds'])}")
+    logger.info(f"Job duration: {_format(report['job_seconds'])}")
+    for stage, stats in report["queue_delay_seconds"].items():
+        logger.info(f"Queueing delay ({stage}): {_format(stats)}")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        logger.info(f"Report written to {args.output}.")
+    return 0 if report["outcomes"].get("completed") else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
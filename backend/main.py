@@ -1,24 +1,53 @@
 # main.py
 
+# Started before any other import, to report what a cold start spends its time on.
+from startup import ImportTimer
+import_timer = ImportTimer().start()
+
 import os
 import uuid
+import secrets
 import asyncio
 import logging
 import subprocess
 import sys
 import shutil
+import errno
+import json
 import re
+import time
+from contextlib import contextmanager
 from pathlib import Path
 
-from fastapi import FastAPI, HTTPException, BackgroundTasks
+from fastapi import FastAPI, Header, HTTPException, Request, Response, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse, HTMLResponse
+from fastapi.responses import FileResponse, HTMLResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
-from typing import Optional
+from typing import Callable, Dict, List, Optional
 from dotenv import load_dotenv
 
-import google.generativeai as genai
+from artifacts import ArtifactStore
+from events import JobEventBus, format_sse, is_terminal
+from llm_cache import LLMResponseCache, normalize_input
+from llm_client import MANIM_SCRIPT, NARRATION, FakeLLMClient, GeminiClient, load_stored_scripts
+from metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, REGISTRY, Counter, CounterFunction, Gauge, Histogram
+from profiling import merge_samples, write_collapsed
+from render_progress import RenderLog, combine_progress, count_animation_calls, follow_log_file, pipe_to_log
+from render_workers import RenderWorkerPool
+from scheduler import PRIORITY_BACKGROUND, PRIORITY_BATCH, PRIORITY_INTERACTIVE, JobScheduler, StageLimiter
+from script_validator import ScriptDryRunError, ScriptValidationError, ValidationResult, validate_script
+from segmented_render import build_segment_script, concat_segments
+from task_store import TERMINAL_STATUSES, TaskStore, owned_here
+from tracing import JobTrace, add_span, current_trace, job_trace, span, track
+from tts_service import DEFAULT_SOCKET_PATH as DEFAULT_TTS_SOCKET_PATH, TTSServiceError, request as tts_service_request
+from typeset_cache import TypesetCache
+from video_delivery import (
+    IMMUTABLE_CACHE_CONTROL, REVALIDATE_CACHE_CONTROL, VideoFileResponse, etag_matches, file_sha256, strong_etag,
+)
+
+import_timer.stop()
+module_setup_started = time.perf_counter()
 
 # --- Configuration & Initialization ---
 
@@ -57,6 +86,9 @@ else:
 
 class VideoRequest(BaseModel):
     topic: str
+    bypass_cache: bool = False
+    # Sample the render with a profiler (admin only; see /video-profile).
+    profile: bool = False
 
 class VideoResponse(BaseModel):
     video_id: str
@@ -68,23 +100,314 @@ class VideoStatus(BaseModel):
     status: str
     video_url: Optional[str] = None
     error: Optional[str] = None
+    coalesced_with: Optional[str] = None
+    animations_done: Optional[int] = None
+    animations_total: Optional[int] = None
+    frames_done: Optional[int] = None
+    queue_stage: Optional[str] = None
+    queue_position: Optional[int] = None
+    renditions: Optional[dict] = None
+    upgrade_status: Optional[str] = None
+
+class BatchRequest(BaseModel):
+    topics: List[str]
+    bypass_cache: bool = False
+
+class BatchResponse(BaseModel):
+    batch_id: str
+    video_ids: List[str]
+    status: str
+    message: str
+
+class BatchStatus(BaseModel):
+    batch_id: str
+    # "in_progress" until every member has completed or failed, then "completed".
+    status: str
+    counts: dict
+    videos: List[VideoStatus]
 
-# --- In-Memory Task Storage ---
-video_tasks = {}
+# --- Task Storage ---
+# Shared by every API process on the host, so any uvicorn worker can answer
+# status requests and jobs survive a restart.
+TASK_DB_PATH = os.getenv("TASK_DB_PATH", "tasks.db")
+task_store = TaskStore(TASK_DB_PATH)
 
-# --- Gemini AI Configuration ---
+# --- LLM Client ---
+# "gemini" calls the Gemini API; "fake" answers locally with stored scripts
+# after a simulated latency (FAKE_LLM_*), for load tests that must not spend
+# API quota. Fake responses are cached under their own model name.
+GEMINI_MODEL_NAME = "gemini-2.0-flash"
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-if not GEMINI_API_KEY:
-    logger.critical("GEMINI_API_KEY not found. Video generation will fail.")
+LLM_BACKEND = os.getenv("LLM_BACKEND", "gemini").lower()
+if LLM_BACKEND == "fake":
+    llm_client = FakeLLMClient(
+        load_stored_scripts(os.getenv("FAKE_LLM_SCRIPTS_DIR", "manim_scripts")),
+        latency=os.getenv("FAKE_LLM_LATENCY", "lognormal:2000,0.5"),
+        error_rate=float(os.getenv("FAKE_LLM_ERROR_RATE", "0")),
+        seed=int(os.getenv("FAKE_LLM_SEED")) if os.getenv("FAKE_LLM_SEED") else None,
+    )
+    logger.warning(f"LLM_BACKEND=fake: answering with {len(llm_client.scripts)} stored scripts instead of Gemini.")
 else:
-    genai.configure(api_key=GEMINI_API_KEY)
-    logger.info("Google Generative AI (Gemini) configured successfully.")
+    llm_client = GeminiClient(GEMINI_MODEL_NAME, GEMINI_API_KEY)
+    if not GEMINI_API_KEY:
+        logger.critical("GEMINI_API_KEY not found. Video generation will fail.")
+    else:
+        logger.info("Gemini API key found; the SDK is loaded by the start-up warm-up or on first use.")
+
+# --- LLM Response Cache ---
+# Bump a version whenever its prompt template changes, so responses generated
+# from the old prompt are no longer served from the cache.
+NARRATION_PROMPT_VERSION = "1"
+MANIM_PROMPT_VERSION = "2"
+
+llm_cache = LLMResponseCache(
+    root=os.getenv("LLM_CACHE_DIR", "llm_cache"),
+    ttl_seconds=float(os.getenv("LLM_CACHE_TTL_HOURS", "168")) * 3600,
+    max_bytes=int(os.getenv("LLM_CACHE_MAX_MB", "256")) * 1024 * 1024,
+)
+
+# --- Job Scheduling ---
+# LLM calls are network-bound and cheap to overlap; renders are CPU-bound and
+# each spawns a Manim process, so they get their own (smaller) limit.
+LLM_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY", "4"))
+RENDER_CONCURRENCY = int(os.getenv("RENDER_CONCURRENCY", "2"))
+MAX_ACTIVE_JOBS = int(os.getenv("MAX_ACTIVE_JOBS", str(LLM_CONCURRENCY + RENDER_CONCURRENCY)))
+SHUTDOWN_GRACE_SECONDS = float(os.getenv("SHUTDOWN_GRACE_SECONDS", "30"))
+
+scheduler = JobScheduler(
+    max_active_jobs=MAX_ACTIVE_JOBS,
+    llm_slots=LLM_CONCURRENCY,
+    render_slots=RENDER_CONCURRENCY,
+)
+
+# A batch (POST /generate-videos) runs as one scheduler job that starts its
+# members itself, so it takes one job worker however many topics it has.
+# BATCH_LOOKAHEAD bounds how many of its members may be before their render
+# (generating or holding a finished script) at once.
+BATCH_MAX_TOPICS = int(os.getenv("BATCH_MAX_TOPICS", "50"))
+BATCH_LOOKAHEAD = int(os.getenv("BATCH_LOOKAHEAD", str(LLM_CONCURRENCY)))
+# batch ID -> {video_id: topic} of the members its job hasn't started yet
+batch_backlogs: Dict[str, Dict[str, str]] = {}
+
+# --- Render Workers ---
+# "warm" renders on long-lived, pre-imported worker processes; "subprocess"
+# spawns `python -m manim` per job.
+RENDER_BACKEND = os.getenv("RENDER_BACKEND", "warm")
+RENDER_WORKER_MAX_JOBS = int(os.getenv("RENDER_WORKER_MAX_JOBS", "20"))
+# Segmented renders fan one job out over several workers, so the pool can be
+# larger than RENDER_CONCURRENCY; idle workers are only spawned on demand.
+RENDER_POOL_WORKERS = int(os.getenv("RENDER_POOL_WORKERS", str(os.cpu_count() or RENDER_CONCURRENCY)))
+SEGMENTED_RENDER = os.getenv("SEGMENTED_RENDER", "true").lower() == "true"
+# Execute each generated scene once without rendering frames (speech stubbed
+# to a fixed length per voiceover block) and send scripts that raise back to
+# the LLM with the error, up to SCRIPT_REGENERATION_ATTEMPTS times.
+DRY_RUN_RENDER = os.getenv("DRY_RUN_RENDER", "true").lower() == "true"
+DRY_RUN_VOICEOVER_SECONDS = float(os.getenv("DRY_RUN_VOICEOVER_SECONDS", "2"))
+# A scene still running after this long fails its dry run (e.g. an endless loop).
+DRY_RUN_TIMEOUT_SECONDS = float(os.getenv("DRY_RUN_TIMEOUT_SECONDS", "60"))
+SCRIPT_REGENERATION_ATTEMPTS = int(os.getenv("SCRIPT_REGENERATION_ATTEMPTS", "1"))
+
+render_pool = RenderWorkerPool(workers=RENDER_POOL_WORKERS, max_jobs_per_worker=RENDER_WORKER_MAX_JOBS)
+
+# --- Renditions ---
+# Every job first renders a fast preview and is playable as soon as that is
+# done. UPGRADE_RENDITION (empty to disable) is then rendered from the same
+# script and cached audio at background priority, at most UPGRADE_CONCURRENCY
+# at a time, and swapped in as the video served at /videos/{video_id}.
+RENDITIONS = {"480p15": (854, 480, 15), "720p30": (1280, 720, 30), "1080p60": (1920, 1080, 60)}
+RENDITION_CLI_QUALITY = {"480p15": "l", "720p30": "m", "1080p60": "h"}
+PREVIEW_RENDITION = "480p15"
+UPGRADE_RENDITION = os.getenv("UPGRADE_RENDITION", "720p30") or None
+if UPGRADE_RENDITION is not None and UPGRADE_RENDITION not in RENDITIONS:
+    logger.error(f"Unknown UPGRADE_RENDITION '{UPGRADE_RENDITION}' (expected one of {sorted(RENDITIONS)}); upgrades disabled.")
+    UPGRADE_RENDITION = None
+if UPGRADE_RENDITION == PREVIEW_RENDITION:
+    UPGRADE_RENDITION = None
+UPGRADE_CONCURRENCY = int(os.getenv("UPGRADE_CONCURRENCY", "1"))
+
+upgrade_limiter = StageLimiter("upgrade", UPGRADE_CONCURRENCY)
+upgrade_tasks: set = set()
+
+# --- TTS Service ---
+# A resident Coqui model shared by all render workers (see tts_service.py),
+# backed by a content-addressed audio cache (AUDIO_CACHE_DIR, AUDIO_CACHE_MAX_MB).
+# Set TTS_SERVICE_AUTOSTART=false when running it separately.
+TTS_SERVICE_AUTOSTART = os.getenv("TTS_SERVICE_AUTOSTART", "true").lower() == "true"
+TTS_SOCKET_PATH = os.getenv("TTS_SOCKET_PATH", DEFAULT_TTS_SOCKET_PATH)
+os.environ["TTS_SOCKET_PATH"] = TTS_SOCKET_PATH  # inherited by render workers
+tts_process: Optional[asyncio.subprocess.Process] = None
 
 # Create necessary directories on startup
 Path("manim_scripts").mkdir(exist_ok=True)
 Path("generated_videos").mkdir(exist_ok=True)
 Path("manim_media").mkdir(exist_ok=True)
 
+# --- Render Progress ---
+# Full Manim output of every render; only a short tail is kept in memory.
+RENDER_LOG_DIR = Path(os.getenv("RENDER_LOG_DIR", "render_logs"))
+RENDER_LOG_DIR.mkdir(exist_ok=True)
+# How often a running render's progress is written to the task store.
+PROGRESS_UPDATE_SECONDS = 1.0
+
+# --- Job Traces ---
+# Each job's timeline (stages, slot waits, Manim animations, TTS calls) is
+# written here as Chrome trace-event JSON when it finishes; see tracing.py.
+TRACE_DIR = Path(os.getenv("TRACE_DIR", "traces"))
+TRACE_DIR.mkdir(exist_ok=True)
+
+# --- Render Profiling ---
+# Requests with `profile` (sent with an X-Admin-Token header matching
+# ADMIN_TOKEN) have their render sampled every PROFILE_SAMPLE_INTERVAL_MS;
+# the collapsed stacks are written to PROFILE_DIR. Unset ADMIN_TOKEN
+# disables admin-only features.
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN") or None
+PROFILE_DIR = Path(os.getenv("PROFILE_DIR", "profiles"))
+PROFILE_DIR.mkdir(exist_ok=True)
+PROFILE_SAMPLE_INTERVAL_SECONDS = float(os.getenv("PROFILE_SAMPLE_INTERVAL_MS", "5")) / 1000
+
+# --- Typesetting Cache ---
+# LaTeX and Pango SVGs shared by all render workers (see typeset_cache.py).
+# Pre-populate it with `python typeset_cache.py`.
+TYPESET_CACHE_DIR = os.path.abspath(os.getenv("TYPESET_CACHE_DIR", "typeset_cache"))
+os.environ["TYPESET_CACHE_DIR"] = TYPESET_CACHE_DIR  # inherited by render workers
+# Before a warm-worker render, typeset all of a script's constant Tex/MathTex
+# in one multi-page LaTeX run instead of one latex + dvisvgm per expression.
+TEX_BATCH_PRERENDER = os.getenv("TEX_BATCH_PRERENDER", "true").lower() == "true"
+
+# --- Artifact Storage ---
+# Byte budgets per artifact directory; a background sweeper evicts the least
+# recently used files of finished jobs to stay within them.
+MB = 1024 * 1024
+artifact_store = ArtifactStore(
+    budgets={
+        "generated_videos": int(os.getenv("VIDEO_STORE_MAX_MB", "10240")) * MB,
+        "manim_media": int(os.getenv("RENDER_MEDIA_MAX_MB", "5120")) * MB,
+        "generated_audio": int(os.getenv("GENERATED_AUDIO_MAX_MB", "1024")) * MB,
+        str(RENDER_LOG_DIR): int(os.getenv("RENDER_LOG_MAX_MB", "512")) * MB,
+        str(TRACE_DIR): int(os.getenv("TRACE_MAX_MB", "256")) * MB,
+        str(PROFILE_DIR): int(os.getenv("PROFILE_MAX_MB", "256")) * MB,
+    },
+    # Renders aren't started with less free disk space than this.
+    min_free_bytes=int(os.getenv("MIN_FREE_DISK_MB", "2048")) * MB,
+    # Manim's SVGs, shared by all jobs: one may be read moments after LaTeX or
+    # Pango wrote it, and no job ID in the path could pin it.
+    unswept=["manim_media/Tex", "manim_media/texts"],
+)
+ARTIFACT_SWEEP_INTERVAL_SECONDS = float(os.getenv("ARTIFACT_SWEEP_INTERVAL_SECONDS", "300"))
+artifact_sweeper: Optional[asyncio.Task] = None
+# The typesetting cache is trimmed on its own, not by the sweeper: render
+# workers read it by content hash, outside any job's pinned artifacts.
+typeset_store = TypesetCache(TYPESET_CACHE_DIR)
+TYPESET_CACHE_MAX_BYTES = int(os.getenv("TYPESET_CACHE_MAX_MB", "512")) * MB
+typeset_trimmer: Optional[asyncio.Task] = None
+
+# --- Start-Up Warm-Up ---
+# Requests are served as soon as the startup handler returns. The Gemini SDK
+# and a render worker (with Manim preloaded) are then loaded in the
+# background rather than by the first job; STARTUP_WARMUP=false leaves them
+# to first use.
+STARTUP_WARMUP = os.getenv("STARTUP_WARMUP", "true").lower() == "true"
+warmup_task: Optional[asyncio.Task] = None
+
+# --- Metrics ---
+# Exported at /metrics in the Prometheus text format (see metrics.py). TTS
+# numbers come from the TTS service's stats, fetched on each scrape.
+STAGE_SECONDS = Histogram("learntube_stage_seconds", "Time spent in each pipeline stage.", ("stage",))
+FAILURES = Counter(
+    "learntube_failures_total", "Failed jobs and quality upgrades by exception class.", ("kind", "error_class")
+)
+JOBS_COMPLETED = Counter("learntube_jobs_completed_total", "Jobs that produced a video.")
+ACTIVE_SUBPROCESSES = Gauge(
+    "learntube_active_subprocesses", "Render worker calls, Manim CLI renders and ffmpeg runs in flight.", ("kind",),
+    function=lambda: {("render_worker",): render_pool.busy},
+)
+QUEUE_DEPTH = Gauge(
+    "learntube_queue_depth", "Jobs waiting for admission, their batch or a stage slot.", ("queue",),
+    function=lambda: {
+        ("admission",): scheduler.stats()["pending"],
+        ("batch",): sum(len(backlog) for backlog in batch_backlogs.values()),
+        ("llm",): scheduler.llm.waiting(),
+        ("render",): scheduler.render.waiting(),
+        ("upgrade",): upgrade_limiter.waiting(),
+    },
+)
+SLOTS_IN_USE = Gauge(
+    "learntube_slots_in_use", "Busy slots per stage.", ("stage",),
+    function=lambda: {
+        ("job",): scheduler.stats()["running"],
+        ("llm",): scheduler.llm.in_use,
+        ("render",): scheduler.render.in_use,
+        ("upgrade",): upgrade_limiter.in_use,
+    },
+)
+# Reported back by render workers with each render and dry run.
+typeset_lookups = Counter("typeset_lookups", "Typesetting cache lookups in render workers.", ("result",), registry=None)
+latest_tts_stats: dict = {}
+
+
+def cache_lookups() -> dict:
+    lookups = {
+        ("llm", "hit"): llm_cache.hits,
+        ("llm", "miss"): llm_cache.misses,
+        ("typeset", "hit"): typeset_lookups.value("hit"),
+        ("typeset", "miss"): typeset_lookups.value("miss"),
+    }
+    audio_cache_stats = latest_tts_stats.get("audio_cache")
+    if audio_cache_stats:
+        lookups[("audio", "hit")] = audio_cache_stats["hits"]
+        lookups[("audio", "miss")] = audio_cache_stats["misses"]
+    return lookups
+
+
+def cache_hit_ratios() -> dict:
+    lookups = cache_lookups()
+    ratios = {}
+    for cache, _ in lookups:
+        hits, misses = lookups[(cache, "hit")], lookups[(cache, "miss")]
+        ratios[(cache,)] = hits / (hits + misses) if hits + misses else None
+    return ratios
+
+
+CACHE_LOOKUPS = CounterFunction(
+    "learntube_cache_lookups_total", "Cache lookups by cache and result.", ("cache", "result"), function=cache_lookups
+)
+CACHE_HIT_RATIO = Gauge("learntube_cache_hit_ratio", "Share of lookups that hit, per cache.", ("cache",),
+                        function=cache_hit_ratios)
+TTS_EVENTS = CounterFunction(
+    "learntube_tts_events_total", "TTS service requests, batches, synthesized sentences and failures.", ("event",),
+    function=lambda: {
+        (event,): latest_tts_stats[event]
+        for event in ("requests", "batches", "sentences_synthesized", "failures") if event in latest_tts_stats
+    },
+)
+TTS_SERVICE_UP = Gauge("learntube_tts_service_up", "Whether the TTS service answered the last scrape.",
+                       function=lambda: 1 if latest_tts_stats else 0)
+
+
+def count_typeset_lookups(result: dict):
+    typeset_lookups.inc("hit", amount=result.get("typeset_hits", 0))
+    typeset_lookups.inc("miss", amount=result.get("typeset_misses", 0))
+
+
+@contextmanager
+def stage(name: str, **args):
+    """Times a pipeline stage for /metrics and records it as a span of the job's trace."""
+    with STAGE_SECONDS.time(name), span(name, **args) as details:
+        yield details
+
+
+async def refresh_tts_stats():
+    """Fetches the TTS service's counters and synthesis-time histogram for the next scrape."""
+    global latest_tts_stats
+    try:
+        stats = await asyncio.to_thread(tts_service_request, {"op": "stats"}, TTS_SOCKET_PATH, 1.0)
+    except TTSServiceError:
+        latest_tts_stats = {}
+        return
+    latest_tts_stats = stats
+    if "batch_seconds" in stats:
+        STAGE_SECONDS.set_external(stats["batch_seconds"], "tts")
+
 
 # --- Helper Functions ---
 
@@ -92,14 +415,44 @@ def to_pascal_case(text: str) -> str:
     """Converts a string to PascalCase, suitable for a Python class name."""
     return "".join(word.capitalize() for word in re.split(r'[\s\W_]+', text))
 
+def topic_key(topic: str) -> str:
+    """Normalizes a topic for request coalescing (same rules as the LLM cache)."""
+    return normalize_input(topic)
+
+def require_admin(token: Optional[str]):
+    """Rejects a request unless its X-Admin-Token matches ADMIN_TOKEN."""
+    if ADMIN_TOKEN is None or token is None or not secrets.compare_digest(token.encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=403, detail="This requires a valid X-Admin-Token header.")
+
+def use_local_tts_service(manim_script: str) -> str:
+    """
+    Points a generated script at the resident TTS service by swapping
+    manim-voiceover's CoquiService for our drop-in LocalCoquiService.
+    """
+    manim_script = re.sub(
+        r'^from manim_voiceover\.services\.coqui import CoquiService\s*$',
+        'from voiceover_service import LocalCoquiService',
+        manim_script,
+        flags=re.MULTILINE,
+    )
+    return re.sub(r'\bCoquiService\(', 'LocalCoquiService(', manim_script)
+
 # --- Core Generation Logic ---
 
-async def generate_educational_script(topic: str) -> str:
+async def generate_educational_script(topic: str, use_cache: bool = True) -> str:
     """
     Step 1: Generate the narration script for the video using Gemini.
+    Responses are cached per (model, prompt version, topic); `use_cache=False`
+    skips the lookup but still refreshes the cache.
     """
+    cache_key = LLMResponseCache.make_key(llm_client.model_name, NARRATION_PROMPT_VERSION, topic=topic)
+    if use_cache:
+        cached_script = llm_cache.get(cache_key)
+        if cached_script is not None:
+            logger.info(f"Using cached narration script for topic: '{topic}'")
+            return cached_script
+
     logger.info(f"Generating educational narration script for topic: '{topic}'")
-    model = genai.GenerativeModel('gemini-2.0-flash')
     
     prompt = f"""
     You are an expert scriptwriter for educational YouTube videos.
@@ -108,22 +461,59 @@ async def generate_educational_script(topic: str) -> str:
     """
     
     try:
-        response = await model.generate_content_async(prompt)
-        return response.text
+        with stage("narration", model=llm_client.model_name) as details:
+            narration_script = await llm_client.generate(prompt, NARRATION)
+            details["response_chars"] = len(narration_script)
     except Exception as e:
-        logger.error(f"Error generating narration script with Gemini: {e}")
+        logger.error(f"Error generating narration script with {llm_client.model_name}: {e}")
         raise ValueError(f"Failed to generate narration script: {e}")
 
+    llm_cache.put(cache_key, narration_script, model=llm_client.model_name, template_version=NARRATION_PROMPT_VERSION)
+    return narration_script
+
+
+def manim_script_cache_key(topic: str, narration_script: str) -> str:
+    return LLMResponseCache.make_key(
+        llm_client.model_name, MANIM_PROMPT_VERSION, topic=topic, narration_script=narration_script
+    )
+
 
-async def generate_manim_voiceover_script(topic: str, narration_script: str) -> str:
+async def generate_manim_voiceover_script(
+    topic: str, narration_script: str, use_cache: bool = True, previous_failure: Optional[tuple] = None
+) -> ValidationResult:
     """
     Step 2: Generate a complete Manim script with integrated Coqui TTS voiceover.
-    Uses the visualization-heavy prompt strategy.
+    Uses the visualization-heavy prompt strategy. The script is validated
+    (and known LLM mistakes fixed) before anything renders it. With
+    `previous_failure` (script, error), the model is asked to fix that script
+    instead, bypassing the cache. The caller caches the script once it has
+    passed every check.
     """
-    logger.info(f"Generating Manim script with Coqui TTS for topic: '{topic}'")
-    model = genai.GenerativeModel('gemini-2.0-flash')
-    
     scene_class_name = f"{to_pascal_case(topic)}Scene"
+    cache_key = manim_script_cache_key(topic, narration_script)
+    if use_cache and previous_failure is None:
+        cached_code = llm_cache.get(cache_key)
+        if cached_code is not None:
+            logger.info(f"Using cached Manim script for topic: '{topic}'")
+            with stage("validation"):
+                return validate_script(cached_code, scene_class_name)
+
+    logger.info(f"Generating Manim script with Coqui TTS for topic: '{topic}'")
+
+    feedback = ""
+    if previous_failure is not None:
+        previous_script, previous_error = previous_failure
+        feedback = f"""
+    ### **YOUR PREVIOUS SCRIPT FAILED**
+    This script, generated for the same narration, failed with:
+    {previous_error}
+
+    ```python
+{previous_script}
+    ```
+    Fix this error (and any similar ones) and return the complete corrected script.
+    ---
+"""
 
     prompt = f"""
     You are a world-class motion graphics artist and expert Manim developer, specializing in creating visually-heavy educational content with the `manim-voiceover` plugin. Your goal is to produce a Manim script that is not just text on a screen, but a rich, dynamic, and memorable visual explanation of the topic: "{topic}".
@@ -222,110 +612,790 @@ async def generate_manim_voiceover_script(topic: str, narration_script: str) ->
     ### **Provided Narration Script (To be turned into visuals)**
     {narration_script}
     ---
-
+{feedback}
     Now, generate the complete, visualization-heavy Manim script using only built-in Manim objects and correct parameter names.
     """
 
     try:
-        response = await model.generate_content_async(prompt)
-        clean_code = re.sub(r'^```python\n|```$', '', response.text, flags=re.MULTILINE)
-        return clean_code.strip()
+        with stage("codegen", model=llm_client.model_name, fixing_previous=previous_failure is not None) as details:
+            response_text = await llm_client.generate(prompt, MANIM_SCRIPT)
+            details["response_chars"] = len(response_text)
+        clean_code = re.sub(r'^```python\n|```$', '', response_text, flags=re.MULTILINE).strip()
     except Exception as e:
-        logger.error(f"Error generating Manim script with Gemini: {e}")
+        logger.error(f"Error generating Manim script with {llm_client.model_name}: {e}")
         raise ValueError(f"Failed to generate Manim script: {e}")
 
+    with stage("validation"):
+        return validate_script(clean_code, scene_class_name)
+
 
-async def render_manim_voiceover_video(manim_script: str, video_id: str, topic: str) -> str:
+def job_render_dir(video_id: str) -> Path:
     """
-    Step 3: Save the generated script and render it using the Manim CLI.
-    Uses -pql for rapid development preview.
+    Where a job's renders (and their partial movie files) are written, so
+    the output path is known before rendering. Tex and text caches stay
+    shared under manim_media.
     """
-    script_path = Path(f"manim_scripts/{video_id}.py")
-    scene_class_name = f"{to_pascal_case(topic)}Scene"
-    
-    logger.info(f"Saving generated Manim script to: {script_path}")
+    return Path("manim_media/videos") / video_id
+
+
+def move_into_place(source: Path, destination: Path):
+    """Moves a finished artifact to its final path atomically; copies only across filesystems."""
+    try:
+        os.replace(source, destination)
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+        temp_path = destination.with_name(f".{destination.name}.tmp")
+        shutil.copyfile(source, temp_path)
+        os.replace(temp_path, destination)
+        source.unlink()
+
+
+def rendition_file_name(video_id: str, rendition: str) -> str:
+    return f"{video_id}.{rendition}.mp4"
+
+
+def warm_render_config(video_dir: Path, output_file: str, rendition: str = PREVIEW_RENDITION) -> dict:
+    """Manim config for a warm-worker render; the preview is equivalent to `manim -ql`."""
+    pixel_width, pixel_height, frame_rate = RENDITIONS[rendition]
+    return {
+        "pixel_width": pixel_width,
+        "pixel_height": pixel_height,
+        "frame_rate": frame_rate,
+        "media_dir": "./manim_media",
+        "video_dir": str(video_dir),
+        "output_file": output_file,
+        "preview": False,
+    }
+
+
+async def render_on_pool(
+    script_path: Path, scene_name: str, video_dir: Path, output_file: str, rendition: str, render_logs: list,
+    profile_samples: Optional[dict] = None,
+) -> dict:
+    """
+    Renders one scene on the render pool while following its log file, so
+    progress is visible before the render returns. With `profile_samples`,
+    the render is profiled and its samples are added to that dict.
+    """
+    log_path = RENDER_LOG_DIR / f"{Path(output_file).stem}.log"
+    render_log = RenderLog(count_animation_calls(script_path.read_text(encoding="utf-8"), scene_name))
+    render_logs.append(render_log)
+    finished = asyncio.Event()
+    follower = asyncio.create_task(follow_log_file(log_path, render_log, finished))
+    render_track = f"manim {scene_name}"
+    result = None
+    try:
+        with track(render_track), span("manim render", "render", scene=scene_name, rendition=rendition) as details:
+            result = await render_pool.render(
+                str(script_path), scene_name, warm_render_config(video_dir, output_file, rendition), str(log_path),
+                PROFILE_SAMPLE_INTERVAL_SECONDS if profile_samples is not None else None,
+            )
+            details.update(typeset_hits=result.get("typeset_hits"), typeset_misses=result.get("typeset_misses"))
+        count_typeset_lookups(result)
+        if profile_samples is not None:
+            merge_samples(profile_samples, result["profile"])
+        return result
+    finally:
+        finished.set()
+        await follower
+        add_render_log_spans(render_log, render_track, time.time() if result is not None else None)
+
+
+def add_render_log_spans(render_log: RenderLog, render_track: str, render_finished_at: Optional[float]):
+    """
+    Adds a render's animations and voiceover audio, as parsed from its log, to
+    the job's trace. After a successful render, the time from the last
+    animation to the render returning is Manim combining the partial movies.
+    """
+    animations = render_log.animation_timings()
+    for animation in animations:
+        add_span(
+            animation["name"], animation["started"], animation["finished"], "animation", render_track,
+            index=animation["index"], frames=animation["frames"], cached=animation["cached"],
+        )
+    if animations and render_finished_at is not None:
+        add_span("combine partial movies", animations[-1]["finished"], render_finished_at, "encode", render_track)
+    speech_track = f"tts {render_track.split(' ', 1)[-1]}"
+    for speech in render_log.speech_timings():
+        details = {key: value for key, value in speech.items() if key not in ("started", "seconds")}
+        add_span("voiceover audio", speech["started"], speech["started"] + speech["seconds"], "tts", speech_track,
+                 **details)
+
+
+async def prerender_tex_on_pool(script_path: Path, video_id: str):
+    """Fills the typesetting cache with a script's LaTeX in one batch. Failures only cost the speed-up."""
+    if not TEX_BATCH_PRERENDER:
+        return
+    try:
+        with stage("tex_prerender") as details:
+            result = await render_pool.prerender_tex(str(script_path))
+            details.update(expressions=result["expressions"], compiled=result["compiled"])
+    except RuntimeError as e:
+        logger.warning(f"LaTeX pre-render failed for video_id {video_id}; typesetting during the render instead:\n{e}")
+        return
+    logger.info(f"LaTeX pre-render for video_id {video_id}: {result['compiled']} of {result['expressions']} expressions compiled.")
+
+
+async def render_with_warm_worker(
+    script_path: Path, scene_class_name: str, video_id: str, rendition: str, render_logs: list,
+    profile_samples: Optional[dict] = None,
+) -> Path:
+    """
+    Renders the scene in-process on a pre-imported worker from the render pool,
+    without the interpreter cold start of the Manim CLI.
+    """
+    logger.info(f"Rendering {scene_class_name} from {script_path} at {rendition} on a warm render worker.")
+    video_dir = job_render_dir(video_id)
+    output_file = rendition_file_name(video_id, rendition)
+    await prerender_tex_on_pool(script_path, video_id)
+    try:
+        result = await render_on_pool(
+            script_path, scene_class_name, video_dir, output_file, rendition, render_logs, profile_samples
+        )
+    except RuntimeError as e:
+        logger.error(f"Manim rendering failed for video_id {video_id}:\n{e}")
+        raise RuntimeError(f"Manim rendering failed: {e}")
+
+    logger.info(f"Manim rendering successful for video_id {video_id} in {result['render_seconds']:.1f}s.")
+    return video_dir / output_file
+
+
+async def render_segmented(
+    segment_script: str, segment_classes: list, video_id: str, rendition: str, render_logs: list,
+    profile_samples: Optional[dict] = None,
+) -> Path:
+    """
+    Renders each voiceover block as its own scene in parallel on the render
+    pool, then stitches the segments together with a stream copy.
+    """
+    script_path = Path(f"manim_scripts/{video_id}_segments.py")
     with open(script_path, "w", encoding='utf-8') as f:
-        f.write(manim_script)
+        f.write(segment_script)
+
+    logger.info(f"Rendering {len(segment_classes)} segments in parallel at {rendition} for video_id {video_id}.")
+    video_dir = job_render_dir(video_id)
+    # Once up front, rather than every segment worker racing to typeset the same expressions.
+    await prerender_tex_on_pool(script_path, video_id)
+    segment_files = [f"{video_id}.{rendition}_part{index:03d}.mp4" for index in range(len(segment_classes))]
+    try:
+        results = await asyncio.gather(*[
+            render_on_pool(script_path, class_name, video_dir, segment_file, rendition, render_logs, profile_samples)
+            for class_name, segment_file in zip(segment_classes, segment_files)
+        ])
+    except RuntimeError as e:
+        logger.error(f"Manim rendering failed for video_id {video_id}:\n{e}")
+        raise RuntimeError(f"Manim rendering failed: {e}")
 
+    segment_paths = [video_dir / segment_file for segment_file in segment_files]
+    with ACTIVE_SUBPROCESSES.track("ffmpeg"), stage("ffmpeg", segments=len(segment_paths)):
+        output_path = await concat_segments(segment_paths, video_dir / rendition_file_name(video_id, rendition))
+    for segment_path in segment_paths:
+        segment_path.unlink(missing_ok=True)
+    slowest = max(result["render_seconds"] for result in results)
+    logger.info(f"Manim rendering successful for video_id {video_id}; slowest segment took {slowest:.1f}s.")
+    return output_path
+
+
+async def render_with_subprocess(
+    script_path: Path, scene_class_name: str, video_id: str, rendition: str, render_logs: list
+) -> Path:
+    """
+    Renders the scene by spawning the Manim CLI in a fresh interpreter.
+    Uses -pql for rapid development preview.
+    """
     python_executable = sys.executable
+
+    # The CLI has no --video_dir flag, so point it at the job's directory
+    # through a per-job config file.
+    video_dir = job_render_dir(video_id)
+    video_dir.mkdir(parents=True, exist_ok=True)
+    config_path = video_dir / "manim.cfg"
+    config_path.write_text(f"[CLI]\nvideo_dir = {video_dir.resolve()}\n", encoding="utf-8")
     
-    # Using -pql (preview, low quality) as requested for development/testing
+    # Using -pql (preview, low quality) as requested for development/testing;
+    # quality upgrades use the matching -q flag of their rendition.
     # Note: Coqui models might take a while to download on first run.
+    # Caching stays enabled: voiceover audio comes from the shared audio cache.
+    output_file = rendition_file_name(video_id, rendition)
     cmd = [
         python_executable, "-m", "manim",
         str(script_path),
         scene_class_name,
-        "-pql",
+        f"-pq{RENDITION_CLI_QUALITY[rendition]}",
+        "--config_file", str(config_path),
         "--media_dir", "./manim_media",
-        "--output_file", f"{video_id}.mp4",
-        "--disable_caching" # Ensures fresh audio generation
+        "--output_file", output_file,
     ]
 
     logger.info(f"Executing Manim render command: {' '.join(cmd)}")
     
+    # Manim logs to stdout and draws progress bars on stderr; merge them so the
+    # output can be streamed to the job's log file and parsed as it arrives.
     process = await asyncio.create_subprocess_exec(
         *cmd,
         stdout=asyncio.subprocess.PIPE,
-        stderr=asyncio.subprocess.PIPE
+        stderr=asyncio.subprocess.STDOUT
     )
+    render_log = RenderLog(count_animation_calls(script_path.read_text(encoding="utf-8"), scene_class_name))
+    render_logs.append(render_log)
 
-    stdout, stderr = await process.communicate()
+    render_track = f"manim {scene_class_name}"
+    ACTIVE_SUBPROCESSES.inc("manim_cli")
+    try:
+        with track(render_track), span("manim cli", "render", scene=scene_class_name, rendition=rendition):
+            await pipe_to_log(process.stdout, RENDER_LOG_DIR / f"{Path(output_file).stem}.log", render_log)
+            await process.wait()
+    except asyncio.CancelledError:
+        # Don't leave an orphaned Manim process behind when the job is cancelled.
+        process.kill()
+        await process.wait()
+        raise
+    finally:
+        ACTIVE_SUBPROCESSES.dec("manim_cli")
+        add_render_log_spans(render_log, render_track, time.time() if process.returncode == 0 else None)
 
     if process.returncode != 0:
-        error_message = stderr.decode()
+        error_message = render_log.tail()
         logger.error(f"Manim rendering failed for video_id {video_id}:\n{error_message}")
         raise RuntimeError(f"Manim rendering failed: {error_message}")
 
     logger.info(f"Manim rendering successful for video_id {video_id}.")
+    return video_dir / output_file
+
+
+async def publish_render_progress(video_id: str, progress: dict):
+    await task_store.update_job(video_id, **progress)
+    event_bus.publish(video_id, "progress", progress)
+
+
+async def report_render_progress(video_id: str, render_logs: list):
+    """Publishes a job's combined render progress whenever it changes, until cancelled."""
+    last_progress = None
+    while True:
+        await asyncio.sleep(PROGRESS_UPDATE_SECONDS)
+        progress = combine_progress(render_logs)
+        if render_logs and progress != last_progress:
+            last_progress = progress
+            await publish_render_progress(video_id, progress)
+
+
+async def render_manim_voiceover_video(
+    manim_script: str, video_id: str, topic: str, rendition: str = PREVIEW_RENDITION, report_progress: bool = True,
+    profile: bool = False, empty_blocks: Optional[List[int]] = None,
+) -> str:
+    """
+    Step 3: Save the generated script and render it with Manim, either on
+    warm render workers (default) or via the Manim CLI (RENDER_BACKEND=subprocess).
+    On warm workers, scripts with several voiceover blocks are split and the
+    blocks rendered in parallel (SEGMENTED_RENDER) if the dry run found
+    every block after the first starting on an empty scene (`empty_blocks`,
+    the dry-run report's lines); without a dry run, they render serially.
+    With `profile`, the warm-worker render is sampled and written to PROFILE_DIR.
+    """
+    script_path = Path(f"manim_scripts/{video_id}.py")
+    scene_class_name = f"{to_pascal_case(topic)}Scene"
     
-    # Manim saves PQL video in 480p15 directory
-    source_video_path = Path(f"manim_media/videos/{scene_class_name}/480p15/{video_id}.mp4")
-    
-    # Fallback/Check for higher quality if PQL flag wasn't active
-    if not source_video_path.exists():
-        # Check standard 720p30 used in the previous version
-        source_video_path = Path(f"manim_media/videos/{scene_class_name}/720p30/{video_id}.mp4")
+    logger.info(f"Saving generated Manim script to: {script_path}")
+    with open(script_path, "w", encoding='utf-8') as f:
+        f.write(use_local_tts_service(manim_script))
+
+    segments = None
+    if RENDER_BACKEND != "subprocess" and SEGMENTED_RENDER and empty_blocks is not None:
+        segments = build_segment_script(use_local_tts_service(manim_script), scene_class_name, set(empty_blocks))
+
+    profile_samples = None
+    if profile and RENDER_BACKEND == "subprocess":
+        logger.warning(f"Profiling needs warm render workers; rendering video_id {video_id} without it.")
+    elif profile:
+        profile_samples = {}
+
+    render_logs = []
+    reporter = asyncio.create_task(report_render_progress(video_id, render_logs)) if report_progress else None
+    render_stage = "render" if rendition == PREVIEW_RENDITION else "upgrade_render"
+    try:
+        with stage(render_stage):
+            if RENDER_BACKEND == "subprocess":
+                source_video_path = await render_with_subprocess(
+                    script_path, scene_class_name, video_id, rendition, render_logs
+                )
+            elif segments is not None:
+                source_video_path = await render_segmented(
+                    *segments, video_id, rendition, render_logs, profile_samples
+                )
+            else:
+                source_video_path = await render_with_warm_worker(
+                    script_path, scene_class_name, video_id, rendition, render_logs, profile_samples
+                )
+    finally:
+        if reporter is not None:
+            reporter.cancel()
+    if report_progress:
+        await publish_render_progress(video_id, combine_progress(render_logs))
+    if profile_samples is not None:
+        profile_path = PROFILE_DIR / f"{video_id}.collapsed.txt"
+        await asyncio.to_thread(write_collapsed, profile_samples, profile_path)
+        logger.info(f"Render profile of video_id {video_id} ({sum(profile_samples.values())} samples) written to {profile_path}.")
 
     if not source_video_path.exists():
-        logger.error(f"Could not find the rendered video file at expected paths: {video_id}")
-        # Search widely if the standard path fails
-        for p in Path("manim_media").rglob(f"{video_id}.mp4"):
-            source_video_path = p
-            break
-        
-        if not source_video_path.exists():
-             raise FileNotFoundError("Rendered video file not found after Manim process completion.")
-
-
-    final_video_path = Path(f"generated_videos/{video_id}.mp4")
-    shutil.copy(source_video_path, final_video_path)
-    logger.info(f"Copied final video to: {final_video_path}")
+        raise FileNotFoundError(f"Rendered video file not found at {source_video_path} after Manim finished.")
+
+    final_video_path = Path("generated_videos") / rendition_file_name(video_id, rendition)
+    with stage("copy"):
+        move_into_place(source_video_path, final_video_path)
+    logger.info(f"Moved final video to: {final_video_path}")
+    # Partial movie files are only useful for re-rendering this exact job.
+    await asyncio.to_thread(shutil.rmtree, job_render_dir(video_id), True)
     
     return str(final_video_path)
 
 
-async def process_video_generation_pipeline(video_id: str, topic: str):
+# --- Job Events ---
+# Stage transitions are pushed to subscribers of /video-events (SSE) and
+# /ws/video-events (WebSocket) instead of clients polling /video-status.
+event_bus = JobEventBus()
+EVENT_HEARTBEAT_SECONDS = 15
+# Jobs running in another API process aren't on this process's event bus;
+# their subscribers are fed by polling the task store at this interval.
+EVENT_POLL_SECONDS = 1.0
+
+
+async def set_job_status(video_id: str, status: str, **fields):
+    """Records a job's new stage in the task store and publishes it to subscribers."""
+    await task_store.update_job(video_id, status=status, **fields)
+    event_bus.publish(video_id, "status", {"status": status, **fields})
+
+
+def status_event(task: dict) -> dict:
+    """An unnumbered status event describing a task's stored state."""
+    return {
+        "id": None,
+        "event": "status",
+        "data": {"status": task["status"], "error": task["error"], "video_url": task["video_url"]},
+    }
+
+
+async def follow_job_events(task: dict, last_event_id: Optional[int] = None):
+    """
+    Yields the events of the job behind a task until the job finishes,
+    resuming after `last_event_id` when the event bus still has them. When
+    nothing can be replayed, starts with a snapshot from the task store.
+    Yields None after EVENT_HEARTBEAT_SECONDS without an event.
+    """
+    video_id = task["video_id"]
+    job_id = task["coalesced_with"] or video_id
+
+    def for_request(event: dict) -> dict:
+        # Every request coalesced onto a job has its own video URL.
+        if event["data"].get("status") == "completed":
+            event = {**event, "data": {**event["data"], "video_url": f"/videos/{video_id}"}}
+        return event
+
+    with event_bus.subscribe(job_id, last_event_id) as subscription:
+        if not event_bus.has_history(job_id):
+            job = task if job_id == video_id else await task_store.get_task(job_id)
+            snapshot = status_event(job)
+            yield for_request(snapshot)
+            if is_terminal(snapshot):
+                return
+            # Run by another API process: follow it through the task store.
+            idle = 0.0
+            while not owned_here(job):
+                await asyncio.sleep(EVENT_POLL_SECONDS)
+                latest = status_event(await task_store.get_task(job_id))
+                if latest["data"] != snapshot["data"]:
+                    snapshot, idle = latest, 0.0
+                    yield for_request(snapshot)
+                    if is_terminal(snapshot):
+                        return
+                else:
+                    idle += EVENT_POLL_SECONDS
+                    if idle >= EVENT_HEARTBEAT_SECONDS:
+                        idle = 0.0
+                        yield None
+
+        while True:
+            event = await subscription.get(timeout=EVENT_HEARTBEAT_SECONDS)
+            yield event and for_request(event)
+            if event is not None and is_terminal(event):
+                return
+
+
+async def dry_run_manim_script(
+    manim_script: str, video_id: str, topic: str, priority: int = PRIORITY_INTERACTIVE
+) -> Optional[dict]:
+    """
+    Executes the scene on the render pool without rendering frames. Returns
+    the dry-run report, or None if no dry run was possible. The LaTeX
+    pre-render and the dry run are CPU-bound, so they hold a render slot at
+    `priority` like the render itself.
+    """
+    if RENDER_BACKEND == "subprocess" or not DRY_RUN_RENDER:
+        return None
+    script_path = Path(f"manim_scripts/{video_id}.py")
+    with open(script_path, "w", encoding='utf-8') as f:
+        f.write(use_local_tts_service(manim_script))
+    render_config = warm_render_config(job_render_dir(video_id), rendition_file_name(video_id, PREVIEW_RENDITION))
+    async with scheduler.render.slot(video_id, priority):
+        # The dry run typesets every label, so batch the LaTeX first; the render reuses it.
+        await prerender_tex_on_pool(script_path, video_id)
+        started = time.perf_counter()
+        try:
+            with stage("dry_run"):
+                # The worker stops the scene at the limit itself; this only catches a worker that can't.
+                report = await asyncio.wait_for(
+                    render_pool.dry_run(
+                        str(script_path), f"{to_pascal_case(topic)}Scene", render_config, DRY_RUN_VOICEOVER_SECONDS,
+                        DRY_RUN_TIMEOUT_SECONDS,
+                    ),
+                    timeout=DRY_RUN_TIMEOUT_SECONDS + 30,
+                )
+        except asyncio.TimeoutError:
+            report = {
+                "ok": False, "error": f"TimeoutError: the dry run did not finish within {DRY_RUN_TIMEOUT_SECONDS:g}s",
+                "line": None, "source_line": None, "animations": 0, "empty_blocks": [],
+                "seconds": time.perf_counter() - started,
+            }
+        except RuntimeError as e:
+            logger.warning(f"Dry run could not be performed for video_id {video_id}; leaving it to the render:\n{e}")
+            return None
+    count_typeset_lookups(report)
+    event_bus.publish(video_id, "dry_run", report)
+    logger.info(f"Dry run for video_id {video_id}: {report}")
+    return report
+
+
+async def produce_manim_script(
+    video_id: str, topic: str, bypass_cache: bool, priority: int = PRIORITY_INTERACTIVE
+) -> tuple:
+    """
+    Steps 1 and 2 plus the checks that precede a render: the script is
+    validated statically and dry-run, and sent back to the LLM with the
+    error if either fails. Returns (script, dry-run report or None); raises
+    the last failure once attempts run out.
+    """
+    narration_script = None
+    failure, failed_script = None, None
+    for attempt in range(SCRIPT_REGENERATION_ATTEMPTS + 1):
+        async with scheduler.llm.slot(video_id, priority):
+            if narration_script is None:
+                await set_job_status(video_id, "generating_script")
+                narration_script = await generate_educational_script(topic, use_cache=not bypass_cache)
+
+            await set_job_status(video_id, "generating_manim_code")
+            validation = await generate_manim_voiceover_script(
+                topic, narration_script, use_cache=not bypass_cache,
+                previous_failure=(failed_script, str(failure)) if failure is not None else None,
+            )
+        if validation.diagnostics:
+            event_bus.publish(video_id, "diagnostics", validation.to_dict())
+            logger.info(f"Script validation for {video_id}: {'; '.join(map(str, validation.diagnostics))}")
+
+        if not validation.ok:
+            # Rejected before any render process, TTS call or partial movie is spent on it.
+            failure = ScriptValidationError(validation)
+        else:
+            report = await dry_run_manim_script(validation.source, video_id, topic, priority)
+            if report is None or report["ok"]:
+                llm_cache.put(
+                    manim_script_cache_key(topic, narration_script), validation.source,
+                    model=llm_client.model_name, template_version=MANIM_PROMPT_VERSION,
+                )
+                return validation.source, report
+            failure = ScriptDryRunError(report)
+        failed_script = validation.source
+        logger.warning(f"Manim script for {video_id} failed its checks (attempt {attempt + 1}): {failure}")
+    raise failure
+
+
+async def process_video_generation_pipeline(
+    video_id: str, topic: str, bypass_cache: bool = False, profile: bool = False,
+    priority: int = PRIORITY_INTERACTIVE, on_render_start: Optional[Callable[[], None]] = None,
+):
     """
     The main background task orchestrating the entire video generation process.
+    Runs on a scheduler worker; the LLM and render stages each wait for a free
+    slot at `priority`. `on_render_start` is called once the render slot is taken.
+    """
+    # The trace starts at submission, so time spent in the admission queue shows up too.
+    task = await task_store.get_task(video_id)
+    submitted_at = task["created_at"] if task else time.time()
+    # Pinned so the sweeper leaves this job's renders and logs alone while it runs.
+    with artifact_store.pinned(video_id), job_trace(video_id, submitted_at) as trace:
+        trace.add("wait for admission", submitted_at, time.time(), "queue")
+        try:
+            with span("job", topic=topic):
+                manim_script, dry_run_report = await produce_manim_script(video_id, topic, bypass_cache, priority)
+                empty_blocks = dry_run_report["empty_blocks"] if dry_run_report else None
+
+                await set_job_status(video_id, "waiting_for_renderer")
+                async with scheduler.render.slot(video_id, priority):
+                    if on_render_start is not None:
+                        on_render_start()
+                    # Fail now rather than mid-render if the disk is (nearly) full.
+                    await artifact_store.ensure_free_space(await task_store.active_job_ids())
+                    await set_job_status(video_id, "rendering_video")
+                    video_path = await render_manim_voiceover_video(
+                        manim_script, video_id, topic, profile=profile, empty_blocks=empty_blocks
+                    )
+
+                # Hashed once here so every download can be served with a strong ETag.
+                with span("hash video"):
+                    video_sha256 = await asyncio.to_thread(file_sha256, video_path)
+            if UPGRADE_RENDITION is not None:
+                await task_store.update_job(video_id, upgrade_status="queued")
+            await task_store.complete_job(
+                video_id, video_path, script_path=f"manim_scripts/{video_id}.py", video_sha256=video_sha256,
+                rendition=PREVIEW_RENDITION,
+            )
+            event_bus.publish(video_id, "status", {"status": "completed", "error": None})
+            JOBS_COMPLETED.inc()
+            logger.info(f"Successfully completed video generation for ID: {video_id}")
+            if UPGRADE_RENDITION is not None:
+                schedule_quality_upgrade(video_id, topic, manim_script, empty_blocks)
+
+        except asyncio.CancelledError:
+            logger.warning(f"Video generation pipeline cancelled for ID {video_id}.")
+            FAILURES.inc("job", "CancelledError")
+            await set_job_status(
+                video_id, "failed", error="Video generation was cancelled because the server shut down."
+            )
+            raise
+
+        except Exception as e:
+            logger.error(f"Video generation pipeline failed for ID {video_id}: {e}", exc_info=True)
+            FAILURES.inc("job", type(e).__name__)
+            await set_job_status(video_id, "failed", error=str(e))
+
+        finally:
+            await write_trace(trace)
+
+
+async def process_video_batch(batch_id: str, bypass_cache: bool):
     """
+    Runs the jobs in batch_backlogs[batch_id] as one scheduler job. Members
+    start in order, and the next one starts whenever fewer than
+    BATCH_LOOKAHEAD are still before their render, so the LLM stage of later
+    topics runs while earlier ones render, without piling up scripts faster
+    than they can be rendered. Members take stage slots at PRIORITY_BATCH,
+    behind interactive requests.
+    """
+    backlog = batch_backlogs.get(batch_id, {})
+    before_render = asyncio.Semaphore(max(1, BATCH_LOOKAHEAD))
+    running = []
+
+    async def run_member(video_id: str, topic: str):
+        released = False
+
+        def release():
+            nonlocal released
+            if not released:
+                released = True
+                before_render.release()
+
+        try:
+            await process_video_generation_pipeline(
+                video_id, topic, bypass_cache, priority=PRIORITY_BATCH, on_render_start=release
+            )
+        finally:
+            release()
+
     try:
-        video_tasks[video_id]["status"] = "generating_script"
-        narration_script = await generate_educational_script(topic)
-        
-        video_tasks[video_id]["status"] = "generating_manim_code"
-        manim_script = await generate_manim_voiceover_script(topic, narration_script)
-        
-        video_tasks[video_id]["status"] = "rendering_video"
-        await render_manim_voiceover_video(manim_script, video_id, topic)
-
-        video_tasks[video_id]["status"] = "completed"
-        video_tasks[video_id]["video_url"] = f"/videos/{video_id}"
-        logger.info(f"Successfully completed video generation for ID: {video_id}")
+        while backlog:
+            await before_render.acquire()
+            if not scheduler.accepting:
+                break
+            video_id = next(iter(backlog))
+            topic = backlog.pop(video_id)
+            running.append(asyncio.create_task(run_member(video_id, topic), name=f"job-{video_id}"))
+        await asyncio.gather(*running)
+    except asyncio.CancelledError:
+        for task in running:
+            task.cancel()
+        await asyncio.gather(*running, return_exceptions=True)
+        raise
+    finally:
+        for video_id in batch_backlogs.pop(batch_id, {}):
+            await set_job_status(video_id, "failed", error="Server shut down before the job started.")
+
 
+def job_queue_info(job_id: str) -> dict:
+    """
+    Like scheduler.queue_info(), but a batch member that hasn't started waits
+    where its batch does, or at stage "batch" once the batch is running.
+    """
+    for batch_id, backlog in batch_backlogs.items():
+        if job_id in backlog:
+            info = scheduler.queue_info(batch_id)
+            if info["queue_stage"] is None:
+                info = {"queue_stage": "batch", "queue_position": list(backlog).index(job_id) + 1}
+            return info
+    return scheduler.queue_info(job_id)
+
+
+async def upgrade_video_quality(
+    video_id: str, topic: str, manim_script: str, empty_blocks: Optional[List[int]] = None
+):
+    """
+    Re-renders a completed job at UPGRADE_RENDITION when render capacity is
+    idle, then makes it the video served at the job's URL. The preview stays
+    available as its own rendition, and requests already streaming it are
+    unaffected.
+    """
+    # Runs in a copy of the job's context, so its spans extend the job's trace.
+    with artifact_store.pinned(video_id), track("upgrade"):
+        try:
+            async with upgrade_limiter.slot(video_id):
+                # Behind every waiting preview; a distinct ID keeps it out of the job's queue position.
+                async with scheduler.render.slot(f"{video_id}:upgrade", PRIORITY_BACKGROUND):
+                    await artifact_store.ensure_free_space(await task_store.active_job_ids())
+                    await task_store.update_job(video_id, upgrade_status="rendering")
+                    video_path = await render_manim_voiceover_video(
+                        manim_script, video_id, topic, rendition=UPGRADE_RENDITION, report_progress=False,
+                        empty_blocks=empty_blocks,
+                    )
+            video_sha256 = await asyncio.to_thread(file_sha256, video_path)
+            await task_store.add_rendition(video_id, UPGRADE_RENDITION, video_path, video_sha256, primary=True)
+            await task_store.update_job(video_id, upgrade_status="completed")
+            logger.info(f"Upgraded video {video_id} to {UPGRADE_RENDITION}.")
+
+        except asyncio.CancelledError:
+            await task_store.update_job(video_id, upgrade_status="cancelled")
+            raise
+
+        except Exception as e:
+            logger.error(f"Quality upgrade failed for ID {video_id}; keeping the preview: {e}", exc_info=True)
+            FAILURES.inc("upgrade", type(e).__name__)
+            await task_store.update_job(video_id, upgrade_status="failed")
+
+        finally:
+            trace = current_trace()
+            if trace is not None:
+                await write_trace(trace)
+
+
+async def write_trace(trace: JobTrace):
+    """Stores a job's trace for /video-trace. Failing to write it never fails the job."""
+    try:
+        await asyncio.to_thread(trace.write, TRACE_DIR / f"{trace.job_id}.json")
+    except OSError as e:
+        logger.warning(f"Could not write the trace of job {trace.job_id}: {e}")
+
+
+def schedule_quality_upgrade(
+    video_id: str, topic: str, manim_script: str, empty_blocks: Optional[List[int]] = None
+):
+    """Runs the upgrade in the background, outside the job workers, so it never delays admission."""
+    task = asyncio.create_task(
+        upgrade_video_quality(video_id, topic, manim_script, empty_blocks), name=f"upgrade-{video_id}"
+    )
+    upgrade_tasks.add(task)
+    task.add_done_callback(upgrade_tasks.discard)
+
+
+# --- Application Lifecycle ---
+
+async def start_tts_service():
+    """
+    Launches the resident TTS service as a child process, unless one is
+    already answering (e.g. started by another uvicorn worker). Of several
+    started at once, only the one that gets the socket's lock serves.
+    """
+    global tts_process
+    try:
+        await asyncio.to_thread(tts_service_request, {"op": "ping"}, TTS_SOCKET_PATH, 1.0)
+        logger.info(f"TTS service already running on {TTS_SOCKET_PATH}; not starting another.")
+        return
+    except TTSServiceError:
+        pass
+    tts_script = Path(__file__).resolve().parent / "tts_service.py"
+    tts_process = await asyncio.create_subprocess_exec(
+        sys.executable, str(tts_script), "--socket", TTS_SOCKET_PATH
+    )
+    logger.info(f"Started TTS service (pid {tts_process.pid}) on {TTS_SOCKET_PATH}")
+
+
+async def stop_tts_service():
+    if tts_process is None or tts_process.returncode is not None:
+        return
+    tts_process.terminate()
+    try:
+        await asyncio.wait_for(tts_process.wait(), timeout=10)
+    except asyncio.TimeoutError:
+        tts_process.kill()
+
+
+async def warm_up_step(name: str, step):
+    started = time.perf_counter()
+    try:
+        await step()
     except Exception as e:
-        logger.error(f"Video generation pipeline failed for ID {video_id}: {e}", exc_info=True)
-        video_tasks[video_id]["status"] = "failed"
-        video_tasks[video_id]["error"] = str(e)
+        logger.warning(f"Warm-up of the {name} failed; it will be loaded on first use: {e}")
+        return
+    logger.info(f"Warm-up: {name} ready in {time.perf_counter() - started:.2f}s.")
+
+
+async def warm_up():
+    """Loads what the first job would otherwise wait for, while requests are already served."""
+    steps = [warm_up_step("LLM client", llm_client.warm_up)]
+    if RENDER_BACKEND != "subprocess":
+        steps.append(warm_up_step("render worker", render_pool.warm_up))
+    await asyncio.gather(*steps)
+
+
+async def run_typeset_trimmer(interval_seconds: float):
+    """Keeps the typesetting cache within its budget, on a worker thread, until cancelled."""
+    while True:
+        try:
+            await asyncio.to_thread(typeset_store.trim, TYPESET_CACHE_MAX_BYTES)
+        except Exception as e:
+            logger.error(f"Typesetting cache trim failed: {e}", exc_info=True)
+        await asyncio.sleep(interval_seconds)
+
+
+@app.on_event("startup")
+async def start_scheduler():
+    started = time.perf_counter()
+    orphaned = await task_store.fail_orphaned_jobs()
+    if orphaned:
+        logger.warning(f"Marked {len(orphaned)} job(s) left unfinished by a previous server process as failed.")
+    if TTS_SERVICE_AUTOSTART:
+        await start_tts_service()
+    if RENDER_BACKEND != "subprocess":
+        render_pool.start()
+    scheduler.start()
+    global artifact_sweeper, typeset_trimmer, warmup_task
+    artifact_sweeper = asyncio.create_task(
+        artifact_store.run_sweeper(ARTIFACT_SWEEP_INTERVAL_SECONDS, task_store.active_job_ids)
+    )
+    typeset_trimmer = asyncio.create_task(run_typeset_trimmer(ARTIFACT_SWEEP_INTERVAL_SECONDS))
+    if STARTUP_WARMUP:
+        warmup_task = asyncio.create_task(warm_up())
+    logger.info(
+        f"Start-up: imports {import_timer.elapsed:.2f}s ({import_timer.report()}), "
+        f"module setup {module_setup_seconds:.2f}s, startup handler {time.perf_counter() - started:.2f}s."
+    )
+
+
+@app.on_event("shutdown")
+async def stop_scheduler():
+    dropped = await scheduler.shutdown(grace_period=SHUTDOWN_GRACE_SECONDS)
+    for job_id in dropped:
+        # A dropped batch fails each of its members.
+        for video_id in batch_backlogs.pop(job_id, None) or [job_id]:
+            await set_job_status(video_id, "failed", error="Server shut down before the job started.")
+    # Upgrades are optional work; the previews they would replace stay playable.
+    for task in list(upgrade_tasks):
+        task.cancel()
+    await asyncio.gather(*upgrade_tasks, return_exceptions=True)
+    if warmup_task is not None:
+        warmup_task.cancel()
+    render_pool.shutdown()
+    await stop_tts_service()
+    if artifact_sweeper is not None:
+        artifact_sweeper.cancel()
+    if typeset_trimmer is not None:
+        typeset_trimmer.cancel()
 
 
 # --- API Endpoints ---
@@ -342,23 +1412,40 @@ async def root():
 
 
 @app.post("/generate-video", response_model=VideoResponse, status_code=202, tags=["Video Generation"])
-async def generate_video(request: VideoRequest, background_tasks: BackgroundTasks):
+async def generate_video(request: VideoRequest, x_admin_token: Optional[str] = Header(default=None)):
     """
     Starts the asynchronous video generation process for a given topic.
     """
-    if not GEMINI_API_KEY:
+    if request.profile:
+        require_admin(x_admin_token)
+    if not llm_client.available:
          raise HTTPException(status_code=503, detail="AI Service is not configured. Missing GEMINI_API_KEY.")
          
     video_id = str(uuid.uuid4())
-    
-    video_tasks[video_id] = {
-        "status": "queued",
-        "topic": request.topic,
-        "video_url": None,
-        "error": None
-    }
 
-    background_tasks.add_task(process_video_generation_pipeline, video_id, request.topic)
+    # Attach to an identical in-flight job instead of running the pipeline twice.
+    # A cache-bypassing request asks for fresh content and a profiled one
+    # for a render of its own, so neither attaches.
+    task = await task_store.create_task(
+        video_id, request.topic, topic_key(request.topic), coalesce=not (request.bypass_cache or request.profile)
+    )
+    if task["coalesced_with"]:
+        logger.info(f"Coalesced request {video_id} onto in-flight job {task['coalesced_with']} for topic '{request.topic}'.")
+        return VideoResponse(
+            video_id=video_id,
+            status=task["status"],
+            message="An identical video is already being generated; this request will share its result."
+        )
+
+    event_bus.publish(video_id, "status", {"status": "queued"})
+    try:
+        scheduler.submit(
+            video_id, process_video_generation_pipeline, video_id, request.topic, request.bypass_cache,
+            request.profile,
+        )
+    except RuntimeError:
+        await set_job_status(video_id, "failed", error="Server shut down before the job started.")
+        raise HTTPException(status_code=503, detail="Server is shutting down and not accepting new jobs.")
 
     return VideoResponse(
         video_id=video_id,
@@ -366,35 +1453,260 @@ async def generate_video(request: VideoRequest, background_tasks: BackgroundTask
         message="Video generation has been queued. Check the status endpoint for updates."
     )
 
+@app.post("/generate-videos", response_model=BatchResponse, status_code=202, tags=["Video Generation"])
+async def generate_videos(request: BatchRequest):
+    """
+    Starts a batch of videos, one per topic, under a single batch ID. Topics
+    already being generated coalesce as with /generate-video.
+    """
+    if not request.topics:
+        raise HTTPException(status_code=400, detail="A batch needs at least one topic.")
+    if len(request.topics) > BATCH_MAX_TOPICS:
+        raise HTTPException(status_code=400, detail=f"A batch can have at most {BATCH_MAX_TOPICS} topics.")
+    if not llm_client.available:
+        raise HTTPException(status_code=503, detail="AI Service is not configured. Missing GEMINI_API_KEY.")
+
+    batch_id = str(uuid.uuid4())
+    members = [(str(uuid.uuid4()), topic, topic_key(topic)) for topic in request.topics]
+    tasks = await task_store.create_batch(batch_id, members, coalesce=not request.bypass_cache)
+
+    backlog = {task["video_id"]: task["topic"] for task in tasks if not task["coalesced_with"]}
+    for video_id in backlog:
+        event_bus.publish(video_id, "status", {"status": "queued"})
+    if backlog:
+        batch_backlogs[batch_id] = backlog
+        try:
+            scheduler.submit(batch_id, process_video_batch, batch_id, request.bypass_cache)
+        except RuntimeError:
+            for video_id in batch_backlogs.pop(batch_id):
+                await set_job_status(video_id, "failed", error="Server shut down before the job started.")
+            raise HTTPException(status_code=503, detail="Server is shutting down and not accepting new jobs.")
+    logger.info(
+        f"Queued batch {batch_id}: {len(backlog)} job(s), {len(tasks) - len(backlog)} coalesced onto in-flight jobs."
+    )
+
+    return BatchResponse(
+        batch_id=batch_id,
+        video_ids=[task["video_id"] for task in tasks],
+        status="queued",
+        message="The batch has been queued. Check the batch status endpoint for updates.",
+    )
+
+@app.get("/batch-status/{batch_id}", response_model=BatchStatus, tags=["Video Generation"])
+async def get_batch_status(batch_id: str):
+    """
+    Retrieves the status of every video in a batch, in submission order.
+    """
+    tasks = await task_store.get_batch(batch_id)
+    if not tasks:
+        raise HTTPException(status_code=404, detail="Batch ID not found.")
+
+    counts = {}
+    for task in tasks:
+        counts[task["status"]] = counts.get(task["status"], 0) + 1
+    finished = all(task["status"] in TERMINAL_STATUSES for task in tasks)
+    return BatchStatus(
+        batch_id=batch_id,
+        status="completed" if finished else "in_progress",
+        counts=counts,
+        videos=[video_status(task) for task in tasks],
+    )
+
 @app.get("/video-status/{video_id}", response_model=VideoStatus, tags=["Video Generation"])
 async def get_video_status(video_id: str):
     """
     Retrieves the current status of a video generation task.
     """
-    task = video_tasks.get(video_id)
+    task = await task_store.get_task(video_id)
     if not task:
         raise HTTPException(status_code=404, detail="Video ID not found.")
-    
-    return VideoStatus(video_id=video_id, **task)
+    return video_status(task)
 
-@app.get("/videos/{video_id}", tags=["Video Generation"])
-async def get_video_file(video_id: str):
-    """
-    Serves the generated MP4 video file if it's completed.
-    """
-    task = video_tasks.get(video_id)
+def video_status(task: dict) -> VideoStatus:
+    job_id = task["coalesced_with"] or task["video_id"]
+    renditions = {name: f"/videos/{task['video_id']}/{name}" for name in json.loads(task["renditions"])}
+    return VideoStatus(**{**task, "renditions": renditions or None}, **job_queue_info(job_id))
+
+async def completed_task(video_id: str) -> dict:
+    task = await task_store.get_task(video_id)
     if not task:
         raise HTTPException(status_code=404, detail="Video ID not found.")
     
     if task["status"] != "completed":
         raise HTTPException(status_code=400, detail=f"Video is not ready. Current status: {task['status']}")
+    return task
 
-    video_path = Path(f"generated_videos/{video_id}.mp4")
+async def serve_video_file(
+    request: Request, video_id: str, task: dict, video_path: Path, video_sha256: Optional[str], cache_control: str
+) -> Response:
     if not video_path.exists():
-        logger.error(f"Completed video file not found on disk for ID: {video_id}")
-        raise HTTPException(status_code=500, detail="Video file is missing despite completed status.")
-        
-    return FileResponse(video_path, media_type="video/mp4", filename=f"{task['topic']}.mp4")
+        # Evicted by the artifact sweeper to stay within the disk budget.
+        logger.warning(f"Completed video file no longer on disk for ID: {video_id} ({video_path})")
+        raise HTTPException(status_code=410, detail="Video file has expired and been removed from storage.")
+    artifact_store.touch(video_path)
+
+    video_sha256 = video_sha256 or await asyncio.to_thread(file_sha256, str(video_path))
+    headers = {"ETag": strong_etag(video_sha256), "Cache-Control": cache_control}
+    if etag_matches(request.headers.get("if-none-match"), headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+
+    return VideoFileResponse(video_path, media_type="video/mp4", filename=f"{task['topic']}.mp4", headers=headers)
+
+@app.api_route("/videos/{video_id}", methods=["GET", "HEAD"], tags=["Video Generation"])
+async def get_video_file(video_id: str, request: Request):
+    """
+    Serves the best available rendition of a completed video. Supports byte
+    ranges (for seeking), conditional requests and HEAD. A background quality
+    upgrade can replace it, so caches must revalidate (cheap via the ETag).
+    """
+    task = await completed_task(video_id)
+    # Coalesced requests share the artifact of the job they were attached to.
+    video_path = Path(task["video_path"] or f"generated_videos/{video_id}.mp4")
+    return await serve_video_file(request, video_id, task, video_path, task["video_sha256"], REVALIDATE_CACHE_CONTROL)
+
+@app.api_route("/videos/{video_id}/{rendition}", methods=["GET", "HEAD"], tags=["Video Generation"])
+async def get_video_rendition(video_id: str, rendition: str, request: Request):
+    """
+    Serves one specific rendition (e.g. `480p15`) of a completed video. A
+    rendition never changes once written, so it is cacheable forever.
+    """
+    task = await completed_task(video_id)
+    entry = json.loads(task["renditions"]).get(rendition)
+    if entry is None:
+        raise HTTPException(status_code=404, detail=f"Rendition '{rendition}' not available for this video.")
+    return await serve_video_file(request, video_id, task, Path(entry["path"]), entry["sha256"], IMMUTABLE_CACHE_CONTROL)
+
+@app.get("/video-trace/{video_id}", tags=["Video Generation"])
+async def get_video_trace(video_id: str):
+    """
+    Downloads the timeline of a finished job in the Chrome trace-event format,
+    for chrome://tracing or https://ui.perfetto.dev.
+    """
+    task = await task_store.get_task(video_id)
+    if not task:
+        raise HTTPException(status_code=404, detail="Video ID not found.")
+    trace_path = TRACE_DIR / f"{task['coalesced_with'] or video_id}.json"
+    if not trace_path.exists():
+        raise HTTPException(status_code=404, detail="No trace for this video; traces are written when the job finishes.")
+    return FileResponse(trace_path, media_type="application/json", filename=f"{video_id}.trace.json")
+
+@app.get("/video-profile/{video_id}", tags=["Video Generation"])
+async def get_video_profile(video_id: str, x_admin_token: Optional[str] = Header(default=None)):
+    """
+    Downloads the render profile of a video generated with `profile` (admin
+    only): collapsed stacks, one "frame;frame;... count" per line, ready for
+    flamegraph.pl or speedscope.
+    """
+    require_admin(x_admin_token)
+    task = await task_store.get_task(video_id)
+    if not task:
+        raise HTTPException(status_code=404, detail="Video ID not found.")
+    profile_path = PROFILE_DIR / f"{video_id}.collapsed.txt"
+    if not profile_path.exists():
+        raise HTTPException(status_code=404, detail="No profile for this video; request one with `profile` and wait for the render.")
+    return FileResponse(profile_path, media_type="text/plain; charset=utf-8", filename=f"{video_id}.collapsed.txt")
+
+def parse_last_event_id(value: Optional[str]) -> Optional[int]:
+    try:
+        return int(value) if value else None
+    except ValueError:
+        return None
+
+@app.get("/video-events/{video_id}", tags=["Video Generation"])
+async def stream_video_events(video_id: str, request: Request):
+    """
+    Streams a video's status changes as Server-Sent Events until it completes
+    or fails. Reconnecting clients resume after their `Last-Event-ID`.
+    """
+    task = await task_store.get_task(video_id)
+    if not task:
+        raise HTTPException(status_code=404, detail="Video ID not found.")
+    last_event_id = parse_last_event_id(request.headers.get("last-event-id"))
+
+    async def event_stream():
+        yield "retry: 3000\n\n"
+        async for event in follow_job_events(task, last_event_id):
+            yield ": keep-alive\n\n" if event is None else format_sse(event)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.websocket("/ws/video-events")
+async def video_events_socket(websocket: WebSocket):
+    """
+    Multiplexes the events of many videos over one WebSocket. Clients send
+    {"action": "subscribe", "video_id": ..., "last_event_id": optional} or
+    {"action": "unsubscribe", "video_id": ...}; the server sends events as
+    {"video_id", "id", "event", "data"}.
+    """
+    await websocket.accept()
+    forwarders = {}
+    send_lock = asyncio.Lock()
+
+    async def send(message: dict):
+        async with send_lock:
+            await websocket.send_json(message)
+
+    async def forward(task: dict, last_event_id: Optional[int]):
+        try:
+            async for event in follow_job_events(task, last_event_id):
+                if event is not None:
+                    await send({"video_id": task["video_id"], **event})
+        finally:
+            # A resubscription may already have replaced this forwarder.
+            if forwarders.get(task["video_id"]) is asyncio.current_task():
+                del forwarders[task["video_id"]]
+
+    try:
+        while True:
+            try:
+                message = await websocket.receive_json()
+                video_id = str(message.get("video_id", ""))
+                action = message.get("action")
+            except (ValueError, AttributeError, KeyError, TypeError):
+                # Not JSON, not an object, or a binary frame; the connection stays usable.
+                await send({"video_id": None, "id": None, "event": "error", "data": {"detail": "Messages must be JSON objects."}})
+                continue
+            if action == "subscribe" and video_id not in forwarders:
+                task = await task_store.get_task(video_id)
+                if not task:
+                    await send({"video_id": video_id, "id": None, "event": "error", "data": {"detail": "Video ID not found."}})
+                    continue
+                last_event_id = parse_last_event_id(str(message.get("last_event_id") or ""))
+                forwarders[video_id] = asyncio.create_task(forward(task, last_event_id))
+            elif action == "unsubscribe" and video_id in forwarders:
+                forwarders.pop(video_id).cancel()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        for forwarder in list(forwarders.values()):
+            forwarder.cancel()
+
+@app.get("/cache-stats", tags=["General"])
+async def get_cache_stats():
+    """
+    Reports hit/miss counters for the LLM response cache, artifact storage
+    usage and typesetting cache evictions.
+    """
+    return {
+        "llm": llm_cache.stats(),
+        "artifacts": artifact_store.stats(),
+        "typeset": {**typeset_store.stats(), "max_bytes": TYPESET_CACHE_MAX_BYTES},
+    }
+
+@app.get("/metrics", tags=["General"])
+async def get_metrics():
+    """
+    Prometheus metrics of this API process, plus the counters of the TTS
+    service it renders with.
+    """
+    await refresh_tts_stats()
+    return Response(REGISTRY.render(), media_type=METRICS_CONTENT_TYPE)
+
+module_setup_seconds = time.perf_counter() - module_setup_started
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,230 @@
+# metrics.py
+#
+# In-process metrics exported in the Prometheus text format. Counters,
+# gauges and histograms are sharded per thread: a thread only ever writes
+# its own shard, so updates take no lock (the GIL keeps each one intact) and
+# a scrape sums the shards. Values are per process; with several API
+# processes, scrape each of them.
+
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+# Seconds; spans a cache hit (milliseconds) to a long render (tens of minutes).
+DEFAULT_BUCKETS = (0.005, 0.025, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def format_family(name: str, kind: str, help_text: str, samples: Iterable[tuple]) -> str:
+    """One metric family; samples are (name suffix, {label: value}, value)."""
+    lines = [f"# HELP {name} {_escape(help_text)}", f"# TYPE {name} {kind}"]
+    for suffix, labels, value in samples:
+        label_text = ",".join(f'{label}="{_escape(label_value)}"' for label, label_value in labels.items())
+        lines.append(f"{name}{suffix}{{{label_text}}} {_format_value(value)}" if label_text
+                     else f"{name}{suffix} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List["Metric"] = []
+        self._lock = threading.Lock()
+
+    def register(self, metric: "Metric"):
+        with self._lock:
+            self._metrics.append(metric)
+
+    def render(self) -> str:
+        return "".join(
+            format_family(metric.name, metric.kind, metric.help, metric.collect()) for metric in list(self._metrics)
+        )
+
+
+REGISTRY = Registry()
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help_text: str, labelnames: Tuple[str, ...] = (),
+                 registry: Optional[Registry] = REGISTRY):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._local = threading.local()
+        self._shards: List[dict] = []
+        self._shards_lock = threading.Lock()
+        if registry is not None:
+            registry.register(self)
+
+    def _shard(self) -> dict:
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            # Once per thread; every later update goes straight to this dict.
+            shard = self._local.shard = {}
+            with self._shards_lock:
+                self._shards.append(shard)
+        return shard
+
+    def _labels(self, label_values: tuple) -> dict:
+        if len(label_values) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {label_values}")
+        return dict(zip(self.labelnames, label_values))
+
+    def _merged(self) -> Dict[tuple, float]:
+        totals: Dict[tuple, float] = {}
+        for shard in list(self._shards):
+            for key, value in shard.copy().items():
+                totals[key] = totals.get(key, 0) + value
+        return totals
+
+    def collect(self) -> List[tuple]:
+        return [("", self._labels(key), value) for key, value in sorted(self._merged().items())]
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, *label_values: str, amount: float = 1):
+        shard = self._shard()
+        shard[label_values] = shard.get(label_values, 0) + amount
+
+    def value(self, *label_values: str) -> float:
+        return self._merged().get(label_values, 0)
+
+
+class Gauge(Metric):
+    """
+    Tracked with inc()/dec() (e.g. work in flight), and/or read at scrape time
+    from `function`, which returns a number, or a {label values: number} dict
+    for labelled gauges.
+    """
+
+    kind = "gauge"
+
+    def __init__(self, name: str, help_text: str, labelnames: Tuple[str, ...] = (),
+                 function: Optional[Callable[[], object]] = None, registry: Optional[Registry] = REGISTRY):
+        super().__init__(name, help_text, labelnames, registry)
+        self.function = function
+
+    def inc(self, *label_values: str, amount: float = 1):
+        shard = self._shard()
+        shard[label_values] = shard.get(label_values, 0) + amount
+
+    def dec(self, *label_values: str, amount: float = 1):
+        self.inc(*label_values, amount=-amount)
+
+    @contextmanager
+    def track(self, *label_values: str) -> Iterator[None]:
+        """Counts the block as in progress while it runs."""
+        self.inc(*label_values)
+        try:
+            yield
+        finally:
+            self.dec(*label_values)
+
+    def collect(self) -> List[tuple]:
+        values = self._merged()
+        if self.function is not None:
+            read = self.function()
+            values.update(read if isinstance(read, dict) else {(): read})
+        return [("", self._labels(key), value) for key, value in sorted(values.items()) if value is not None]
+
+
+class CounterFunction(Metric):
+    """A counter kept elsewhere (e.g. a cache's own hit count), read at scrape time."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labelnames: Tuple[str, ...], function: Callable[[], dict],
+                 registry: Optional[Registry] = REGISTRY):
+        super().__init__(name, help_text, labelnames, registry)
+        self.function = function
+
+    def collect(self) -> List[tuple]:
+        return [("", self._labels(key), value) for key, value in sorted(self.function().items())]
+
+
+class Histogram(Metric):
+    """
+    Per label set, a shard holds one count per bucket followed by the sum and
+    the count of observations. Totals recorded in another process (see
+    `set_external`) are added at scrape time.
+    """
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labelnames: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS, registry: Optional[Registry] = REGISTRY):
+        super().__init__(name, help_text, labelnames, registry)
+        self.buckets = tuple(sorted(buckets))
+        self._external: Dict[tuple, list] = {}
+
+    def observe(self, value: float, *label_values: str):
+        shard = self._shard()
+        row = shard.get(label_values)
+        if row is None:
+            row = shard[label_values] = [0] * (len(self.buckets) + 3)
+        # Index len(buckets) is the +Inf bucket.
+        row[bisect.bisect_left(self.buckets, value)] += 1
+        row[-2] += value
+        row[-1] += 1
+
+    @contextmanager
+    def time(self, *label_values: str) -> Iterator[None]:
+        """Observes how long the block took, whether or not it raised."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *label_values)
+
+    def totals(self, *label_values: str) -> list:
+        """[count per bucket..., sum, count] for one label set, across shards."""
+        return self._rows().get(label_values, [0] * (len(self.buckets) + 3))
+
+    def set_external(self, row: list, *label_values: str):
+        """Replaces the totals another process reported for a label set (see `totals`)."""
+        if len(row) != len(self.buckets) + 3:
+            raise ValueError(f"{self.name}: external totals don't match the buckets")
+        self._external = {**self._external, label_values: list(row)}
+
+    def _rows(self) -> Dict[tuple, list]:
+        rows: Dict[tuple, list] = {}
+        for shard in list(self._shards):
+            for key, row in shard.copy().items():
+                merged = rows.setdefault(key, [0] * len(row))
+                for index, value in enumerate(list(row)):
+                    merged[index] += value
+        for key, row in self._external.items():
+            merged = rows.setdefault(key, [0] * len(row))
+            for index, value in enumerate(row):
+                merged[index] += value
+        return rows
+
+    def collect(self) -> List[tuple]:
+        samples = []
+        for key, row in sorted(self._rows().items()):
+            labels = self._labels(key)
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), row):
+                cumulative += count
+                samples.append(("_bucket", {**labels, "le": _format_value(float(bound))}, cumulative))
+            samples.append(("_sum", labels, row[-2]))
+            samples.append(("_count", labels, row[-1]))
+        return samples
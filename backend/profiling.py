@@ -0,0 +1,90 @@
+# profiling.py
+#
+# A sampling profiler for renders. A background thread records the stack of
+# the rendering thread every few milliseconds; the samples are kept as
+# collapsed stacks ("outer;inner;leaf count", one per line), which
+# flamegraph.pl and speedscope read directly. Frames of the generated script
+# keep their line number, so a hot loop in construct() stands out from the
+# Manim internals it calls.
+
+import contextlib
+import sys
+import threading
+from pathlib import Path
+from typing import Dict, Optional
+
+
+def _frame_name(filename: str, function: str, line: Optional[int] = None) -> str:
+    path = Path(filename)
+    location = f"{path.parent.name}/{path.name}" if path.parent.name else path.name
+    if line is not None:
+        location = f"{location}:{line}"
+    # ';' separates frames in the collapsed format.
+    return f"{function} ({location})".replace(";", ",")
+
+
+class StackSampler:
+    """
+    Samples the stack of the thread that enters it, every `interval` seconds,
+    until it exits. Stacks start at the function that entered the sampler
+    (the worker plumbing above it is left out), and frames from
+    `script_path` are recorded per line.
+    """
+
+    def __init__(self, interval: float = 0.005, script_path: Optional[str] = None):
+        self.interval = interval
+        self.script_path = script_path
+        self.samples: Dict[str, int] = {}
+        self._target: Optional[int] = None
+        self._root = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def __enter__(self) -> "StackSampler":
+        self._target = threading.get_ident()
+        root = sys._getframe(1)
+        while root.f_back is not None and root.f_code.co_filename == contextlib.__file__:
+            root = root.f_back  # entered through an ExitStack
+        self._root = root
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+        self._root = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._target)
+            if frame is not None:
+                stack = self._collapse(frame)
+                self.samples[stack] = self.samples.get(stack, 0) + 1
+
+    def _collapse(self, frame) -> str:
+        names = []
+        while frame is not None:
+            code = frame.f_code
+            line = frame.f_lineno if code.co_filename == self.script_path else None
+            names.append(_frame_name(code.co_filename, code.co_name, line))
+            if frame is self._root:
+                break
+            frame = frame.f_back
+        return ";".join(reversed(names))
+
+
+def merge_samples(into: Dict[str, int], samples: Dict[str, int]):
+    """Adds collapsed-stack counts, e.g. of a job's parallel segments, into `into`."""
+    for stack, count in samples.items():
+        into[stack] = into.get(stack, 0) + count
+
+
+def write_collapsed(samples: Dict[str, int], path: Path):
+    """Writes samples in the collapsed-stack format, heaviest stacks first."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    lines = [f"{stack} {count}\n" for stack, count in sorted(samples.items(), key=lambda item: -item[1])]
+    temp_path = path.with_name(f".{path.name}.tmp")
+    temp_path.write_text("".join(lines), encoding="utf-8")
+    temp_path.replace(path)
@@ -0,0 +1,207 @@
+# render_progress.py
+#
+# Follows Manim's console output while a scene renders: keeps the last lines
+# for error reports, turns the per-animation progress bars into counters for
+# the status endpoint and records when each animation and voiceover ran, for
+# the job's trace.
+
+import ast
+import asyncio
+import codecs
+import json
+import re
+import time
+from collections import deque
+from pathlib import Path
+from typing import List, Optional
+
+# tqdm bar of a running animation, e.g.
+# "Animation 12: FadeIn(Text('Hi')):  45%|####5     | 27/60 [00:01<00:00, 23.1it/s]"
+ANIMATION_BAR_PATTERN = re.compile(r"Animation (\d+)\s*:.*?(\d+)/(\d+)\s*\[")
+# The animation's description in a bar, e.g. "FadeIn(Text('Hi'))".
+ANIMATION_NAME_PATTERN = re.compile(r"Animation \d+\s*:\s*(.*?):\s*\d+%")
+# Logged instead of a bar when Manim reuses a partial movie file.
+ANIMATION_CACHED_PATTERN = re.compile(r"Animation (\d+)\s*: Using cached data")
+# Printed by LocalCoquiService for each voiceover's audio (see voiceover_service.py).
+SPEECH_TIMING_PATTERN = re.compile(r"Voiceover audio (\{.*\})")
+LINE_BREAK_PATTERN = re.compile(r"\r\n|\r|\n")
+
+# Scene calls that each render (at least) one animation; a voiceover block
+# waits out the rest of its audio when it exits.
+ANIMATION_METHODS = {"play", "wait", "wait_until_bookmark", "voiceover"}
+
+
+def count_animation_calls(source: str, scene_class_name: str) -> Optional[int]:
+    """
+    Estimates how many animations a scene renders by counting its
+    ANIMATION_METHODS calls. Loops make this a lower bound; None if the
+    scene isn't found.
+    """
+    try:
+        tree = ast.parse(source)
+    except SyntaxError:
+        return None
+    scene_class = next(
+        (node for node in tree.body if isinstance(node, ast.ClassDef) and node.name == scene_class_name), None
+    )
+    if scene_class is None:
+        return None
+
+    count = 0
+    for node in ast.walk(scene_class):
+        if (
+            isinstance(node, ast.Call)
+            and isinstance(node.func, ast.Attribute)
+            and isinstance(node.func.value, ast.Name)
+            and node.func.value.id == "self"
+            and node.func.attr in ANIMATION_METHODS
+        ):
+            count += 1
+    return count
+
+
+class RenderLog:
+    """
+    Parses one render's console output as it arrives. Progress bars redraw
+    with carriage returns, so output is split on \\r as well as \\n. Only the
+    last `tail_lines` lines are kept in memory. Animation timings are when
+    their bars were first and last seen, so they are only as precise as the
+    output is fed in.
+    """
+
+    def __init__(self, animations_total: Optional[int] = None, tail_lines: int = 200):
+        self.animations_total = animations_total
+        self._lines: deque = deque(maxlen=tail_lines)
+        self._partial = ""
+        # animation index -> (frames rendered, frames total); None total = cached
+        self._animations: dict = {}
+        # animation index -> [description, first seen, finished]
+        self._timings: dict = {}
+        self._speech: list = []
+
+    def feed(self, text: str):
+        pieces = LINE_BREAK_PATTERN.split(self._partial + text)
+        self._partial = pieces.pop()
+        for line in pieces:
+            self._parse(line)
+        # tqdm writes "\r<bar>", so the latest redraw stays unterminated until the next one.
+        bar = ANIMATION_BAR_PATTERN.search(self._partial)
+        if bar:
+            self._update_animation(bar)
+
+    def _parse(self, line: str):
+        if not line.strip():
+            return
+        bar = ANIMATION_BAR_PATTERN.search(line)
+        if bar:
+            self._update_animation(bar)
+            # Bars redraw many times per animation; only keep the last state in the tail.
+            if self._lines and ANIMATION_BAR_PATTERN.search(self._lines[-1]):
+                self._lines.pop()
+        else:
+            cached = ANIMATION_CACHED_PATTERN.search(line)
+            speech = SPEECH_TIMING_PATTERN.search(line)
+            if cached:
+                index = int(cached.group(1))
+                self._animations[index] = (0, None)
+                now = time.time()
+                self._timings.setdefault(index, ["cached", now, now])
+            elif speech:
+                try:
+                    self._speech.append(json.loads(speech.group(1)))
+                except ValueError:
+                    pass
+        self._lines.append(line)
+
+    def _update_animation(self, bar: re.Match):
+        index, done, total = (int(group) for group in bar.groups())
+        self._animations[index] = (done, total)
+        now = time.time()
+        timing = self._timings.get(index)
+        if timing is None:
+            name = ANIMATION_NAME_PATTERN.search(bar.string)
+            timing = self._timings[index] = [name.group(1) if name else f"Animation {index}", now, None]
+        if done >= total and timing[2] is None:
+            timing[2] = now
+
+    def tail(self) -> str:
+        lines = list(self._lines)
+        if self._partial.strip():
+            lines.append(self._partial)
+        return "\n".join(lines)
+
+    def progress(self) -> dict:
+        done = sum(1 for frames, total in self._animations.values() if total is None or frames >= total)
+        return {
+            "animations_done": done,
+            "animations_total": max(self.animations_total or 0, len(self._animations)) or None,
+            "frames_done": sum(frames for frames, _ in self._animations.values()),
+        }
+
+    def animation_timings(self) -> List[dict]:
+        """When each animation ran (Unix timestamps); unfinished ones end at the last output."""
+        last_seen = max((max(started, finished or started) for _, started, finished in self._timings.values()),
+                        default=None)
+        timings = []
+        for index, (name, started, finished) in sorted(self._timings.items()):
+            frames_total = self._animations.get(index, (0, None))[1]
+            timings.append({
+                "index": index,
+                "name": name,
+                "started": started,
+                "finished": finished if finished is not None else last_seen,
+                "frames": frames_total,
+                "cached": frames_total is None,
+            })
+        return timings
+
+    def speech_timings(self) -> List[dict]:
+        """The voiceover audio reports printed during the render, in order."""
+        return list(self._speech)
+
+
+def combine_progress(logs: List[RenderLog]) -> dict:
+    """Sums the progress of renders that together make up one video (e.g. parallel segments)."""
+    progresses = [log.progress() for log in logs]
+    totals = [progress["animations_total"] for progress in progresses]
+    return {
+        "animations_done": sum(progress["animations_done"] for progress in progresses),
+        "animations_total": sum(totals) if all(totals) else None,
+        "frames_done": sum(progress["frames_done"] for progress in progresses),
+    }
+
+
+async def pipe_to_log(stream: asyncio.StreamReader, log_path: Path, render_log: RenderLog):
+    """Copies a subprocess's output to its log file while feeding the parser."""
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    with open(log_path, "wb") as log_file:
+        while True:
+            chunk = await stream.read(64 * 1024)
+            if not chunk:
+                break
+            log_file.write(chunk)
+            log_file.flush()
+            render_log.feed(decoder.decode(chunk))
+        render_log.feed(decoder.decode(b"", final=True))
+
+
+async def follow_log_file(log_path: Path, render_log: RenderLog, finished: asyncio.Event, interval: float = 0.25):
+    """Feeds the parser from a log file another process is writing, until `finished` is set."""
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    position = 0
+    while True:
+        done = finished.is_set()
+        try:
+            with open(log_path, "rb") as log_file:
+                log_file.seek(position)
+                chunk = log_file.read()
+        except FileNotFoundError:
+            chunk = b""
+        position += len(chunk)
+        render_log.feed(decoder.decode(chunk, final=done))
+        if done:
+            return
+        try:
+            await asyncio.wait_for(finished.wait(), interval)
+        except asyncio.TimeoutError:
+            pass
@@ -0,0 +1,416 @@
+# render_workers.py
+
+import asyncio
+import contextlib
+import importlib
+import importlib.util
+import logging
+import multiprocessing
+import os
+import signal
+import sys
+import tempfile
+import threading
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import Optional
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+BACKEND_DIR = Path(__file__).resolve().parent
+
+# Imported once in the forkserver (and again, as a no-op, in each worker) so
+# that a render job no longer pays for interpreter start-up plus these imports.
+# Coqui/torch are deliberately absent: synthesis runs in the TTS service.
+PRELOAD_MODULES = [
+    "numpy",
+    "cairo",
+    "manimpango",
+    "manim",
+    "manim_voiceover",
+    "voiceover_service",
+]
+
+
+# --- Worker-Side Functions ---
+
+# Speech stub installed for the lifetime of a worker (see RenderWorkerPool).
+_worker_speech_stub = contextlib.ExitStack()
+
+
+def _warm_worker(speech_stub_seconds: Optional[float] = None):
+    """
+    Pool initializer: make the backend importable, pre-import the render stack
+    and route typesetting through the shared cache (TYPESET_CACHE_DIR).
+    With `speech_stub_seconds`, every voiceover in this worker is silence of
+    that length instead of synthesized speech.
+    """
+    if str(BACKEND_DIR) not in sys.path:
+        sys.path.insert(0, str(BACKEND_DIR))
+    for module_name in PRELOAD_MODULES:
+        try:
+            importlib.import_module(module_name)
+        except ImportError as e:
+            logger.warning(f"Render worker could not pre-import '{module_name}': {e}")
+
+    import typeset_cache
+
+    typeset_cache.install(
+        typeset_cache.TypesetCache(os.getenv("TYPESET_CACHE_DIR", typeset_cache.DEFAULT_CACHE_DIR))
+    )
+    if speech_stub_seconds is not None:
+        # Per process: manim-voiceover's cache index isn't safe to share.
+        cache_dir = Path(tempfile.gettempdir()) / "learntube-speech-stub" / str(os.getpid())
+        _worker_speech_stub.enter_context(stubbed_speech(speech_stub_seconds, str(cache_dir)))
+
+
+@contextlib.contextmanager
+def stubbed_speech(voiceover_seconds: float, cache_dir: str):
+    """Whatever speech service a script asks for, it gets fixed-length silence."""
+    from manim_voiceover import VoiceoverScene
+
+    import voiceover_service
+
+    set_speech_service = VoiceoverScene.set_speech_service
+    stub = voiceover_service.DryRunSpeechService(voiceover_seconds, cache_dir=cache_dir)
+    VoiceoverScene.set_speech_service = lambda self, speech_service, *args, **kwargs: (
+        set_speech_service(self, stub, *args, **kwargs)
+    )
+    try:
+        yield stub
+    finally:
+        VoiceoverScene.set_speech_service = set_speech_service
+
+
+def process_usage() -> dict:
+    """
+    CPU time of this process plus its reaped subprocesses (latex, ffmpeg),
+    and the peak RSS of the largest of them.
+    """
+    if resource is None:
+        return {"cpu_seconds": time.process_time(), "peak_rss_mb": None}
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    # ru_maxrss is in kilobytes on Linux but in bytes on macOS.
+    rss_unit = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return {
+        "cpu_seconds": own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime,
+        "peak_rss_mb": max(own.ru_maxrss, children.ru_maxrss) / rss_unit,
+    }
+
+
+def measured_call(function, *args) -> tuple:
+    """
+    Runs a worker-side function and returns (result, usage) with the CPU
+    time it took. Its peak RSS is the worker's peak so far, which is per
+    call only when workers are recycled after every job.
+    """
+    before = process_usage()
+    result = function(*args)
+    after = process_usage()
+    return result, {"cpu_seconds": after["cpu_seconds"] - before["cpu_seconds"], "peak_rss_mb": after["peak_rss_mb"]}
+
+
+def _typeset_lookups() -> tuple:
+    """(hits, misses) of this worker's typesetting cache so far."""
+    import typeset_cache
+
+    cache = typeset_cache.installed_cache()
+    return (cache.hits, cache.misses) if cache is not None else (0, 0)
+
+
+def render_scene(
+    script_path: str, scene_name: str, render_config: dict, log_path: Optional[str] = None,
+    profile_interval: Optional[float] = None,
+) -> dict:
+    """
+    Renders one scene from a script file inside a warm worker process.
+    The global Manim config is only modified for the duration of the render.
+    With `log_path`, Manim's console output (logs and progress bars) goes to
+    that file instead of the worker's stdout/stderr. With `profile_interval`,
+    the render is sampled at that interval and the result's "profile" holds
+    the collapsed stacks. Voiceovers are cached next to the output file,
+    separately for each render.
+    """
+    from manim import tempconfig
+
+    import typeset_cache
+    import voiceover_service
+    from profiling import StackSampler
+
+    started = time.perf_counter()
+    hits, misses = _typeset_lookups()
+    module_name = f"manim_job_{Path(script_path).stem.replace('-', '_')}"
+    spec = importlib.util.spec_from_file_location(module_name, script_path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[module_name] = module
+    try:
+        with contextlib.ExitStack() as stack:
+            if log_path is not None:
+                log_file = stack.enter_context(open(log_path, "w", encoding="utf-8", buffering=1))
+                stack.enter_context(contextlib.redirect_stdout(log_file))
+                stack.enter_context(contextlib.redirect_stderr(log_file))
+            stack.enter_context(tempconfig({**render_config, "input_file": script_path}))
+            stack.enter_context(typeset_cache.holding())
+            if "video_dir" in render_config and "output_file" in render_config:
+                cache_dir = Path(render_config["video_dir"]) / "voiceovers" / Path(render_config["output_file"]).stem
+                stack.enter_context(voiceover_service.render_cache_dir(str(cache_dir)))
+            sampler = None
+            if profile_interval is not None:
+                sampler = stack.enter_context(StackSampler(profile_interval, os.path.abspath(script_path)))
+            spec.loader.exec_module(module)
+            scene_class = getattr(module, scene_name, None)
+            if scene_class is None:
+                raise ValueError(f"Scene class '{scene_name}' not found in {script_path}")
+            scene = scene_class()
+            scene.render()
+            output_path = scene.renderer.file_writer.movie_file_path
+    except Exception:
+        # Manim exceptions aren't always picklable; ship the traceback as text instead.
+        raise RuntimeError(traceback.format_exc()) from None
+    finally:
+        sys.modules.pop(module_name, None)
+
+    hits_after, misses_after = _typeset_lookups()
+    result = {
+        "output_path": str(output_path),
+        "render_seconds": time.perf_counter() - started,
+        "typeset_hits": hits_after - hits,
+        "typeset_misses": misses_after - misses,
+    }
+    if sampler is not None:
+        result["profile"] = sampler.samples
+    return result
+
+
+def _script_error(error: BaseException, script_path: str) -> dict:
+    """The exception and the innermost line of the script that led to it."""
+    line, source_line = None, None
+    if isinstance(error, SyntaxError) and error.filename == script_path:
+        line, source_line = error.lineno, (error.text or "").strip()
+    for frame in traceback.extract_tb(error.__traceback__):
+        if frame.filename == script_path:
+            line, source_line = frame.lineno, frame.line
+    return {"error": f"{type(error).__name__}: {error}", "line": line, "source_line": source_line}
+
+
+class DryRunTimeout(BaseException):
+    """
+    Raised inside a dry run that exceeds its time limit. A BaseException, so
+    a generated `except Exception:` can't swallow it.
+    """
+
+
+@contextlib.contextmanager
+def _time_limit(seconds: Optional[float]):
+    """Raises DryRunTimeout in the worker's main thread after `seconds` (no limit where SIGALRM is missing)."""
+    if not seconds or not hasattr(signal, "SIGALRM"):
+        yield
+        return
+
+    def expire(signum, frame):
+        raise DryRunTimeout(f"construct() did not finish within {seconds:g}s")
+
+    previous = signal.signal(signal.SIGALRM, expire)
+    signal.setitimer(signal.ITIMER_REAL, seconds)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+
+def _record_voiceover_starts(scene, script_path: str) -> dict:
+    """
+    Wraps the scene's voiceover() to note how many mobjects are on screen
+    when each voiceover block of construct() starts, keyed by the line of
+    the block (the most seen, if it runs more than once).
+    """
+    on_screen = {}
+    voiceover = scene.voiceover
+
+    def recording_voiceover(*args, **kwargs):
+        caller = sys._getframe(1)
+        if caller.f_code.co_filename == script_path and caller.f_code.co_name == "construct":
+            count = len(scene.mobjects) + len(scene.foreground_mobjects)
+            on_screen[caller.f_lineno] = max(count, on_screen.get(caller.f_lineno, 0))
+        return voiceover(*args, **kwargs)
+
+    scene.voiceover = recording_voiceover
+    return on_screen
+
+
+def dry_run_scene(
+    script_path: str, scene_name: str, render_config: dict, voiceover_seconds: float,
+    time_limit: Optional[float] = None,
+) -> dict:
+    """
+    Runs a scene's construct() without rasterizing or encoding anything:
+    every animation is skipped to its end state and speech is a fixed-length
+    stub. Returns {"ok", "animations", "seconds"}, the typesetting cache
+    lookups and `empty_blocks`, the lines of the voiceover blocks that
+    started on an empty scene, plus, if the scene raised or ran longer than
+    `time_limit` seconds, the first error and the script line it came from.
+    """
+    from manim import tempconfig
+
+    import typeset_cache
+
+    started = time.perf_counter()
+    hits, misses = _typeset_lookups()
+    script_path = os.path.abspath(script_path)  # as it appears in tracebacks
+    module_name = f"manim_dry_run_{Path(script_path).stem.replace('-', '_')}"
+    spec = importlib.util.spec_from_file_location(module_name, script_path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[module_name] = module
+    scene = None
+    on_screen = {}
+    result = {"ok": True}
+    try:
+        with contextlib.ExitStack() as stack:
+            media_dir = stack.enter_context(tempfile.TemporaryDirectory(prefix="learntube-dry-run-"))
+            devnull = stack.enter_context(open(os.devnull, "w"))
+            stack.enter_context(contextlib.redirect_stdout(devnull))
+            stack.enter_context(contextlib.redirect_stderr(devnull))
+            stack.enter_context(tempconfig(
+                {**render_config, "media_dir": media_dir, "dry_run": True, "input_file": script_path}
+            ))
+            stack.enter_context(stubbed_speech(voiceover_seconds, str(Path(media_dir) / "voiceovers")))
+            stack.enter_context(typeset_cache.holding())
+            try:
+                with _time_limit(time_limit):
+                    spec.loader.exec_module(module)
+                    scene_class = getattr(module, scene_name, None)
+                    if scene_class is None:
+                        raise ValueError(f"Scene class '{scene_name}' not found in {script_path}")
+                    scene = scene_class()
+                    scene.renderer.skip_animations = scene.renderer._original_skipping_status = True
+                    on_screen = _record_voiceover_starts(scene, script_path)
+                    scene.render()
+            except (Exception, DryRunTimeout) as e:
+                result = {"ok": False, **_script_error(e, script_path)}
+    finally:
+        sys.modules.pop(module_name, None)
+
+    result["animations"] = scene.renderer.num_plays if scene is not None else 0
+    result["empty_blocks"] = sorted(line for line, count in on_screen.items() if count == 0)
+    result["seconds"] = time.perf_counter() - started
+    hits_after, misses_after = _typeset_lookups()
+    result["typeset_hits"] = hits_after - hits
+    result["typeset_misses"] = misses_after - misses
+    return result
+
+
+def prerender_tex(script_path: str) -> dict:
+    """Batch-typesets a script's LaTeX into the shared cache before it is rendered."""
+    import tex_batch
+    import typeset_cache
+
+    try:
+        with typeset_cache.holding():
+            return tex_batch.prerender_tex(script_path)
+    except Exception:
+        raise RuntimeError(traceback.format_exc()) from None
+
+
+# --- Pool ---
+
+class RenderWorkerPool:
+    """
+    A pool of long-lived render processes started from a forkserver that has
+    already imported Manim and friends. Each worker is recycled after
+    `max_jobs_per_worker` renders to contain memory leaks. With
+    `speech_stub_seconds`, workers render voiceovers as silence (benchmarks).
+    """
+
+    def __init__(self, workers: int, max_jobs_per_worker: int, speech_stub_seconds: Optional[float] = None):
+        self.workers = max(1, workers)
+        self.max_jobs_per_worker = max(1, max_jobs_per_worker)
+        self.speech_stub_seconds = speech_stub_seconds
+        self.busy = 0  # calls in flight
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._restart_lock = threading.Lock()
+
+    def start(self):
+        if "forkserver" in multiprocessing.get_all_start_methods():
+            context = multiprocessing.get_context("forkserver")
+            context.set_forkserver_preload(PRELOAD_MODULES)
+        else:
+            context = multiprocessing.get_context("spawn")
+
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=context,
+            initializer=_warm_worker,
+            initargs=(self.speech_stub_seconds,),
+            max_tasks_per_child=self.max_jobs_per_worker,
+        )
+        logger.info(
+            f"Render worker pool started: {self.workers} worker(s) via '{context.get_start_method()}', "
+            f"recycled every {self.max_jobs_per_worker} job(s)."
+        )
+
+    async def _run(self, function, *args):
+        if self._executor is None:
+            raise RuntimeError("Render worker pool has not been started.")
+        loop = asyncio.get_running_loop()
+        executor = self._executor
+        self.busy += 1
+        try:
+            return await loop.run_in_executor(executor, function, *args)
+        except BrokenProcessPool:
+            # A worker died hard (e.g. segfault in cairo); the executor is unusable now.
+            # Every call in flight on it fails the same way; only the first restarts
+            # the pool, so later ones don't kill renders already on the new one.
+            with self._restart_lock:
+                if self._executor is executor:
+                    logger.error("A render worker crashed; restarting the render worker pool.")
+                    self.shutdown()
+                    self.start()
+            raise RuntimeError("Render worker crashed while rendering the scene.")
+        finally:
+            self.busy -= 1
+
+    async def warm_up(self):
+        """
+        Starts a worker ahead of the first render; with forkserver, that also
+        imports PRELOAD_MODULES once for every later worker.
+        """
+        await self._run(os.getpid)
+
+    async def render(
+        self, script_path: str, scene_name: str, render_config: dict, log_path: Optional[str] = None,
+        profile_interval: Optional[float] = None,
+    ) -> dict:
+        """Renders a scene on a warm worker without blocking the event loop."""
+        return await self._run(render_scene, script_path, scene_name, render_config, log_path, profile_interval)
+
+    async def dry_run(
+        self, script_path: str, scene_name: str, render_config: dict, voiceover_seconds: float,
+        time_limit: Optional[float] = None,
+    ) -> dict:
+        """Executes a scene without rendering frames, to find errors in seconds."""
+        return await self._run(dry_run_scene, script_path, scene_name, render_config, voiceover_seconds, time_limit)
+
+    async def prerender_tex(self, script_path: str) -> dict:
+        """Typesets all of a script's constant LaTeX in one batch on a warm worker."""
+        return await self._run(prerender_tex, script_path)
+
+    def shutdown(self):
+        if self._executor is None:
+            return
+        # Renders can take minutes, so don't wait for them; terminate the workers.
+        processes = list((self._executor._processes or {}).values())
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+        self._executor = None
@@ -0,0 +1,205 @@
+# scheduler.py
+
+import asyncio
+import logging
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from metrics import Histogram
+from tracing import add_span
+
+logger = logging.getLogger(__name__)
+
+QUEUE_WAIT_SECONDS = Histogram(
+    "learntube_queue_wait_seconds", "Time jobs waited for admission or for a stage slot.", ("queue",)
+)
+
+
+# --- Stage Limiter ---
+
+# Waiters with a lower number are served first; FIFO within a priority.
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BATCH = 5
+PRIORITY_BACKGROUND = 10
+
+
+class StageLimiter:
+    """
+    A FIFO-fair concurrency limit for one pipeline stage (LLM calls, renders).
+    Unlike asyncio.Semaphore it knows who is waiting, so it can report a job's
+    position in line. Batch jobs wait behind interactive ones, and background
+    work (e.g. quality upgrades) behind both, but neither kind of waiter ever
+    preempts a running holder.
+    """
+
+    def __init__(self, name: str, slots: int):
+        self.name = name
+        self.slots = max(1, slots)
+        self.in_use = 0
+        self._waiters: deque = deque()
+
+    def position(self, job_id: str) -> Optional[int]:
+        """Returns the 1-based position of a waiting job, or None if it isn't waiting."""
+        for index, (waiting_id, _, _) in enumerate(self._waiters):
+            if waiting_id == job_id:
+                return index + 1
+        return None
+
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+    async def acquire(self, job_id: str, priority: int = PRIORITY_INTERACTIVE):
+        if self.in_use < self.slots and not self._waiters:
+            self.in_use += 1
+            QUEUE_WAIT_SECONDS.observe(0.0, self.name)
+            return
+
+        queued_at = time.perf_counter()
+        future = asyncio.get_running_loop().create_future()
+        entry = (job_id, future, priority)
+        # Behind everyone of the same or a more urgent priority.
+        index = next(
+            (index for index, (_, _, waiting_priority) in enumerate(self._waiters) if waiting_priority > priority),
+            len(self._waiters),
+        )
+        self._waiters.insert(index, entry)
+        try:
+            await future
+            waited = time.perf_counter() - queued_at
+            QUEUE_WAIT_SECONDS.observe(waited, self.name)
+            now = time.time()
+            add_span(f"wait for {self.name} slot", now - waited, now, "queue")
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # The slot was handed over just as we were cancelled; pass it on.
+                self.release()
+            elif entry in self._waiters:
+                self._waiters.remove(entry)
+            raise
+
+    def release(self):
+        self.in_use -= 1
+        while self._waiters and self.in_use < self.slots:
+            _, future, _ = self._waiters.popleft()
+            if future.done():
+                continue
+            self.in_use += 1
+            future.set_result(None)
+
+    @asynccontextmanager
+    async def slot(self, job_id: str, priority: int = PRIORITY_INTERACTIVE):
+        await self.acquire(job_id, priority)
+        try:
+            yield
+        finally:
+            self.release()
+
+
+# --- Job Scheduler ---
+
+class JobScheduler:
+    """
+    Admits video generation jobs from a FIFO queue into a fixed number of job
+    workers. Inside a job, the pipeline takes an `llm` slot for Gemini calls
+    and a `render` slot for the CPU-bound Manim render, so each resource has
+    its own concurrency limit.
+    """
+
+    def __init__(self, max_active_jobs: int, llm_slots: int, render_slots: int):
+        self.max_active_jobs = max(1, max_active_jobs)
+        self.llm = StageLimiter("llm", llm_slots)
+        self.render = StageLimiter("render", render_slots)
+        self._pending: deque = deque()
+        self._has_work: Optional[asyncio.Event] = None
+        self._workers: List[asyncio.Task] = []
+        self._running: Dict[str, asyncio.Task] = {}
+        self._accepting = False
+
+    def start(self):
+        """Spawns the job workers. Must be called from within the running event loop."""
+        self._has_work = asyncio.Event()
+        self._accepting = True
+        for index in range(self.max_active_jobs):
+            self._workers.append(asyncio.create_task(self._worker(), name=f"job-worker-{index}"))
+        logger.info(
+            f"Job scheduler started: {self.max_active_jobs} job workers, "
+            f"{self.llm.slots} LLM slots, {self.render.slots} render slots."
+        )
+
+    @property
+    def accepting(self) -> bool:
+        """False once shutdown() has begun."""
+        return self._accepting
+
+    def submit(self, job_id: str, job_fn: Callable[..., Awaitable], *args):
+        """Appends a job to the back of the queue."""
+        if not self._accepting:
+            raise RuntimeError("Job scheduler is not accepting new jobs.")
+        self._pending.append((job_id, job_fn, args, time.perf_counter()))
+        self._has_work.set()
+
+    def queue_info(self, job_id: str) -> dict:
+        """
+        Describes where a job is waiting: in the admission queue, or for an
+        LLM/render slot. Running or unknown jobs report no position.
+        """
+        for index, (pending_id, _, _, _) in enumerate(self._pending):
+            if pending_id == job_id:
+                return {"queue_stage": "admission", "queue_position": index + 1}
+        for limiter in (self.llm, self.render):
+            position = limiter.position(job_id)
+            if position is not None:
+                return {"queue_stage": limiter.name, "queue_position": position}
+        return {"queue_stage": None, "queue_position": None}
+
+    def stats(self) -> dict:
+        return {
+            "pending": len(self._pending),
+            "running": len(self._running),
+            "llm_in_use": self.llm.in_use,
+            "llm_waiting": self.llm.waiting(),
+            "render_in_use": self.render.in_use,
+            "render_waiting": self.render.waiting(),
+        }
+
+    async def _worker(self):
+        while True:
+            while not self._pending:
+                self._has_work.clear()
+                await self._has_work.wait()
+
+            job_id, job_fn, args, submitted_at = self._pending.popleft()
+            QUEUE_WAIT_SECONDS.observe(time.perf_counter() - submitted_at, "admission")
+            job_task = asyncio.create_task(job_fn(*args), name=f"job-{job_id}")
+            self._running[job_id] = job_task
+            try:
+                await job_task
+            except Exception as e:
+                logger.error(f"Scheduled job {job_id} raised an unhandled error: {e}", exc_info=True)
+            finally:
+                self._running.pop(job_id, None)
+
+    async def shutdown(self, grace_period: float = 30.0) -> List[str]:
+        """
+        Stops accepting jobs, gives running jobs `grace_period` seconds to
+        finish, then cancels whatever is left. Returns the IDs of jobs that
+        were still queued and never started.
+        """
+        self._accepting = False
+        dropped = [job_id for job_id, _, _, _ in self._pending]
+        self._pending.clear()
+
+        if self._running:
+            logger.info(f"Waiting up to {grace_period}s for {len(self._running)} running job(s) to finish...")
+            await asyncio.wait(list(self._running.values()), timeout=grace_period)
+
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers.clear()
+
+        if dropped:
+            logger.warning(f"Job scheduler shut down with {len(dropped)} queued job(s) never started.")
+        return dropped
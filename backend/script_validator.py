@@ -0,0 +1,336 @@
+# script_validator.py
+#
+# Static checks for generated Manim scripts, run before anything is rendered.
+# Recurring LLM mistakes with an unambiguous repair are rewritten in place;
+# anything else rejects the script with structured diagnostics.
+
+import argparse
+import ast
+import json
+import re
+import sys
+from pathlib import Path
+from typing import List, Optional
+
+FENCE_PATTERN = re.compile(r"^[ \t]*```[\w+-]*[ \t]*$", re.MULTILINE)
+# Mobjects that stroke a path and take stroke_opacity, not opacity.
+LINE_CLASSES = {"Line", "DashedLine", "Arrow", "DoubleArrow", "Vector"}
+EXTERNAL_FILE_CLASSES = {"SVGMobject", "ImageMobject"}
+# Keyword arguments of an external-file mobject that still make sense for its Text stand-in.
+PLACEHOLDER_KEYWORDS = {"color", "fill_color", "font_size"}
+MAX_FIX_PASSES = 3
+
+
+class ScriptValidationError(ValueError):
+    """A generated script was rejected; carries the full validation result."""
+
+    def __init__(self, result: "ValidationResult"):
+        summary = "; ".join(str(diagnostic) for diagnostic in result.errors)
+        super().__init__(f"Generated Manim script was rejected: {summary}")
+        self.result = result
+
+
+class ScriptDryRunError(ValueError):
+    """A generated script raised while its scene was executed without rendering."""
+
+    def __init__(self, report: dict):
+        location = f" at line {report['line']} (`{report['source_line']}`)" if report.get("line") else ""
+        super().__init__(f"Generated Manim script failed its dry run{location}: {report['error']}")
+        self.report = report
+
+
+class Diagnostic:
+    """
+    One finding. Lines are 1-based and columns 0-based (UTF-8 offsets, as in
+    `ast`), relative to the script as it was when the finding was made.
+    """
+
+    def __init__(self, code: str, severity: str, message: str, line: Optional[int] = None, column: Optional[int] = None):
+        self.code = code
+        self.severity = severity  # "fixed" or "error"
+        self.message = message
+        self.line = line
+        self.column = column
+
+    def to_dict(self) -> dict:
+        return {
+            "code": self.code, "severity": self.severity, "message": self.message,
+            "line": self.line, "column": self.column,
+        }
+
+    def __str__(self) -> str:
+        location = f"line {self.line}: " if self.line is not None else ""
+        return f"{location}{self.message} [{self.code}]"
+
+
+class TextEdit:
+    """Replaces the text from (line, column) up to (end_line, end_column)."""
+
+    def __init__(self, line: int, column: int, end_line: int, end_column: int, replacement: str):
+        self.line = line
+        self.column = column
+        self.end_line = end_line
+        self.end_column = end_column
+        self.replacement = replacement
+
+    @property
+    def start(self) -> tuple:
+        return self.line, self.column
+
+    @property
+    def end(self) -> tuple:
+        return self.end_line, self.end_column
+
+
+class ValidationResult:
+    def __init__(self, source: str, diagnostics: List[Diagnostic]):
+        self.source = source
+        self.diagnostics = diagnostics
+
+    @property
+    def ok(self) -> bool:
+        return not any(diagnostic.severity == "error" for diagnostic in self.diagnostics)
+
+    @property
+    def errors(self) -> List[Diagnostic]:
+        return [diagnostic for diagnostic in self.diagnostics if diagnostic.severity == "error"]
+
+    def to_dict(self) -> dict:
+        return {"ok": self.ok, "diagnostics": [diagnostic.to_dict() for diagnostic in self.diagnostics]}
+
+
+# --- Text Helpers ---
+
+def strip_code_fences(source: str) -> tuple:
+    """
+    Blanks out Markdown fences and any prose around the fenced block.
+    Lines are kept (as empty lines), so positions in the result still match
+    the original. Returns (source, diagnostic or None).
+    """
+    fences = list(FENCE_PATTERN.finditer(source))
+    if not fences:
+        return source, None
+    first = fences[0]
+    if len(fences) == 1 and source[:first.start()].strip():
+        start, end = 0, first.start()  # code followed by a stray closing fence
+    else:
+        start, end = first.end(), fences[1].start() if len(fences) > 1 else len(source)
+
+    def blank(text: str) -> str:
+        return "\n" * text.count("\n")
+
+    stripped = blank(source[:start]) + source[start:end] + blank(source[end:])
+    line = source.count("\n", 0, first.start()) + 1
+    return stripped, Diagnostic("code-fence", "fixed", "Removed Markdown code fences around the script.", line, 0)
+
+
+def _character_column(lines: List[str], line: int, byte_offset: int) -> int:
+    """AST columns are UTF-8 byte offsets; edits work on characters."""
+    return len(lines[line - 1].encode("utf-8")[:byte_offset].decode("utf-8", errors="ignore"))
+
+
+def _node_edit(lines: List[str], node: ast.AST, replacement: str) -> TextEdit:
+    return TextEdit(
+        node.lineno, _character_column(lines, node.lineno, node.col_offset),
+        node.end_lineno, _character_column(lines, node.end_lineno, node.end_col_offset),
+        replacement,
+    )
+
+
+def _overlaps(edit: TextEdit, others: List[TextEdit]) -> bool:
+    return any(edit.start < other.end and other.start < edit.end for other in others)
+
+
+def apply_edits(source: str, edits: List[TextEdit]) -> str:
+    """Applies non-overlapping edits, all positioned relative to `source`."""
+    lines = source.split("\n")
+    for edit in sorted(edits, key=lambda edit: edit.start, reverse=True):
+        prefix = lines[edit.line - 1][:edit.column]
+        suffix = lines[edit.end_line - 1][edit.end_column:]
+        lines[edit.line - 1:edit.end_line] = (prefix + edit.replacement + suffix).split("\n")
+    return "\n".join(lines)
+
+
+# --- Checks ---
+
+def _call_name(node: ast.Call) -> Optional[str]:
+    if isinstance(node.func, ast.Name):
+        return node.func.id
+    if isinstance(node.func, ast.Attribute):
+        return node.func.attr
+    return None
+
+
+def _placeholder_label(file_name: str) -> str:
+    stem = Path(file_name).stem
+    return " ".join(word.capitalize() for word in re.split(r"[_\-\s]+", stem) if word) or "Image"
+
+
+def _check_external_file(source: str, lines: List[str], node: ast.Call, class_name: str):
+    file_argument = node.args[0] if node.args else next(
+        (keyword.value for keyword in node.keywords if keyword.arg in ("file_name", "filename_or_array")), None
+    )
+    if isinstance(file_argument, ast.Constant) and isinstance(file_argument.value, str):
+        keywords = [
+            ast.get_source_segment(source, keyword) for keyword in node.keywords if keyword.arg in PLACEHOLDER_KEYWORDS
+        ]
+        label = _placeholder_label(file_argument.value)
+        replacement = f"Text({', '.join([repr(label)] + keywords)})"
+        return (
+            Diagnostic("external-file", "fixed",
+                       f"Replaced {class_name}({file_argument.value!r}) with {replacement}; generated scenes have no asset files.",
+                       node.lineno, node.col_offset),
+            [_node_edit(lines, node, replacement)],
+        )
+    if class_name == "ImageMobject" and file_argument is not None and not isinstance(file_argument, ast.JoinedStr):
+        return None  # may well be a pixel array
+    return (
+        Diagnostic("external-file", "error",
+                   f"{class_name} needs an asset file that generated scenes don't have.", node.lineno, node.col_offset),
+        [],
+    )
+
+
+def _check_look_at(source: str, lines: List[str], node: ast.Call):
+    receiver = node.func.value
+    receiver_source = ast.get_source_segment(source, receiver)
+    is_animation = isinstance(receiver, ast.Attribute) and receiver.attr == "animate"
+    # `mob.animate` alone builds no animation; rotate(0) keeps a valid no-op in self.play().
+    replacement = f"{receiver_source}.rotate(0)" if is_animation else receiver_source
+    return (
+        Diagnostic("look-at", "fixed", "Removed .look_at(), which Manim mobjects don't have.", node.lineno, node.col_offset),
+        [_node_edit(lines, node, replacement)],
+    )
+
+
+def _check_line_opacity(lines: List[str], node: ast.Call, class_name: str):
+    keyword_names = {keyword.arg for keyword in node.keywords}
+    for keyword in node.keywords:
+        if keyword.arg != "opacity":
+            continue
+        if "stroke_opacity" in keyword_names:
+            return (
+                Diagnostic("line-opacity", "error", f"{class_name}() takes stroke_opacity, not opacity.",
+                           keyword.lineno, keyword.col_offset),
+                [],
+            )
+        column = _character_column(lines, keyword.lineno, keyword.col_offset)
+        return (
+            Diagnostic("line-opacity", "fixed", f"Renamed {class_name}(opacity=...) to stroke_opacity.",
+                       keyword.lineno, keyword.col_offset),
+            [TextEdit(keyword.lineno, column, keyword.lineno, column + len("opacity"), "stroke_opacity")],
+        )
+    return None
+
+
+def _scene_classes(tree: ast.Module) -> List[ast.ClassDef]:
+    def base_name(base: ast.expr) -> str:
+        if isinstance(base, ast.Attribute):
+            return base.attr
+        return base.id if isinstance(base, ast.Name) else ""
+
+    return [
+        node for node in tree.body
+        if isinstance(node, ast.ClassDef) and any(base_name(base).endswith("Scene") for base in node.bases)
+    ]
+
+
+def _check_scene_class(tree: ast.Module, lines: List[str], scene_class_name: str):
+    scenes = _scene_classes(tree)
+    if any(scene.name == scene_class_name for scene in scenes):
+        return None
+    if len(scenes) != 1:
+        found = ", ".join(scene.name for scene in scenes) or "none"
+        return Diagnostic("scene-class", "error",
+                          f"Expected a single scene class named {scene_class_name}; found {found}.", 1, 0), []
+
+    scene = scenes[0]
+    line = lines[scene.lineno - 1]
+    column = line.index(scene.name, line.index("class") + len("class"))
+    edits = [TextEdit(scene.lineno, column, scene.lineno, column + len(scene.name), scene_class_name)]
+    edits += [
+        _node_edit(lines, node, scene_class_name)
+        for node in ast.walk(tree) if isinstance(node, ast.Name) and node.id == scene.name
+    ]
+    return Diagnostic("scene-class", "fixed", f"Renamed scene class {scene.name} to {scene_class_name}.",
+                      scene.lineno, scene.col_offset), edits
+
+
+def analyze(source: str, scene_class_name: str) -> List[tuple]:
+    """
+    One pass over a parseable script. Returns (diagnostic, edits) findings;
+    errors come with no edits.
+    """
+    tree = ast.parse(source)
+    lines = source.split("\n")
+    findings = [_check_scene_class(tree, lines, scene_class_name)]
+    for node in ast.walk(tree):
+        if not isinstance(node, ast.Call):
+            continue
+        class_name = _call_name(node)
+        if class_name in EXTERNAL_FILE_CLASSES:
+            findings.append(_check_external_file(source, lines, node, class_name))
+        elif isinstance(node.func, ast.Attribute) and node.func.attr == "look_at":
+            findings.append(_check_look_at(source, lines, node))
+        elif class_name in LINE_CLASSES:
+            findings.append(_check_line_opacity(lines, node, class_name))
+    return [finding for finding in findings if finding is not None]
+
+
+def validate_script(source: str, scene_class_name: str) -> ValidationResult:
+    """
+    Checks a generated script and applies every deterministic fix. The
+    result's `ok` is False if problems remain that would fail the render.
+    """
+    source, fence_diagnostic = strip_code_fences(source)
+    diagnostics = [fence_diagnostic] if fence_diagnostic else []
+    for fix_pass in range(MAX_FIX_PASSES):
+        try:
+            findings = analyze(source, scene_class_name)
+        except SyntaxError as e:
+            diagnostics.append(Diagnostic("syntax-error", "error", f"Syntax error: {e.msg}", e.lineno, e.offset))
+            break
+        accepted: List[TextEdit] = []
+        deferred: List[Diagnostic] = []
+        for diagnostic, edits in findings:
+            if not edits:
+                continue
+            if any(_overlaps(edit, accepted) for edit in edits):
+                # e.g. look_at() inside a replaced SVGMobject call; found again on the rewritten script.
+                deferred.append(diagnostic)
+                continue
+            accepted += edits
+            diagnostics.append(diagnostic)
+        source = apply_edits(source, accepted)
+        if not deferred or fix_pass == MAX_FIX_PASSES - 1:
+            diagnostics += [diagnostic for diagnostic, edits in findings if not edits]
+            # Out of passes: what couldn't be fixed is still wrong with the script.
+            diagnostics += [
+                Diagnostic(diagnostic.code, "error", f"Fix not applied (overlaps another; out of passes): {diagnostic.message}",
+                           diagnostic.line, diagnostic.column)
+                for diagnostic in deferred
+            ]
+            break
+    return ValidationResult(source.strip() + "\n", diagnostics)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Validate (and optionally fix) generated Manim scripts.")
+    parser.add_argument("scripts", nargs="+", help="Script files to check")
+    parser.add_argument("--scene", required=True, help="Expected scene class name")
+    parser.add_argument("--write", action="store_true", help="Write fixed scripts back in place")
+    args = parser.parse_args()
+
+    all_ok = True
+    for script in args.scripts:
+        path = Path(script)
+        result = validate_script(path.read_text(encoding="utf-8"), args.scene)
+        all_ok = all_ok and result.ok
+        print(json.dumps({"script": str(path), **result.to_dict()}))
+        if args.write and result.ok and result.diagnostics:
+            path.write_text(result.source, encoding="utf-8")
+    return 0 if all_ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
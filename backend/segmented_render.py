@@ -0,0 +1,232 @@
+# segmented_render.py
+#
+# Splits a generated VoiceoverScene at its `with self.voiceover(...)` blocks so
+# the blocks can be rendered as independent scenes in parallel, then stitches
+# the rendered segments back together without re-encoding. A segment starts
+# from an empty scene, so a scene is only split where a dry run saw the
+# screen empty (see render_workers.dry_run_scene).
+
+import ast
+import asyncio
+import logging
+import textwrap
+from pathlib import Path
+from typing import List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+# Scene methods that put something on screen or advance time. Statements
+# before the first of these are pure setup and are repeated in every segment.
+SCENE_OUTPUT_METHODS = {
+    "play", "wait", "add", "remove", "clear", "voiceover", "add_sound",
+    "bring_to_front", "bring_to_back", "add_foreground_mobject", "add_foreground_mobjects",
+    "wait_for_voiceover", "safe_wait", "wait_until_bookmark",
+}
+
+
+# --- Script Splitting ---
+
+def _is_voiceover_block(statement: ast.stmt) -> bool:
+    if not isinstance(statement, ast.With) or not statement.items:
+        return False
+    call = statement.items[0].context_expr
+    return (
+        isinstance(call, ast.Call)
+        and isinstance(call.func, ast.Attribute)
+        and call.func.attr == "voiceover"
+        and isinstance(call.func.value, ast.Name)
+        and call.func.value.id == "self"
+    )
+
+
+def _produces_output(statement: ast.stmt) -> bool:
+    for node in ast.walk(statement):
+        if (
+            isinstance(node, ast.Call)
+            and isinstance(node.func, ast.Attribute)
+            and node.func.attr in SCENE_OUTPUT_METHODS
+            and isinstance(node.func.value, ast.Name)
+            and node.func.value.id == "self"
+        ):
+            return True
+    return False
+
+
+def _assigns_scene_state(statement: ast.stmt) -> bool:
+    """True if the statement stores an attribute on `self` (state that would outlive its segment)."""
+    for node in ast.walk(statement):
+        if isinstance(node, ast.Attribute) and isinstance(node.ctx, ast.Store):
+            base = node
+            while isinstance(base, ast.Attribute):
+                base = base.value
+            if isinstance(base, ast.Name) and base.id == "self":
+                return True
+    return False
+
+
+def _names(statement: ast.stmt, context: type) -> Set[str]:
+    return {
+        node.id for node in ast.walk(statement)
+        if isinstance(node, ast.Name) and isinstance(node.ctx, context)
+    }
+
+
+def _free_names(segment: List[ast.stmt]) -> Set[str]:
+    """Names a run of statements reads before (or without) binding them itself."""
+    bound: Set[str] = set()
+    free: Set[str] = set()
+    for statement in segment:
+        local_names = set(bound)
+        if not isinstance(statement, (ast.Assign, ast.AugAssign, ast.AnnAssign, ast.Expr)):
+            # Compound statements (with/for/if) bind names like `tracker`
+            # before their bodies read them.
+            local_names |= _names(statement, ast.Store)
+        free |= _names(statement, ast.Load) - local_names
+        bound |= _names(statement, ast.Store)
+    return free
+
+
+def _segments_are_independent(setup: List[ast.stmt], segments: List[List[ast.stmt]]) -> bool:
+    """
+    Checks that no segment reads a variable that only an earlier segment
+    defined, and that segments don't stash state on `self`.
+    """
+    setup_names = set().union(*(_names(statement, ast.Store) for statement in setup))
+    earlier_names: Set[str] = set()
+    for index, segment in enumerate(segments):
+        if any(_assigns_scene_state(statement) for statement in segment):
+            logger.info(f"Segment {index} assigns state on the scene; rendering serially.")
+            return False
+        borrowed = (_free_names(segment) - setup_names) & earlier_names
+        if borrowed:
+            logger.info(f"Segment {index} uses {sorted(borrowed)} from an earlier segment; rendering serially.")
+            return False
+        earlier_names |= set().union(*(_names(statement, ast.Store) for statement in segment))
+    return True
+
+
+def _construct_body(tree: ast.Module, scene_class_name: str) -> Optional[List[ast.stmt]]:
+    scene_class = next(
+        (node for node in tree.body if isinstance(node, ast.ClassDef) and node.name == scene_class_name), None
+    )
+    if scene_class is None:
+        return None
+    construct = next(
+        (node for node in scene_class.body if isinstance(node, ast.FunctionDef) and node.name == "construct"), None
+    )
+    return construct.body if construct is not None else None
+
+
+def _block_line(statement: ast.With) -> int:
+    """The line a dry run reports a voiceover block under: where its voiceover() call starts."""
+    return statement.items[0].context_expr.lineno
+
+
+def voiceover_block_lines(source: str, scene_class_name: str) -> List[int]:
+    """Lines of the voiceover blocks at the top level of the scene's construct()."""
+    try:
+        body = _construct_body(ast.parse(source), scene_class_name)
+    except SyntaxError:
+        return []
+    return [_block_line(statement) for statement in body or [] if _is_voiceover_block(statement)]
+
+
+def _statement_source(source: str, statement: ast.stmt) -> str:
+    return textwrap.dedent(ast.get_source_segment(source, statement, padded=True))
+
+
+def build_segment_script(
+    source: str, scene_class_name: str, empty_blocks: Set[int], min_segments: int = 2
+) -> Optional[tuple]:
+    """
+    Produces a script with one extra scene class per voiceover block, each
+    subclassing the original scene and replaying the shared setup first.
+    `empty_blocks` are the lines of the blocks that start on an empty scene;
+    every block but the first must. Returns (script, segment_class_names),
+    or None if the scene can't be split safely.
+    """
+    try:
+        tree = ast.parse(source)
+    except SyntaxError:
+        return None
+
+    body = _construct_body(tree, scene_class_name)
+    if body is None:
+        return None
+    block_indices = [index for index, statement in enumerate(body) if _is_voiceover_block(statement)]
+    if len(block_indices) < min_segments:
+        return None
+
+    # Whatever an earlier block leaves on screen would be missing from later segments.
+    for number, index in enumerate(block_indices[1:], start=1):
+        if _block_line(body[index]) not in empty_blocks:
+            logger.info(f"Voiceover block {number} doesn't start on an empty scene; rendering serially.")
+            return None
+
+    # Everything before the first statement that draws or waits is setup;
+    # anything drawn before the first voiceover block belongs to the first segment.
+    first_output = next(index for index, statement in enumerate(body) if _produces_output(statement))
+    boundaries = [first_output] + block_indices[1:] + [len(body)]
+    segments = [body[start:end] for start, end in zip(boundaries, boundaries[1:])]
+
+    # Only repeat setup that later segments (transitively) depend on, e.g. the
+    # speech service; mobjects only the first segment uses are built there once.
+    needed = set().union(*(_free_names(segment) for segment in segments[1:]))
+    setup, intro = [], []
+    for statement in reversed(body[:first_output]):
+        stored = _names(statement, ast.Store)
+        if not stored or stored & needed:
+            setup.insert(0, statement)
+            needed |= _names(statement, ast.Load)
+        else:
+            intro.insert(0, statement)
+    segments[0] = intro + segments[0]
+
+    if not _segments_are_independent(setup, segments):
+        return None
+
+    setup_source = "".join(_statement_source(source, statement) + "\n" for statement in setup)
+    class_names = []
+    classes = []
+    for index, segment in enumerate(segments):
+        class_name = f"{scene_class_name}Segment{index:03d}"
+        segment_source = "".join(_statement_source(source, statement) + "\n" for statement in segment)
+        classes.append(
+            f"\n\nclass {class_name}({scene_class_name}):\n"
+            f"    def construct(self):\n"
+            f"{textwrap.indent(setup_source + segment_source, ' ' * 8)}"
+        )
+        class_names.append(class_name)
+
+    return source.rstrip() + "\n" + "".join(classes), class_names
+
+
+# --- Stitching ---
+
+async def concat_segments(segment_paths: List[Path], output_path: Path) -> Path:
+    """Joins rendered segments with ffmpeg's concat demuxer, copying streams as-is."""
+    list_path = output_path.with_suffix(".concat.txt")
+    list_path.write_text(
+        "".join(f"file '{path.resolve().as_posix()}'\n" for path in segment_paths), encoding="utf-8"
+    )
+    cmd = [
+        "ffmpeg", "-y", "-loglevel", "error",
+        "-f", "concat", "-safe", "0", "-i", str(list_path),
+        "-c", "copy", "-movflags", "+faststart",
+        str(output_path),
+    ]
+    process = await asyncio.create_subprocess_exec(
+        *cmd, stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.PIPE
+    )
+    try:
+        _, stderr = await process.communicate()
+    except asyncio.CancelledError:
+        process.kill()
+        await process.wait()
+        raise
+    finally:
+        list_path.unlink(missing_ok=True)
+
+    if process.returncode != 0:
+        raise RuntimeError(f"Concatenating rendered segments failed: {stderr.decode()}")
+    return output_path
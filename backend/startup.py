@@ -0,0 +1,59 @@
+# startup.py
+#
+# Start-up timing for the API process: how long its imports took, broken
+# down by top-level package, so a slow cold start can be traced to the
+# dependency behind it. Only uses the standard library, so it can be
+# imported (and started) before anything else.
+
+import builtins
+import threading
+import time
+from typing import Dict, Optional
+
+
+class ImportTimer:
+    """
+    Times imports while started by wrapping builtins.__import__. Each import
+    is charged to the top-level package of the outermost import statement
+    that triggered it, so e.g. `fastapi` includes the pydantic and starlette
+    modules first loaded through it. Already-loaded modules cost nothing.
+    """
+
+    def __init__(self):
+        self.seconds: Dict[str, float] = {}
+        self.elapsed: Optional[float] = None
+        self._started: Optional[float] = None
+        self._original_import = None
+        self._depth = threading.local()
+
+    def start(self) -> "ImportTimer":
+        self._started = time.perf_counter()
+        self._original_import = builtins.__import__
+        builtins.__import__ = self._import
+        return self
+
+    def stop(self):
+        builtins.__import__ = self._original_import
+        self.elapsed = time.perf_counter() - self._started
+
+    def _import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        depth = getattr(self._depth, "value", 0)
+        self._depth.value = depth + 1
+        started = time.perf_counter()
+        try:
+            return self._original_import(name, globals, locals, fromlist, level)
+        finally:
+            self._depth.value = depth
+            if depth == 0:
+                package = name.partition(".")[0] if level == 0 else "(relative)"
+                self.seconds[package] = self.seconds.get(package, 0.0) + time.perf_counter() - started
+
+    def report(self, top: int = 8, min_seconds: float = 0.01) -> str:
+        """The slowest packages, e.g. "fastapi 0.36s, dotenv 0.02s, 14 others 0.01s"."""
+        ranked = sorted(self.seconds.items(), key=lambda item: -item[1])
+        listed = [(package, seconds) for package, seconds in ranked[:top] if seconds >= min_seconds]
+        parts = [f"{package} {seconds:.2f}s" for package, seconds in listed]
+        rest = ranked[len(listed):]
+        if rest:
+            parts.append(f"{len(rest)} others {sum(seconds for _, seconds in rest):.2f}s")
+        return ", ".join(parts)
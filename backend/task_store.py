@@ -0,0 +1,415 @@
+# task_store.py
+
+import asyncio
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+TERMINAL_STATUSES = ("completed", "failed")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    video_id       TEXT PRIMARY KEY,
+    status         TEXT NOT NULL,
+    topic          TEXT NOT NULL,
+    topic_key      TEXT NOT NULL,
+    coalesced_with TEXT,
+    batch_id       TEXT,
+    owner_pid      INTEGER,
+    owner_token    TEXT,
+    video_url      TEXT,
+    video_path     TEXT,
+    video_sha256   TEXT,
+    animations_done  INTEGER,
+    animations_total INTEGER,
+    frames_done      INTEGER,
+    script_path    TEXT,
+    renditions     TEXT NOT NULL DEFAULT '{}',
+    upgrade_status TEXT,
+    error          TEXT,
+    stage_times    TEXT NOT NULL DEFAULT '{}',
+    created_at     REAL NOT NULL,
+    updated_at     REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_tasks_status ON tasks (status);
+CREATE INDEX IF NOT EXISTS idx_tasks_topic_key ON tasks (topic_key, status);
+CREATE INDEX IF NOT EXISTS idx_tasks_coalesced_with ON tasks (coalesced_with);
+"""
+
+# Columns added after the first release, with their types, for upgrading
+# existing databases in place.
+MIGRATED_COLUMNS = {
+    "video_sha256": "TEXT",
+    "animations_done": "INTEGER",
+    "animations_total": "INTEGER",
+    "frames_done": "INTEGER",
+    "renditions": "TEXT NOT NULL DEFAULT '{}'",
+    "upgrade_status": "TEXT",
+    "batch_id": "TEXT",
+    "owner_token": "TEXT",
+}
+
+# Indexes on migrated columns, created once the columns exist.
+MIGRATED_INDEXES = """
+CREATE INDEX IF NOT EXISTS idx_tasks_batch_id ON tasks (batch_id);
+"""
+
+# Columns callers may set through update_job().
+UPDATABLE_COLUMNS = {
+    "status", "video_url", "video_path", "script_path", "error",
+    "animations_done", "animations_total", "frames_done", "upgrade_status",
+}
+
+
+def _connect(path: str) -> sqlite3.Connection:
+    connection = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+    connection.row_factory = sqlite3.Row
+    connection.execute("PRAGMA busy_timeout = 5000")
+    connection.execute("PRAGMA synchronous = NORMAL")
+    return connection
+
+
+def _pid_alive(pid: Optional[int]) -> bool:
+    if not pid:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _process_start_time(pid: int) -> Optional[str]:
+    """When a process started, in clock ticks since boot; None where /proc isn't available."""
+    try:
+        with open(f"/proc/{pid}/stat", encoding="ascii") as stat:
+            # The command name may contain spaces but ends with the last ')'.
+            return stat.read().rsplit(")", 1)[1].split()[19]
+    except (OSError, IndexError):
+        return None
+
+
+# Identifies this API process among all processes that ever owned jobs: a
+# restarted server often gets the same PID again (PID 1 in a container).
+OWNER_TOKEN = f"{os.getpid()}:{_process_start_time(os.getpid()) or uuid.uuid4().hex}"
+
+
+def _owner_alive(pid: Optional[int], token: Optional[str]) -> bool:
+    """Whether the API process that recorded (owner_pid, owner_token) is still running."""
+    if token == OWNER_TOKEN:
+        return True
+    if pid == os.getpid() or not _pid_alive(pid):
+        return False
+    started = _process_start_time(pid)
+    return token is None or started is None or token == f"{pid}:{started}"
+
+
+def owned_here(task: dict) -> bool:
+    """Whether this API process runs the job."""
+    return task["owner_token"] == OWNER_TOKEN
+
+
+class TaskStore:
+    """
+    Persistent store of video generation tasks in a SQLite database (WAL
+    mode), shared by every API process on the host.
+
+    Writes go through one writer thread that commits whatever has queued up
+    in a single transaction (group commit); the async methods resolve once
+    their write is durable. Reads use per-thread connections and run in the
+    default executor, so neither blocks the event loop.
+    """
+
+    def __init__(self, path: str, batch_window: float = 0.005, max_batch: int = 64):
+        self.path = path
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        self._writes: "queue.Queue" = queue.Queue()
+        self._local = threading.local()
+
+        connection = _connect(path)
+        connection.execute("PRAGMA journal_mode = WAL")
+        connection.executescript(SCHEMA)
+        existing = {row["name"] for row in connection.execute("PRAGMA table_info(tasks)")}
+        for column, column_type in MIGRATED_COLUMNS.items():
+            if column not in existing:
+                connection.execute(f"ALTER TABLE tasks ADD COLUMN {column} {column_type}")
+        connection.executescript(MIGRATED_INDEXES)
+        self._writer_connection = connection
+        self._writer = threading.Thread(target=self._write_loop, name="task-store-writer", daemon=True)
+        self._writer.start()
+        logger.info(f"Task store at {path}.")
+
+    # --- Writer ---
+
+    def _write_loop(self):
+        while True:
+            batch = [self._writes.get()]
+            deadline = time.monotonic() + self.batch_window
+            while len(batch) < self.max_batch:
+                try:
+                    item = self._writes.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                batch.append(item)
+            self._commit(batch)
+
+    def _commit(self, batch: list):
+        connection = self._writer_connection
+        results = []
+        try:
+            connection.execute("BEGIN IMMEDIATE")
+            for operation, _, _ in batch:
+                # Run each operation under a savepoint so one bad write doesn't
+                # roll back the rest of the batch.
+                connection.execute("SAVEPOINT op")
+                try:
+                    results.append((operation(connection), None))
+                    connection.execute("RELEASE op")
+                except Exception as e:
+                    connection.execute("ROLLBACK TO op")
+                    connection.execute("RELEASE op")
+                    results.append((None, e))
+            connection.execute("COMMIT")
+        except Exception as e:
+            logger.error(f"Task store commit failed: {e}")
+            if connection.in_transaction:
+                connection.execute("ROLLBACK")
+            results = [(None, e)] * len(batch)
+
+        for (_, loop, future), (result, error) in zip(batch, results):
+            loop.call_soon_threadsafe(self._resolve, future, result, error)
+
+    @staticmethod
+    def _resolve(future: asyncio.Future, result, error: Optional[Exception]):
+        if future.cancelled():
+            return
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    async def _write(self, operation: Callable[[sqlite3.Connection], object]):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._writes.put((operation, loop, future))
+        return await future
+
+    # --- Reads ---
+
+    def _reader(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = self._local.connection = _connect(self.path)
+        return connection
+
+    @staticmethod
+    def _row_to_task(row: Optional[sqlite3.Row]) -> Optional[dict]:
+        return dict(row) if row is not None else None
+
+    def _get(self, video_id: str) -> Optional[dict]:
+        row = self._reader().execute("SELECT * FROM tasks WHERE video_id = ?", (video_id,)).fetchone()
+        return self._row_to_task(row)
+
+    async def get_task(self, video_id: str) -> Optional[dict]:
+        return await asyncio.get_running_loop().run_in_executor(None, self._get, video_id)
+
+    def _active_job_ids(self) -> set:
+        rows = self._reader().execute(
+            "SELECT video_id FROM tasks WHERE coalesced_with IS NULL AND status NOT IN (?, ?)", TERMINAL_STATUSES
+        ).fetchall()
+        return {row["video_id"] for row in rows}
+
+    async def active_job_ids(self) -> set:
+        """IDs of jobs that haven't completed or failed, in any API process."""
+        return await asyncio.get_running_loop().run_in_executor(None, self._active_job_ids)
+
+    def _get_batch(self, batch_id: str) -> list:
+        rows = self._reader().execute(
+            "SELECT * FROM tasks WHERE batch_id = ? ORDER BY created_at, rowid", (batch_id,)
+        ).fetchall()
+        return [self._row_to_task(row) for row in rows]
+
+    async def get_batch(self, batch_id: str) -> list:
+        """The tasks of a batch in submission order; empty if there is no such batch."""
+        return await asyncio.get_running_loop().run_in_executor(None, self._get_batch, batch_id)
+
+    # --- Repository API ---
+
+    @classmethod
+    def _insert_task(cls, connection: sqlite3.Connection, video_id: str, topic: str, topic_key: str,
+                     coalesce: bool, batch_id: Optional[str] = None) -> dict:
+        now = time.time()
+        leader = None
+        if coalesce:
+            candidates = connection.execute(
+                "SELECT video_id, status, error, owner_pid, owner_token FROM tasks "
+                "WHERE topic_key = ? AND coalesced_with IS NULL AND status NOT IN (?, ?) "
+                "ORDER BY created_at",
+                (topic_key, *TERMINAL_STATUSES),
+            ).fetchall()
+            for candidate in candidates:
+                if _owner_alive(candidate["owner_pid"], candidate["owner_token"]):
+                    leader = candidate
+                    break
+                # Nobody will finish it; fail it rather than let requests attach to it.
+                cls._fail_orphan(connection, candidate["video_id"], now)
+        status = leader["status"] if leader else "queued"
+        connection.execute(
+            "INSERT INTO tasks (video_id, status, topic, topic_key, coalesced_with, batch_id, owner_pid, owner_token, "
+            "error, stage_times, created_at, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, json_object(?, ?), ?, ?)",
+            (
+                video_id, status, topic, topic_key,
+                leader["video_id"] if leader else None, batch_id, os.getpid(), OWNER_TOKEN,
+                leader["error"] if leader else None,
+                status, now, now, now,
+            ),
+        )
+        return cls._row_to_task(connection.execute("SELECT * FROM tasks WHERE video_id = ?", (video_id,)).fetchone())
+
+    async def create_task(self, video_id: str, topic: str, topic_key: str, coalesce: bool = True) -> dict:
+        """
+        Records a new request. With `coalesce`, it is attached to an unfinished
+        job for the same topic key whose owning API process is still running,
+        if there is one (its `coalesced_with` is
+        set and it starts out in that job's status); otherwise it is queued
+        as a job of its own. Lookup and insert happen in one transaction.
+        """
+        return await self._write(lambda connection: self._insert_task(connection, video_id, topic, topic_key, coalesce))
+
+    async def create_batch(self, batch_id: str, members: list, coalesce: bool = True) -> list:
+        """
+        Records the (video_id, topic, topic_key) members of a batch in one
+        transaction, each as create_task() would; a member may coalesce onto
+        an earlier one. Returns the new tasks in order.
+        """
+        def operation(connection: sqlite3.Connection) -> list:
+            return [
+                self._insert_task(connection, video_id, topic, key, coalesce, batch_id)
+                for video_id, topic, key in members
+            ]
+
+        return await self._write(operation)
+
+    async def update_job(self, video_id: str, **fields):
+        """
+        Updates a job and every request coalesced onto it. A status change
+        also records when the job entered that stage.
+        """
+        unknown = set(fields) - UPDATABLE_COLUMNS
+        if unknown:
+            raise ValueError(f"Unknown task fields: {sorted(unknown)}")
+
+        def operation(connection: sqlite3.Connection):
+            now = time.time()
+            assignments = [f"{column} = ?" for column in fields] + ["updated_at = ?"]
+            values = list(fields.values()) + [now]
+            if "status" in fields:
+                assignments.append("stage_times = json_set(stage_times, '$.' || ?, ?)")
+                values += [fields["status"], now]
+            connection.execute(
+                f"UPDATE tasks SET {', '.join(assignments)} WHERE video_id = ? OR coalesced_with = ?",
+                values + [video_id, video_id],
+            )
+
+        await self._write(operation)
+
+    async def complete_job(
+        self, video_id: str, video_path: str, script_path: Optional[str] = None, video_sha256: Optional[str] = None,
+        rendition: Optional[str] = None,
+    ):
+        """
+        Marks a job and its coalesced requests completed; each gets its own
+        video URL. The video is recorded as `rendition`, if given.
+        """
+        def operation(connection: sqlite3.Connection):
+            now = time.time()
+            connection.execute(
+                "UPDATE tasks SET status = 'completed', video_path = ?, script_path = ?, video_sha256 = ?, "
+                "video_url = '/videos/' || video_id, updated_at = ?, "
+                "stage_times = json_set(stage_times, '$.completed', ?) "
+                "WHERE video_id = ? OR coalesced_with = ?",
+                (video_path, script_path, video_sha256, now, now, video_id, video_id),
+            )
+            if rendition is not None:
+                self._set_rendition(connection, video_id, rendition, video_path, video_sha256, now)
+
+        await self._write(operation)
+
+    @staticmethod
+    def _set_rendition(connection: sqlite3.Connection, video_id: str, rendition: str, video_path: str,
+                       video_sha256: Optional[str], now: float):
+        connection.execute(
+            "UPDATE tasks SET renditions = json_set(renditions, '$.' || ?, json_object('path', ?, 'sha256', ?)), "
+            "updated_at = ? WHERE video_id = ? OR coalesced_with = ?",
+            (rendition, video_path, video_sha256, now, video_id, video_id),
+        )
+
+    async def add_rendition(
+        self, video_id: str, rendition: str, video_path: str, video_sha256: Optional[str], primary: bool = False
+    ):
+        """
+        Records another rendition of a completed job. With `primary`, it also
+        becomes the video served at the job's URL, in the same transaction.
+        """
+        def operation(connection: sqlite3.Connection):
+            now = time.time()
+            self._set_rendition(connection, video_id, rendition, video_path, video_sha256, now)
+            if primary:
+                connection.execute(
+                    "UPDATE tasks SET video_path = ?, video_sha256 = ? WHERE video_id = ? OR coalesced_with = ?",
+                    (video_path, video_sha256, video_id, video_id),
+                )
+
+        await self._write(operation)
+
+    @staticmethod
+    def _fail_orphan(connection: sqlite3.Connection, video_id: str, now: float):
+        connection.execute(
+            "UPDATE tasks SET status = 'failed', error = ?, updated_at = ?, "
+            "stage_times = json_set(stage_times, '$.failed', ?) "
+            "WHERE video_id = ? OR coalesced_with = ?",
+            ("The server restarted before the job finished.", now, now, video_id, video_id),
+        )
+
+    async def fail_orphaned_jobs(self) -> list:
+        """
+        Fails unfinished jobs whose owning API process no longer exists (e.g.
+        after a crash or restart, even if the new process got the same PID),
+        along with their coalesced requests. Returns the failed job IDs.
+        """
+        def operation(connection: sqlite3.Connection) -> list:
+            rows = connection.execute(
+                "SELECT video_id, owner_pid, owner_token FROM tasks "
+                "WHERE coalesced_with IS NULL AND status NOT IN (?, ?)",
+                TERMINAL_STATUSES,
+            ).fetchall()
+            orphaned = [row["video_id"] for row in rows if not _owner_alive(row["owner_pid"], row["owner_token"])]
+            now = time.time()
+            for video_id in orphaned:
+                self._fail_orphan(connection, video_id, now)
+            # Completed jobs keep their video, but nobody will finish their quality upgrade.
+            upgrading = connection.execute(
+                "SELECT video_id, owner_pid, owner_token FROM tasks "
+                "WHERE coalesced_with IS NULL AND upgrade_status IN ('queued', 'rendering')"
+            ).fetchall()
+            for row in upgrading:
+                if not _owner_alive(row["owner_pid"], row["owner_token"]):
+                    connection.execute(
+                        "UPDATE tasks SET upgrade_status = 'failed', updated_at = ? "
+                        "WHERE video_id = ? OR coalesced_with = ?",
+                        (now, row["video_id"], row["video_id"]),
+                    )
+            return orphaned
+
+        return await self._write(operation)
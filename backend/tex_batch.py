@@ -0,0 +1,191 @@
+# tex_batch.py
+#
+# Pre-render pass that typesets every constant Tex/MathTex expression of a
+# scene in one LaTeX run (one page per expression) and one dvisvgm run,
+# filling the shared typesetting cache before Manim would otherwise spawn
+# latex + dvisvgm once per expression during construct().
+
+import logging
+import re
+import subprocess
+import tempfile
+from pathlib import Path
+from typing import List, Optional
+
+from typeset_cache import TEX_CLASSES, TypesetCache, collect_typeset_calls, installed_cache, tex_document, tex_key
+
+logger = logging.getLogger(__name__)
+
+COMPILE_TIMEOUT_SECONDS = 120
+BATCH_PAGE_ENVIRONMENT = "standalone"
+DOCUMENT_CLASS_PATTERN = re.compile(r"\\documentclass(?:\[([^\]]*)\])?\{standalone\}")
+# Stand-in returned while recording, so mobject construction can finish.
+PLACEHOLDER_SVG = '<svg xmlns="http://www.w3.org/2000/svg" width="1" height="1"><path d="M0 0 L1 1"/></svg>'
+
+
+class TexExpression:
+    """One LaTeX document Manim would compile, split into preamble and page body."""
+
+    def __init__(self, expression: str, environment: Optional[str], tex_template):
+        self.expression = expression
+        self.environment = environment
+        self.tex_template = tex_template
+        self.compiler = tex_template.tex_compiler
+        self.output_format = tex_template.output_format
+        source = tex_document(expression, environment, tex_template)
+        self.key = tex_key(source, self.compiler, self.output_format)
+        preamble, _, rest = source.partition("\\begin{document}")
+        self.preamble = preamble
+        self.body = rest.rpartition("\\end{document}")[0]
+
+    @property
+    def batch_group(self) -> tuple:
+        return self.preamble, self.compiler, self.output_format
+
+
+# --- Collection ---
+
+def collect_tex_expressions(source: str) -> List[TexExpression]:
+    """
+    Every LaTeX document the constant Tex/MathTex calls of a script would
+    compile, including the per-substring documents MathTex typesets to split
+    itself up. Found by constructing each mobject with typesetting replaced
+    by a recorder; calls with non-constant arguments are left to the render.
+    """
+    import manim
+    from manim.mobject.text import tex_mobject
+
+    recorded = {}
+    with tempfile.TemporaryDirectory(prefix="learntube-tex-record-") as temp_dir:
+        placeholder = Path(temp_dir) / "placeholder.svg"
+        placeholder.write_text(PLACEHOLDER_SVG, encoding="utf-8")
+
+        def record(expression, environment=None, tex_template=None):
+            if tex_template is None:
+                tex_template = manim.config["tex_template"]
+            tex_expression = TexExpression(expression, environment, tex_template)
+            recorded.setdefault(tex_expression.key, tex_expression)
+            return placeholder
+
+        tex_to_svg_file = tex_mobject.tex_to_svg_file
+        tex_mobject.tex_to_svg_file = record
+        try:
+            for call_source, class_name, args, kwargs in collect_typeset_calls(source):
+                if class_name not in TEX_CLASSES:
+                    continue
+                try:
+                    getattr(manim, class_name)(*args, **kwargs)
+                except Exception as e:
+                    # Whatever was recorded before the failure is still worth compiling.
+                    logger.debug(f"Could not trace {call_source}: {e}")
+        finally:
+            tex_mobject.tex_to_svg_file = tex_to_svg_file
+    return list(recorded.values())
+
+
+# --- Compilation ---
+
+def _compile_command(compiler: str, output_format: str, tex_file: Path) -> List[str]:
+    """The same LaTeX invocation Manim uses for a single expression."""
+    if compiler == "xelatex":
+        command = ["xelatex"] + (["-no-pdf"] if output_format == ".xdv" else [])
+    else:
+        command = [compiler, f"-output-format={output_format[1:]}"]
+    return command + ["-interaction=batchmode", "-halt-on-error", f"-output-directory={tex_file.parent}", str(tex_file)]
+
+
+def _batch_document(expressions: List[TexExpression]) -> str:
+    """One standalone page per expression, in order."""
+    preamble = DOCUMENT_CLASS_PATTERN.sub(
+        lambda match: f"\\documentclass[{match.group(1) + ',' if match.group(1) else ''}multi]{{standalone}}",
+        expressions[0].preamble,
+        count=1,
+    )
+    pages = "".join(
+        f"\\begin{{{BATCH_PAGE_ENVIRONMENT}}}{expression.body}\\end{{{BATCH_PAGE_ENVIRONMENT}}}\n"
+        for expression in expressions
+    )
+    return f"{preamble}\\begin{{document}}\n{pages}\\end{{document}}\n"
+
+
+def compile_batch(cache: TypesetCache, expressions: List[TexExpression]):
+    """
+    Compiles expressions that share a preamble and toolchain as one
+    multi-page document and stores each page's SVG under that expression's
+    own cache key. Raises if LaTeX or dvisvgm fails or the page count is off.
+    """
+    first = expressions[0]
+    with tempfile.TemporaryDirectory(prefix="learntube-tex-batch-") as temp_dir:
+        tex_file = Path(temp_dir) / "batch.tex"
+        tex_file.write_text(_batch_document(expressions), encoding="utf-8")
+        subprocess.run(
+            _compile_command(first.compiler, first.output_format, tex_file),
+            cwd=temp_dir, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+            check=True, timeout=COMPILE_TIMEOUT_SECONDS,
+        )
+        subprocess.run(
+            ["dvisvgm"] + (["--pdf"] if first.output_format == ".pdf" else []) + [
+                "--page=1-", "-n", "-v", "0", "-o", str(Path(temp_dir) / "page-%p.svg"),
+                str(tex_file.with_suffix(first.output_format)),
+            ],
+            cwd=temp_dir, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+            check=True, timeout=COMPILE_TIMEOUT_SECONDS,
+        )
+        pages = sorted(Path(temp_dir).glob("page-*.svg"), key=lambda path: int(path.stem.rpartition("-")[2]))
+        if len(pages) != len(expressions):
+            raise RuntimeError(f"Batch produced {len(pages)} pages for {len(expressions)} expressions.")
+        for expression, page in zip(expressions, pages):
+            cache.put("tex", expression.key, page)
+
+
+def _compile_with_fallback(cache: TypesetCache, expressions: List[TexExpression]) -> int:
+    """
+    Compiles a batch; if it fails (typically one bad expression stops LaTeX),
+    retries each half, down to Manim's own per-expression typesetting.
+    Returns how many expressions ended up in the cache.
+    """
+    if len(expressions) == 1:
+        expression = expressions[0]
+        from manim.utils import tex_file_writing
+
+        try:
+            tex_file_writing.tex_to_svg_file(
+                expression.expression, environment=expression.environment, tex_template=expression.tex_template
+            )
+            return 1
+        except Exception as e:
+            logger.warning(f"Could not typeset {expression.expression!r}: {e}")
+            return 0
+    try:
+        compile_batch(cache, expressions)
+        return len(expressions)
+    except (OSError, subprocess.SubprocessError, RuntimeError) as e:
+        logger.info(f"Batch of {len(expressions)} LaTeX expressions failed ({e}); splitting it.")
+        middle = len(expressions) // 2
+        return _compile_with_fallback(cache, expressions[:middle]) + _compile_with_fallback(cache, expressions[middle:])
+
+
+def prerender_tex(script_path: str) -> dict:
+    """
+    Typesets the uncached LaTeX of a script ahead of its render. A no-op
+    unless the typesetting cache is installed in this process.
+    """
+    cache = installed_cache()
+    if cache is None:
+        return {"expressions": 0, "compiled": 0}
+    expressions = collect_tex_expressions(Path(script_path).read_text(encoding="utf-8"))
+    missing = [expression for expression in expressions if not cache.path_for("tex", expression.key).exists()]
+
+    groups = {}
+    for expression in missing:
+        groups.setdefault(expression.batch_group, []).append(expression)
+    compiled = 0
+    for (preamble, _, _), group in groups.items():
+        if DOCUMENT_CLASS_PATTERN.search(preamble) is None:
+            # Only the standalone class can emit one cropped page per expression;
+            # other templates are typeset one by one during the render.
+            continue
+        compiled += _compile_with_fallback(cache, group)
+    logger.info(f"Pre-rendered {compiled}/{len(missing)} uncached LaTeX expressions of {script_path} "
+                f"({len(expressions) - len(missing)} already cached).")
+    return {"expressions": len(expressions), "compiled": compiled}
@@ -0,0 +1,122 @@
+# tracing.py
+#
+# Per-job timelines in the Chrome trace-event format, viewable in
+# chrome://tracing or https://ui.perfetto.dev. Code marks the stages of a job
+# with `span()`; the job's trace is found through a context variable, so it
+# follows the job into every asyncio task it starts without being passed
+# around. Timings measured in other processes (render workers, the TTS
+# service) are added afterwards with `add_span()`. Outside a job, spans cost
+# one context variable lookup.
+
+import json
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+_current_trace: ContextVar[Optional["JobTrace"]] = ContextVar("current_trace", default=None)
+# Spans on one track must nest; work running in parallel gets its own track.
+_current_track: ContextVar[str] = ContextVar("current_track", default="pipeline")
+
+
+class JobTrace:
+    """
+    The spans of one job. Times are Unix timestamps (seconds), so spans
+    measured by other processes on the host line up with the job's own.
+    """
+
+    def __init__(self, job_id: str, started_at: Optional[float] = None):
+        self.job_id = job_id
+        self.started_at = started_at if started_at is not None else time.time()
+        self.events: List[dict] = []
+        self.tracks: Dict[str, int] = {}
+
+    def add(self, name: str, start: float, end: float, category: str, track: Optional[str] = None,
+            args: Optional[dict] = None):
+        track = track or _current_track.get()
+        event = {
+            "name": name,
+            "cat": category,
+            "ph": "X",
+            "ts": round((start - self.started_at) * 1e6),
+            "dur": round(max(0.0, end - start) * 1e6),
+            "pid": 1,
+            "tid": self.tracks.setdefault(track, len(self.tracks) + 1),
+        }
+        if args:
+            event["args"] = args
+        self.events.append(event)
+
+    def to_chrome(self) -> dict:
+        metadata = [{"name": "process_name", "ph": "M", "pid": 1, "tid": 0, "args": {"name": f"job {self.job_id}"}}]
+        for track, tid in self.tracks.items():
+            metadata.append({"name": "thread_name", "ph": "M", "pid": 1, "tid": tid, "args": {"name": track}})
+            metadata.append({"name": "thread_sort_index", "ph": "M", "pid": 1, "tid": tid, "args": {"sort_index": tid}})
+        return {
+            "traceEvents": metadata + list(self.events),
+            "displayTimeUnit": "ms",
+            "otherData": {"job_id": self.job_id, "started_at": self.started_at},
+        }
+
+    def write(self, path: Path):
+        """Writes the trace as JSON; readers never see a partial file."""
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(self.to_chrome(), f)
+        os.replace(temp_path, path)
+
+
+@contextmanager
+def job_trace(job_id: str, started_at: Optional[float] = None) -> Iterator[JobTrace]:
+    """Collects the spans of the code run in this block (and the tasks it starts) into a new trace."""
+    trace = JobTrace(job_id, started_at)
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+
+
+def current_trace() -> Optional[JobTrace]:
+    return _current_trace.get()
+
+
+@contextmanager
+def track(name: str) -> Iterator[None]:
+    """Puts the spans of this block on their own track of the timeline."""
+    token = _current_track.set(name)
+    try:
+        yield
+    finally:
+        _current_track.reset(token)
+
+
+@contextmanager
+def span(name: str, category: str = "stage", **args) -> Iterator[dict]:
+    """
+    Records the block as a span of the current job's trace. Yields the span's
+    args, so details known only at the end (e.g. a response size) can be
+    added; a raised exception is recorded as the span's `error`.
+    """
+    trace = _current_trace.get()
+    if trace is None:
+        yield args
+        return
+    started = time.time()
+    try:
+        yield args
+    except BaseException as e:
+        args["error"] = type(e).__name__
+        raise
+    finally:
+        trace.add(name, started, time.time(), category, args=args)
+
+
+def add_span(name: str, start: float, end: float, category: str, track: Optional[str] = None, **args):
+    """Adds a span timed elsewhere (Unix timestamps) to the current job's trace."""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add(name, start, end, category, track, args)
@@ -0,0 +1,290 @@
+# tts_service.py
+#
+# A long-running local text-to-speech service. It loads the Coqui model once,
+# keeps it resident, and serves synthesis requests from all render workers
+# over a Unix socket using newline-delimited JSON.
+#
+# Run standalone with: python tts_service.py --socket /tmp/learntube-tts.sock
+
+import argparse
+import asyncio
+import fcntl
+import json
+import logging
+import os
+import socket
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import List, Optional
+
+from audio_cache import AudioCache
+from metrics import Histogram
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL = "tts_models/en/ljspeech/tacotron2-DDC"
+DEFAULT_SOCKET_PATH = os.path.join(tempfile.gettempdir(), "learntube-tts.sock")
+DEFAULT_CACHE_DIR = str(Path(__file__).resolve().parent / "audio_cache")
+
+
+class TTSServiceError(Exception):
+    """Raised by the client when the TTS service can't be reached or rejects a request."""
+
+
+# --- Server ---
+
+class TTSServer:
+    """
+    Serves synthesis requests with one resident model. Requests that arrive
+    within `batch_window` seconds of each other are collected into a batch
+    (up to `max_batch`), identical sentences are synthesized only once, and
+    the whole batch runs as a single job on the model thread. Tacotron2's
+    autoregressive decoder stops per utterance, so Coqui's inference API is
+    batch-size one; the batch amortizes dispatch and dedupes work instead.
+    Sentences already in the audio cache are answered without synthesis.
+    """
+
+    def __init__(
+        self,
+        socket_path: str,
+        model_name: str,
+        audio_cache: AudioCache,
+        max_batch: int = 8,
+        batch_window: float = 0.02,
+    ):
+        self.socket_path = socket_path
+        self.model_name = model_name
+        self.audio_cache = audio_cache
+        self.max_batch = max(1, max_batch)
+        self.batch_window = batch_window
+        self.tts = None
+        self.sample_rate = None
+        self._model_ready: Optional[asyncio.Event] = None
+        self._requests: Optional[asyncio.Queue] = None
+        # The model isn't thread-safe; all inference happens on this one thread.
+        self._model_thread = ThreadPoolExecutor(max_workers=1, thread_name_prefix="tts-model")
+        self.stats = {"requests": 0, "batches": 0, "sentences_synthesized": 0, "failures": 0}
+        # Reported through the stats op; the API process exports it as its "tts" stage.
+        self.batch_seconds = Histogram("tts_batch_seconds", "Synthesis time per batch.", registry=None)
+
+    def _load_model(self):
+        from TTS.api import TTS
+
+        started = time.perf_counter()
+        self.tts = TTS(model_name=self.model_name, progress_bar=False, gpu=False)
+        self.sample_rate = self.tts.synthesizer.output_sample_rate
+        logger.info(f"Loaded TTS model '{self.model_name}' in {time.perf_counter() - started:.1f}s.")
+
+    def _cache_key(self, text: str) -> str:
+        return AudioCache.make_key(text, self.model_name, sample_rate=self.sample_rate)
+
+    def _run_batch(self, requests: List[tuple]) -> int:
+        """Synthesizes each distinct sentence once, writes every requested file and caches the audio."""
+        import torch
+
+        texts = list(dict.fromkeys(text for text, _ in requests))
+        with torch.inference_mode():
+            wav_by_text = {text: self.tts.tts(text=text) for text in texts}
+        cached = set()
+        for text, output_path in requests:
+            self._write_wav(wav_by_text[text], output_path)
+            if text not in cached:
+                self.audio_cache.put(self._cache_key(text), output_path)
+                cached.add(text)
+        return len(texts)
+
+    def _write_wav(self, wav: list, output_path: str):
+        # Write beside the target and rename, so readers never see a partial file.
+        Path(output_path).parent.mkdir(parents=True, exist_ok=True)
+        temp_path = f"{output_path}.{os.getpid()}.tmp"
+        self.tts.synthesizer.save_wav(wav=wav, path=temp_path)
+        os.replace(temp_path, output_path)
+
+    async def serve(self):
+        """
+        Serves until cancelled. Returns at once if another service already
+        owns the socket (e.g. one started by another uvicorn worker): the
+        socket belongs to whoever holds `<socket>.lock`.
+        """
+        lock_file = open(f"{self.socket_path}.lock", "w")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock_file.close()
+            logger.info(f"A TTS service is already running on {self.socket_path}; not starting another.")
+            return
+        if _socket_live(self.socket_path):
+            # Started without the lock (an older version); leave it be.
+            lock_file.close()
+            logger.info(f"A TTS service is already answering on {self.socket_path}; not starting another.")
+            return
+
+        self._requests = asyncio.Queue()
+        self._model_ready = asyncio.Event()
+
+        # Listen before loading the model: early requests simply queue up
+        # instead of failing over to an in-process model in the render worker.
+        # Holding the lock, any socket file left over is a crashed service's.
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        server = await asyncio.start_unix_server(self._handle_client, path=self.socket_path)
+        logger.info(f"TTS service listening on {self.socket_path}")
+
+        batcher = None
+        try:
+            async with server:
+                await asyncio.get_running_loop().run_in_executor(self._model_thread, self._load_model)
+                self._model_ready.set()
+                batcher = asyncio.create_task(self._batch_loop())
+                await server.serve_forever()
+        finally:
+            if batcher is not None:
+                batcher.cancel()
+            if os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
+            lock_file.close()
+
+    async def _handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                request = json.loads(line)
+                if isinstance(request, dict):
+                    response = await self._handle_request(request)
+                else:
+                    response = {"ok": False, "error": "Requests must be JSON objects."}
+                writer.write(json.dumps(response).encode() + b"\n")
+                await writer.drain()
+        except (ConnectionResetError, json.JSONDecodeError) as e:
+            logger.warning(f"Dropping TTS client connection: {e}")
+        finally:
+            writer.close()
+
+    async def _handle_request(self, request: dict) -> dict:
+        op = request.get("op")
+        if op == "ping":
+            return {"ok": True, "model_name": self.model_name}
+        if op == "stats":
+            return {
+                "ok": True, **self.stats,
+                "audio_cache": self.audio_cache.stats(),
+                "batch_seconds": self.batch_seconds.totals(),
+            }
+        if op != "synthesize":
+            return {"ok": False, "error": f"Unknown op: {op}"}
+        if request.get("model_name", self.model_name) != self.model_name:
+            return {"ok": False, "error": f"This service only serves '{self.model_name}'."}
+        missing = [field for field in ("text", "output_path") if not isinstance(request.get(field), str)]
+        if missing:
+            return {"ok": False, "error": f"synthesize needs string field(s): {', '.join(missing)}."}
+
+        self.stats["requests"] += 1
+        await self._model_ready.wait()
+        if self.audio_cache.get(self._cache_key(request["text"]), request["output_path"]):
+            return {"ok": True, "output_path": request["output_path"], "cached": True}
+
+        future = asyncio.get_running_loop().create_future()
+        await self._requests.put((request["text"], request["output_path"], future))
+        return await future
+
+    async def _batch_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._requests.get()]
+            deadline = loop.time() + self.batch_window
+            while len(batch) < self.max_batch:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._requests.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+
+            started = time.perf_counter()
+            try:
+                synthesized = await loop.run_in_executor(
+                    self._model_thread, self._run_batch, [(text, output_path) for text, output_path, _ in batch]
+                )
+            except Exception as e:
+                logger.error(f"TTS batch of {len(batch)} request(s) failed: {e}", exc_info=True)
+                self.stats["failures"] += len(batch)
+                for _, _, future in batch:
+                    future.set_result({"ok": False, "error": str(e)})
+                continue
+
+            elapsed = time.perf_counter() - started
+            self.batch_seconds.observe(elapsed)
+            self.stats["batches"] += 1
+            self.stats["sentences_synthesized"] += synthesized
+            for _, output_path, future in batch:
+                future.set_result({"ok": True, "output_path": output_path, "batch_size": len(batch), "synthesis_seconds": elapsed})
+
+
+# --- Client ---
+
+def _socket_live(socket_path: str) -> bool:
+    """Whether something accepts connections on `socket_path`."""
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(1.0)
+            sock.connect(socket_path)
+        return True
+    except OSError:
+        return False
+
+
+def request(payload: dict, socket_path: str = DEFAULT_SOCKET_PATH, timeout: float = 300.0) -> dict:
+    """Sends one request to the TTS service and waits for its reply."""
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(timeout)
+            sock.connect(socket_path)
+            sock.sendall(json.dumps(payload).encode() + b"\n")
+            with sock.makefile("rb") as stream:
+                line = stream.readline()
+    except OSError as e:
+        raise TTSServiceError(f"TTS service at {socket_path} is unavailable: {e}") from e
+
+    if not line:
+        raise TTSServiceError("TTS service closed the connection without replying.")
+    response = json.loads(line)
+    if not response.get("ok"):
+        raise TTSServiceError(response.get("error", "Unknown TTS service error."))
+    return response
+
+
+def synthesize(text: str, output_path: str, model_name: str = DEFAULT_MODEL, socket_path: str = DEFAULT_SOCKET_PATH) -> dict:
+    """Asks the TTS service to synthesize `text` into a WAV file at `output_path`."""
+    return request(
+        {"op": "synthesize", "text": text, "output_path": str(Path(output_path).resolve()), "model_name": model_name},
+        socket_path=socket_path,
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Resident Coqui TTS synthesis service.")
+    parser.add_argument("--socket", default=os.getenv("TTS_SOCKET_PATH", DEFAULT_SOCKET_PATH))
+    parser.add_argument("--model", default=os.getenv("TTS_MODEL_NAME", DEFAULT_MODEL))
+    parser.add_argument("--max-batch", type=int, default=int(os.getenv("TTS_BATCH_MAX", "8")))
+    parser.add_argument("--batch-window-ms", type=float, default=float(os.getenv("TTS_BATCH_WINDOW_MS", "20")))
+    parser.add_argument("--cache-dir", default=os.getenv("AUDIO_CACHE_DIR", DEFAULT_CACHE_DIR))
+    parser.add_argument("--cache-max-mb", type=int, default=int(os.getenv("AUDIO_CACHE_MAX_MB", "2048")))
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    server = TTSServer(
+        args.socket,
+        args.model,
+        AudioCache(args.cache_dir, max_bytes=args.cache_max_mb * 1024 * 1024),
+        max_batch=args.max_batch,
+        batch_window=args.batch_window_ms / 1000,
+    )
+    try:
+        asyncio.run(server.serve())
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,336 @@
+# typeset_cache.py
+#
+# Content-addressed cache of typeset SVGs (LaTeX via Tex/MathTex, Pango via
+# Text/MarkupText) shared by every render worker on the host. Installed into
+# Manim by patching its typesetting entry points inside warm render workers.
+
+import argparse
+import ast
+import hashlib
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_DIR = str(Path(__file__).resolve().parent / "typeset_cache")
+
+# Mobjects whose constructor arguments are typeset.
+TEX_CLASSES = {"Tex", "MathTex", "SingleStringMathTex"}
+TEXT_CLASSES = {"Text", "MarkupText"}
+
+
+def tex_key(tex_source: str, compiler: str, output_format: str) -> str:
+    """Key of a LaTeX document: its full source (template preamble included) and toolchain."""
+    return hashlib.sha256("\x1f".join([tex_source, compiler, output_format]).encode("utf-8")).hexdigest()
+
+
+def tex_document(expression: str, environment: Optional[str], tex_template) -> str:
+    """The LaTeX source Manim compiles for an expression."""
+    if environment is not None:
+        return tex_template.get_texcode_for_expression_in_env(expression, environment)
+    return tex_template.get_texcode_for_expression(expression)
+
+
+def text_key(kind: str, manim_hash: str) -> str:
+    """Key of a Pango rendering; Manim already hashes the text together with its style settings."""
+    return hashlib.sha256(f"{kind}\x1f{manim_hash}".encode("utf-8")).hexdigest()
+
+
+class TypesetCache:
+    """
+    SVGs live at `<root>/<kind>/<key[:2]>/<key>.svg`. Entries only appear by
+    atomic rename of a fully written file, so readers need no locks: an entry
+    either exists completely or not at all. Concurrent misses for the same
+    key may both typeset it; the last rename wins with identical content.
+
+    The paths handed out are hard links private to this process, under
+    `<root>/.held/<pid>/`, so trimming the cache never removes a file a render
+    is about to read. They stay valid until `release()`.
+    """
+
+    def __init__(self, root: str):
+        self.root = Path(root)
+        self.hits = 0
+        self.misses = 0
+        self.bytes = None
+        self.files_evicted = 0
+        self.bytes_evicted = 0
+
+    def path_for(self, kind: str, key: str) -> Path:
+        return self.root / kind / key[:2] / f"{key}.svg"
+
+    @property
+    def held_dir(self) -> Path:
+        return self.root / ".held" / str(os.getpid())
+
+    def _hold(self, path: Path, kind: str, key: str) -> Path:
+        held = self.held_dir / f"{kind}-{key}.svg"
+        held.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            os.link(path, held)
+        except FileExistsError:
+            pass
+        except FileNotFoundError:
+            raise
+        except OSError:
+            shutil.copyfile(path, held)  # filesystems without hard links
+        return held
+
+    def get(self, kind: str, key: str) -> Optional[Path]:
+        path = self.path_for(kind, key)
+        try:
+            # Refresh the access time so trimming sees it as recently used.
+            os.utime(path)
+            held = self._hold(path, kind, key)
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return held
+
+    def put(self, kind: str, key: str, source: Path) -> Path:
+        path = self.path_for(kind, key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        shutil.copyfile(source, temp_path)
+        held = self._hold(temp_path, kind, key)
+        os.replace(temp_path, path)
+        return held
+
+    def release(self):
+        """Drops this process's links; call once the SVGs handed out have been read."""
+        shutil.rmtree(self.held_dir, ignore_errors=True)
+
+    def trim(self, max_bytes: int) -> int:
+        """
+        Deletes the least recently used entries until the cache fits in
+        `max_bytes`, and the links of processes that have exited. Returns
+        bytes freed.
+        """
+        for held_dir in (self.root / ".held").glob("*"):
+            try:
+                os.kill(int(held_dir.name), 0)
+            except ProcessLookupError:
+                shutil.rmtree(held_dir, ignore_errors=True)
+            except (ValueError, OSError):
+                continue
+        total = 0
+        entries = []
+        for path in self.root.glob("*/*/*.svg"):
+            if path.relative_to(self.root).parts[0] == ".held":
+                continue
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            total += stat.st_size
+            entries.append((max(stat.st_atime, stat.st_mtime), stat.st_size, path))
+        freed = 0
+        for _, size, path in sorted(entries):
+            if total - freed <= max_bytes:
+                break
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                continue
+            freed += size
+            self.files_evicted += 1
+        self.bytes = total - freed
+        self.bytes_evicted += freed
+        if freed:
+            logger.info(f"Evicted {freed / 1e6:.1f} MB from {self.root} to stay within {max_bytes / 1e6:.0f} MB.")
+        return freed
+
+    def stats(self) -> dict:
+        return {"bytes": self.bytes, "files_evicted": self.files_evicted, "bytes_evicted": self.bytes_evicted}
+
+
+@contextmanager
+def _private_dir(config, setting: str) -> Iterator[Path]:
+    """
+    Points one of Manim's media directories at a fresh temporary directory,
+    so a cache miss never writes to (or cleans up) a directory shared with
+    other workers.
+    """
+    previous = config[setting]
+    with tempfile.TemporaryDirectory(prefix=f"learntube-{setting}-") as private:
+        config[setting] = private
+        try:
+            yield Path(private)
+        finally:
+            config[setting] = previous
+
+
+def install(cache: TypesetCache) -> bool:
+    """
+    Routes Manim's LaTeX and Pango typesetting through `cache`. Returns False
+    (leaving Manim untouched) if this Manim version lacks the expected hooks.
+    """
+    try:
+        from manim import config
+        from manim.mobject.text import tex_mobject, text_mobject
+        from manim.utils import tex_file_writing
+    except ImportError as e:
+        logger.warning(f"Typesetting cache not installed: {e}")
+        return False
+    if getattr(tex_mobject.tex_to_svg_file, "_typeset_cache", None) is not None:
+        return True
+
+    original_tex_to_svg_file = tex_file_writing.tex_to_svg_file
+
+    def tex_to_svg_file(expression, environment=None, tex_template=None):
+        if tex_template is None:
+            tex_template = config["tex_template"]
+        tex_source = tex_document(expression, environment, tex_template)
+        key = tex_key(tex_source, tex_template.tex_compiler, tex_template.output_format)
+        cached = cache.get("tex", key)
+        if cached is not None:
+            return cached
+        with _private_dir(config, "tex_dir"):
+            svg_file = original_tex_to_svg_file(expression, environment=environment, tex_template=tex_template)
+            return cache.put("tex", key, Path(svg_file))
+
+    tex_to_svg_file._typeset_cache = cache
+    tex_file_writing.tex_to_svg_file = tex_to_svg_file
+    tex_mobject.tex_to_svg_file = tex_to_svg_file
+
+    for text_class in (text_mobject.Text, text_mobject.MarkupText):
+        if not hasattr(text_class, "_text2hash"):
+            logger.warning(f"Typesetting cache skips {text_class.__name__}: no _text2hash in this Manim version.")
+            continue
+        text_class._text2svg = _cached_text2svg(cache, config, text_class.__name__, text_class._text2svg)
+
+    logger.info(f"Typesetting cache installed at {cache.root}.")
+    return True
+
+
+def installed_cache() -> Optional[TypesetCache]:
+    """The cache Manim's LaTeX typesetting is routed through in this process, if any."""
+    try:
+        from manim.mobject.text import tex_mobject
+    except ImportError:
+        return None
+    return getattr(tex_mobject.tex_to_svg_file, "_typeset_cache", None)
+
+
+@contextmanager
+def holding() -> Iterator[None]:
+    """Releases the SVGs the installed cache handed out during the block."""
+    try:
+        yield
+    finally:
+        cache = installed_cache()
+        if cache is not None:
+            cache.release()
+
+
+def _cached_text2svg(cache: TypesetCache, config, kind: str, original):
+    def _text2svg(self, *args, **kwargs):
+        key = text_key(kind, self._text2hash(*args, **kwargs))
+        cached = cache.get("text", key)
+        if cached is not None:
+            return str(cached)
+        with _private_dir(config, "text_dir"):
+            svg_file = original(self, *args, **kwargs)
+            return str(cache.put("text", key, Path(svg_file)))
+
+    return _text2svg
+
+
+# --- Warmup ---
+
+def _literal_or_manim_value(node: ast.expr, namespace: dict):
+    """Evaluates constant expressions and Manim constants such as BLUE or UP * 2."""
+    allowed = (
+        ast.Expression, ast.Constant, ast.Name, ast.Load, ast.Attribute, ast.UnaryOp, ast.BinOp,
+        ast.List, ast.Tuple, ast.Dict, ast.operator, ast.unaryop,
+    )
+    if not all(isinstance(child, allowed) for child in ast.walk(node)):
+        raise ValueError("not a constant expression")
+    return eval(compile(ast.Expression(node), "<warmup>", "eval"), namespace)
+
+
+def collect_typeset_calls(source: str) -> Iterator[tuple]:
+    """
+    Yields (call source, class_name, args, kwargs) for every typesetting call
+    whose arguments are all constant.
+    """
+    import manim
+
+    namespace = {name: getattr(manim, name) for name in dir(manim) if not name.startswith("_")}
+    try:
+        tree = ast.parse(source)
+    except SyntaxError:
+        return
+    for node in ast.walk(tree):
+        if not (isinstance(node, ast.Call) and isinstance(node.func, ast.Name)):
+            continue
+        if node.func.id not in TEX_CLASSES | TEXT_CLASSES:
+            continue
+        try:
+            args = tuple(_literal_or_manim_value(arg, namespace) for arg in node.args)
+            kwargs = tuple(
+                (keyword.arg, _literal_or_manim_value(keyword.value, namespace)) for keyword in node.keywords
+            )
+        except Exception:
+            continue
+        if args and all(keyword is not None for keyword, _ in kwargs):
+            yield ast.unparse(node), node.func.id, args, dict(kwargs)
+
+
+def warmup(cache: TypesetCache, scripts_dir: str, top: int, extra_tex: list, extra_text: list) -> int:
+    """
+    Typesets the `top` most common constant Tex/Text calls found in stored
+    scripts, plus any given strings, into the cache. Returns how many were
+    typeset successfully.
+    """
+    import manim
+
+    install(cache)
+    counts = Counter()
+    calls = {}
+    for script_path in sorted(Path(scripts_dir).glob("*.py")):
+        for call_source, *call in collect_typeset_calls(script_path.read_text(encoding="utf-8")):
+            counts[call_source] += 1
+            calls[call_source] = call
+    work = [calls[call_source] for call_source, _ in counts.most_common(top)]
+    work += [("MathTex", (expression,), {}) for expression in extra_tex]
+    work += [("Text", (text,), {}) for text in extra_text]
+
+    typeset = 0
+    with holding():
+        for class_name, args, kwargs in work:
+            try:
+                getattr(manim, class_name)(*args, **kwargs)
+                typeset += 1
+            except Exception as e:
+                logger.warning(f"Warmup could not typeset {class_name}{args}: {e}")
+    logger.info(f"Typesetting cache warmup done: {typeset}/{len(work)} entries (hits {cache.hits}, misses {cache.misses}).")
+    return typeset
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pre-populate the shared typesetting cache.")
+    parser.add_argument("--cache-dir", default=os.getenv("TYPESET_CACHE_DIR", DEFAULT_CACHE_DIR))
+    parser.add_argument("--scripts-dir", default=str(Path(__file__).resolve().parent / "manim_scripts"),
+                        help="Stored scenes to mine for common Tex/Text strings")
+    parser.add_argument("--top", type=int, default=200, help="How many of the most common calls to typeset")
+    parser.add_argument("--tex", action="append", default=[], help="Extra MathTex expression (repeatable)")
+    parser.add_argument("--text", action="append", default=[], help="Extra Text string (repeatable)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    typeset = warmup(TypesetCache(args.cache_dir), args.scripts_dir, args.top, args.tex, args.text)
+    return 0 if typeset or not (args.top or args.tex or args.text) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
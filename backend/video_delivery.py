@@ -0,0 +1,57 @@
+# video_delivery.py
+
+import hashlib
+import os
+from typing import Optional
+
+from starlette.responses import FileResponse
+from starlette.types import Message, Receive, Scope, Send
+
+from metrics import Counter
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+# For URLs whose content may be replaced; the ETag keeps revalidation to a 304.
+REVALIDATE_CACHE_CONTROL = "no-cache"
+
+VIDEO_BYTES_SERVED = Counter("learntube_video_bytes_served_total", "Video bytes sent in response bodies.")
+
+
+def file_sha256(path: str, chunk_size: int = 1024 * 1024) -> str:
+    """Hex SHA-256 of a file's contents. Blocking; run it off the event loop."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def strong_etag(content_hash: str) -> str:
+    return f'"{content_hash}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match evaluation (RFC 9110 weak comparison)."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(candidate.strip().removeprefix("W/") == opaque for candidate in if_none_match.split(","))
+
+
+class VideoFileResponse(FileResponse):
+    """
+    FileResponse, which handles Range, multi-range and HEAD itself and hands
+    whole files to the server's `http.response.pathsend` when it offers
+    that extension, with the body bytes it sends counted.
+    """
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        async def counting_send(message: Message):
+            await send(message)
+            if message["type"] == "http.response.body":
+                VIDEO_BYTES_SERVED.inc(amount=len(message.get("body", b"")))
+            elif message["type"] == "http.response.pathsend":
+                VIDEO_BYTES_SERVED.inc(amount=os.stat(message["path"]).st_size)
+
+        await super().__call__(scope, receive, counting_send)
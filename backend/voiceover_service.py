@@ -0,0 +1,175 @@
+# voiceover_service.py
+#
+# manim-voiceover speech services used by the generated scenes. Imported inside
+# render workers only; the API process never needs manim_voiceover.
+
+import contextlib
+import json
+import logging
+import os
+import time
+import wave
+from pathlib import Path
+from typing import Optional
+
+from manim_voiceover.helper import remove_bookmarks, wav2mp3
+from manim_voiceover.services.base import SpeechService
+
+import tts_service
+
+logger = logging.getLogger(__name__)
+
+# In-process model used only when the resident TTS service is unreachable.
+_fallback_tts = None
+
+# manim-voiceover cache directory for the render in progress (see
+# render_cache_dir()); None leaves manim-voiceover's default.
+_render_cache_dir: Optional[str] = None
+
+
+@contextlib.contextmanager
+def render_cache_dir(path: str):
+    """
+    Gives the speech services created in this block their own cache
+    directory. manim-voiceover rewrites its JSON cache index without a lock,
+    so renders running at the same time (e.g. the segments of one job) must
+    not share one; synthesized audio is still shared through the TTS
+    service's cache.
+    """
+    global _render_cache_dir
+    previous, _render_cache_dir = _render_cache_dir, path
+    try:
+        yield
+    finally:
+        _render_cache_dir = previous
+
+
+def _report_timing(text: str, started: float, source: str, **details):
+    """
+    Prints when a voiceover's audio was produced and where it came from. Render
+    logs capture it, and the API turns it into a span of the job's trace
+    (see render_progress.SPEECH_TIMING_PATTERN).
+    """
+    report = {"text": text[:80], "started": started, "seconds": time.time() - started, "source": source, **details}
+    print(f"Voiceover audio {json.dumps(report)}", flush=True)
+
+
+def _synthesize_in_process(text: str, wav_path: Path, model_name: str):
+    global _fallback_tts
+    if _fallback_tts is None:
+        from TTS.api import TTS
+
+        logger.warning("Loading the Coqui model inside the render worker.")
+        _fallback_tts = TTS(model_name=model_name, progress_bar=False, gpu=False)
+    _fallback_tts.tts_to_file(text=text, file_path=str(wav_path))
+
+
+class LocalCoquiService(SpeechService):
+    """
+    Drop-in replacement for manim-voiceover's CoquiService that sends synthesis
+    to the resident local TTS service instead of loading the model per render.
+    Accepts (and ignores) CoquiService's model-loading arguments so generated
+    scripts only need the class name swapped.
+    """
+
+    def __init__(
+        self,
+        model_name: str = tts_service.DEFAULT_MODEL,
+        config_path: str = None,
+        vocoder_path: str = None,
+        vocoder_config_path: str = None,
+        progress_bar: bool = True,
+        gpu=False,
+        speaker_idx=0,
+        language_idx=0,
+        socket_path: str = None,
+        **kwargs,
+    ):
+        self.model_name = model_name
+        self.socket_path = socket_path or os.getenv("TTS_SOCKET_PATH", tts_service.DEFAULT_SOCKET_PATH)
+        self.init_kwargs = kwargs
+        if _render_cache_dir is not None:
+            kwargs.setdefault("cache_dir", _render_cache_dir)
+        SpeechService.__init__(self, **kwargs)
+
+    def generate_from_text(self, text: str, cache_dir: str = None, path: str = None, **kwargs) -> dict:
+        if cache_dir is None:
+            cache_dir = self.cache_dir
+
+        input_text = remove_bookmarks(text)
+        # Same input data as CoquiService, so existing voiceover caches stay valid.
+        input_data = {"input_text": text, "service": "coqui"}
+
+        started = time.time()
+        cached_result = self.get_cached_result(input_data, Path(cache_dir))
+        if cached_result is not None:
+            # The artifact sweeper may have evicted the audio behind the cache
+            # index; re-synthesize in that case, otherwise mark it recently used.
+            cached_audio = Path(cache_dir) / cached_result["original_audio"]
+            if cached_audio.exists():
+                os.utime(cached_audio)
+                _report_timing(input_text, started, "voiceover_cache")
+                return cached_result
+
+        if path is None:
+            audio_path = self.get_audio_basename(input_data) + ".mp3"
+        else:
+            audio_path = path
+
+        output_path = Path(cache_dir) / audio_path
+        wav_path = output_path.with_suffix(".wav")
+
+        try:
+            response = tts_service.synthesize(
+                input_text, str(wav_path), model_name=self.model_name, socket_path=self.socket_path
+            )
+            if response.get("cached"):
+                source, details = "audio_cache", {}
+            else:
+                source = "tts_service"
+                details = {key: response[key] for key in ("batch_size", "synthesis_seconds") if key in response}
+        except tts_service.TTSServiceError as e:
+            logger.warning(f"Falling back to in-process synthesis: {e}")
+            _synthesize_in_process(input_text, wav_path, self.model_name)
+            source, details = "in_process", {}
+        wav2mp3(wav_path, output_path)
+        _report_timing(input_text, started, source, **details)
+
+        return {
+            "input_text": text,
+            "input_data": input_data,
+            "original_audio": audio_path,
+        }
+
+
+class DryRunSpeechService(SpeechService):
+    """
+    Speech stub for dry runs and benchmarks: every voiceover block lasts
+    `seconds`, backed by one silent WAV, so a scene's timing logic runs
+    without any synthesis.
+    """
+
+    def __init__(self, seconds: float = 2.0, **kwargs):
+        self.seconds = seconds
+        SpeechService.__init__(self, **kwargs)
+
+    def generate_from_text(self, text: str, cache_dir: str = None, path: str = None, **kwargs) -> dict:
+        if cache_dir is None:
+            cache_dir = self.cache_dir
+        audio_path = f"dry_run_silence_{int(self.seconds * 1000)}ms.wav"
+        silence_path = Path(cache_dir) / audio_path
+        if not silence_path.exists():
+            silence_path.parent.mkdir(parents=True, exist_ok=True)
+            # Workers may share the directory; publish the file atomically.
+            temp_path = silence_path.with_name(f".{silence_path.name}.{os.getpid()}.tmp")
+            with wave.open(str(temp_path), "wb") as wav_file:
+                wav_file.setnchannels(1)
+                wav_file.setsampwidth(2)
+                wav_file.setframerate(8000)
+                wav_file.writeframes(b"\x00\x00" * int(self.seconds * 8000))
+            os.replace(temp_path, silence_path)
+        return {
+            "input_text": text,
+            "input_data": {"input_text": text, "service": "dry_run"},
+            "original_audio": audio_path,
+        }